@@ -2,6 +2,12 @@ from enum import Enum
 
 EXIT_PAYMENT_TYPE = "exit"
 
+# values of paid column in payment reports
+PAYMENT_FAILED = 0
+PAYMENT_DONE = 1
+# operation is injected but its inclusion could not be checked. It must not be paid again before its hash is checked
+PAYMENT_UNKNOWN = 2
+
 
 class RunMode(Enum):
     FOREVER = 1
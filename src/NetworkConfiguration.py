@@ -1,6 +1,6 @@
 from log_config import main_logger
+from util.http_session import SessionManager
 from util.rpc_utils import parse_json_response
-import requests
 
 logger = main_logger
 
@@ -14,7 +14,7 @@ CONSTANTS_COMM = "rpc get http://{}/chains/main/blocks/head/context/constants"
 URL = "https://{}.tzbeta.net/chains/main/blocks/head/context/constants"
 url_prefix = {"MAINNET" : "rpc", "ALPHANET" : "rpcalpha", "ZERONET" : "rpczero"}
 
-def init_network_config(network_name, config_client_manager, node_addr):
+def init_network_config(network_name, config_client_manager, node_addr, session_manager=None):
     network_config_map = {}    
     try:
         network_config_map[network_name] = get_network_config_from_local_node(config_client_manager, node_addr)
@@ -25,7 +25,7 @@ def init_network_config(network_name, config_client_manager, node_addr):
         logger.info("Failed to get network configuration constants from a local node.")
     
     try:
-        network_config_map[network_name] = get_network_config_from_public_node(network_name)
+        network_config_map[network_name] = get_network_config_from_public_node(network_name, session_manager)
         network_config_map[network_name]['NAME'] = network_name
         logger.info("Network configuration constants successfully loaded from a public node.")
         return network_config_map
@@ -45,9 +45,11 @@ def get_network_config_from_local_node(config_client_manager, node_addr):
     return network_config_map
 
 
-def get_network_config_from_public_node(network_name):
+def get_network_config_from_public_node(network_name, session_manager=None):
+    if session_manager is None:
+        session_manager = SessionManager()
     url = URL.format(url_prefix[network_name])
-    response_constants = requests.get(url)
+    response_constants = session_manager.get(url)
     constants = response_constants.json()
     network_config_map = parse_constants(constants)
     return network_config_map
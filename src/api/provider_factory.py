@@ -1,46 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from rpc.rpc_block_api import RpcBlockApiImpl
-from rpc.rpc_reward_api import RpcRewardApiImpl
+from rpc.rpc_head_cache import RpcHeadCache
+from rpc.rpc_node_pool import RpcNodePool
+from rpc.rpc_reward_api import RpcRewardApiImpl, DEFAULT_PARALLELISM, BALANCE_STRATEGY_CONTRACT
 from rpc.rpc_reward_calculator import RpcRewardCalculatorApi
+from rpc.rpc_transport import HttpRpcTransport, ClientRpcTransport
 from tzscan.mirror_selection_helper import TzScanMirrorSelector
 from tzscan.tzscan_block_api import TzScanBlockApiImpl
 from tzscan.tzscan_reward_api import TzScanRewardApiImpl
 from tzscan.tzscan_reward_calculator import TzScanRewardCalculatorApi
+from util.http_session import SessionManager
 
 
 class ProviderFactory:
 
-    def __init__(self, provider):
+    def __init__(self, provider, rpc_transport='http', rpc_parallelism=DEFAULT_PARALLELISM, response_cache=None,
+                 rpc_balance_strategy=BALANCE_STRATEGY_CONTRACT, session_manager=None, tzscan_immutable_finalized=False,
+                 columnar_calc=False):
         self.provider = provider
+        self.rpc_transport = rpc_transport
+        self.rpc_parallelism = rpc_parallelism
+        self.response_cache = response_cache
+        self.rpc_balance_strategy = rpc_balance_strategy
+        self.tzscan_immutable_finalized = tzscan_immutable_finalized
+        self.columnar_calc = columnar_calc
+        # one session for all calls to external services, so that connections are reused
+        self.session_manager = session_manager if session_manager else SessionManager()
         self.mirror_selector = None
+        self.validate_executor = None
+        self.transports = {}
+        self.head_caches = {}
 
-    def newRewardApi(self, network_config, baking_address, wllt_clnt_mngr, node_url):
+    def newRewardApi(self, network_config, baking_address, wllt_clnt_mngr, node_url, validate=True):
         if self.provider == 'rpc':
-            return RpcRewardApiImpl(network_config, baking_address, wllt_clnt_mngr, node_url)
+            validate_api = self.newValidateApi(network_config, baking_address) if validate else None
+            return RpcRewardApiImpl(network_config, baking_address, self.newRpcTransport(wllt_clnt_mngr, node_url),
+                                    self.newHeadCache(network_config, wllt_clnt_mngr, node_url),
+                                    validate_api=validate_api, validate_executor=self.validate_executor,
+                                    parallelism=self.rpc_parallelism, cache=self.response_cache,
+                                    balance_strategy=self.rpc_balance_strategy)
         elif self.provider == 'tzscan':
             if not self.mirror_selector:
                 self.init_mirror_selector(network_config)
-            return TzScanRewardApiImpl(network_config, baking_address, self.mirror_selector)
+            # finalization of a cycle is judged by current level
+            block_api = self.newBlockApi(network_config, wllt_clnt_mngr, node_url) \
+                if self.tzscan_immutable_finalized else None
+            return TzScanRewardApiImpl(network_config, baking_address, self.mirror_selector,
+                                       session_manager=self.session_manager, cache=self.response_cache,
+                                       block_api=block_api)
 
         raise Exception("No supported reward data provider : {}".format(self.provider))
 
+    # rpc reward apis cross check their data with tzscan. They share the mirror selector and a single thread
+    # fetching tzscan data
+    def newValidateApi(self, network_config, baking_address):
+        if not self.mirror_selector:
+            self.init_mirror_selector(network_config)
+        if not self.validate_executor:
+            self.validate_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='validator')
+
+        return TzScanRewardApiImpl(network_config, baking_address, self.mirror_selector,
+                                   session_manager=self.session_manager)
+
     def init_mirror_selector(self, network_config):
-        self.mirror_selector = TzScanMirrorSelector(network_config)
+        self.mirror_selector = TzScanMirrorSelector(network_config, self.session_manager)
         self.mirror_selector.initialize()
 
+    # transports are shared by all apis talking to the same node, so that they share a connection pool
+    # node_url may be a comma separated list of nodes, client transport only uses the first one
+    def newRpcTransport(self, wllt_clnt_mngr, node_url):
+        if node_url not in self.transports:
+            node_urls = [x.strip() for x in node_url.split(',')]
+            if self.rpc_transport == 'http':
+                node_pool = RpcNodePool(node_urls)
+                node_pool.start()
+                self.transports[node_url] = HttpRpcTransport(node_pool, pool_size=self.rpc_parallelism)
+            elif self.rpc_transport == 'client':
+                self.transports[node_url] = ClientRpcTransport(wllt_clnt_mngr, node_urls[0])
+            else:
+                raise Exception("No supported rpc transport : {}".format(self.rpc_transport))
+
+        return self.transports[node_url]
+
+    # single head cache per node, so that one head read serves all apis within a block time
+    def newHeadCache(self, network_config, wllt_clnt_mngr, node_url):
+        if node_url not in self.head_caches:
+            self.head_caches[node_url] = RpcHeadCache(self.newRpcTransport(wllt_clnt_mngr, node_url),
+                                                      network_config['BLOCK_TIME_IN_SEC'])
+
+        return self.head_caches[node_url]
+
     def newBlockApi(self, network_config, wllt_clnt_mngr, node_url):
         if self.provider == 'rpc':
-            return RpcBlockApiImpl(network_config, wllt_clnt_mngr, node_url)
+            return RpcBlockApiImpl(network_config, self.newRpcTransport(wllt_clnt_mngr, node_url),
+                                   self.newHeadCache(network_config, wllt_clnt_mngr, node_url))
         elif self.provider == 'tzscan':
             if not self.mirror_selector:
                 self.init_mirror_selector(network_config)
-            return TzScanBlockApiImpl(network_config, self.mirror_selector)
+            return TzScanBlockApiImpl(network_config, self.mirror_selector, self.session_manager)
 
         raise Exception("No supported reward data provider : {}".format(self.provider))
 
-    def newCalcApi(self, founders_map, min_delegation_amt, excluded_delegators_set, rc):
+    def close(self):
+        # stops background probing of node pools and tzscan validation
+        for transport in self.transports.values():
+            if isinstance(transport, HttpRpcTransport):
+                transport.node_pool.stop()
+
+        if self.validate_executor:
+            self.validate_executor.shutdown(wait=False)
+
+    def newCalcApi(self, founders_map, min_delegation_amt, excluded_delegators_set, rc, fee_calc=None):
         if self.provider == 'rpc':
-            return RpcRewardCalculatorApi(founders_map, min_delegation_amt, excluded_delegators_set, rc)
+            return RpcRewardCalculatorApi(founders_map, min_delegation_amt, excluded_delegators_set, rc,
+                                          columnar=self.columnar_calc, fee_calc=fee_calc)
         elif self.provider == 'tzscan':
-            return TzScanRewardCalculatorApi(founders_map, min_delegation_amt, excluded_delegators_set, rc)
+            return TzScanRewardCalculatorApi(founders_map, min_delegation_amt, excluded_delegators_set, rc,
+                                             columnar=self.columnar_calc, fee_calc=fee_calc)
 
         raise Exception("No supported reward data provider : {}".format(self.provider))
@@ -0,0 +1,139 @@
+"""
+Compares optimized code paths with the straightforward ones they replace. Run from src directory:
+
+python3 -m benchmarks.run_benchmarks
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+
+from calc.payment_calculator import PaymentCalculator
+from calc.service_fee_calculator import ServiceFeeCalculator
+from log_config import main_logger
+from pay.operation_builder import OperationBuilder, DUMMY_SIGNATURE, forge_body, run_operation_body, preapply_body
+from rpc.rpc_reward_calculator import RpcRewardCalculatorApi
+from util.rounding_command import RoundingCommand
+
+
+def benchmark_reward_calculation(nb_delegators, repeat=3):
+    """
+    Compares scalar and columnar calculation of rewards and payments of a synthetic delegator set.
+    Reports of both paths are checked to be identical.
+    :return: map of path name to seconds per run
+    """
+    rnd = random.Random(nb_delegators)
+    addresses = ["KT1{:033d}".format(i) for i in range(nb_delegators)]
+    balances = [rnd.choice([rnd.randint(1, 10 ** 6), rnd.randint(1, 10 ** 12)]) for _ in addresses]
+    reward_data = {"delegate_staking_balance": sum(balances) + 10 ** 13, "total_rewards": 123456789012,
+                   "delegators": dict(zip(addresses, balances))}
+
+    supporters_set = set(rnd.sample(addresses, 30))
+    specials_map = {address: 7 for address in rnd.sample(addresses, 50)}
+    excluded_set = set(rnd.sample(addresses, 20))
+    fee_calc = ServiceFeeCalculator(supporters_set, specials_map, 9.5, excluded_set, 1, fee_tiers={1000: 8, 10000: 5})
+    rc = RoundingCommand(6)
+
+    def run(columnar):
+        calc_api = RpcRewardCalculatorApi({}, 1, set(), rc, columnar=columnar, fee_calc=fee_calc)
+        rewards, total_rewards = calc_api.calculate(reward_data)
+        return PaymentCalculator({"tz1founder": 1}, {}, rewards, total_rewards, fee_calc, 100, RoundingCommand(3)) \
+            .calculate()
+
+    results = {}
+    reports = {}
+    for name, columnar in [("scalar", False), ("columnar", True)]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            reports[name] = run(columnar)
+        results[name] = (time.perf_counter() - start) / repeat
+
+    def rows(report):
+        return list(zip(report.addresses, report.types, report.ratios, report.fee_rates, report.rewards, report.fees,
+                        report.payments))
+
+    if rows(reports["scalar"]) != rows(reports["columnar"]):
+        raise Exception("Columnar payments differ from scalar payments for {} delegators".format(nb_delegators))
+
+    return results
+
+
+
+def benchmark_request_bodies(nb_operations, repeat=5):
+    """
+    Compares building all request bodies of a batch with the builder and with chained template replaces.
+    :return: map of path name to seconds per run
+    """
+    content_template = '{"kind":"transaction","source":"%SOURCE%","destination":"%DESTINATION%","fee":"%fee%",' \
+                       '"counter":"%COUNTER%","gas_limit": "%gas_limit%", "storage_limit": "%storage_limit%",' \
+                       '"amount":"%AMOUNT%"}'
+    forge_template = '{"branch": "%BRANCH%","contents":[%CONTENT%]}'
+    runops_template = '{"branch": "%BRANCH%","contents":[%CONTENT%], "signature":"' + DUMMY_SIGNATURE + '"}'
+    preapply_template = '[{"protocol":"%PROTOCOL%","branch":"%BRANCH%","contents":[%CONTENT%],' \
+                        '"signature":"%SIGNATURE%"}]'
+
+    source = "KT1VYLbR7Cp4xxywWR4c12BPbkmrqSf5UXad"
+    destinations = ["tz1KqTpEZ7Yob7QbPE4Hy4Wo8fHG8LhKxZSx"] * nb_operations
+    branch, protocol = "BLockGenesisGenesisGenesisGenesisGenesisf79b5d1CoW2", "Pt24m4xiPbLDhVgVfABUjirbmda3yohdN82Sp9FeuAXJ4eV9otd"
+
+    def templates():
+        content_list = []
+        for counter, destination in enumerate(destinations):
+            content_list.append(content_template.replace("%SOURCE%", source).replace("%DESTINATION%", destination)
+                                .replace("%AMOUNT%", str(1000000 + counter)).replace("%COUNTER%", str(counter))
+                                .replace("%fee%", "1300").replace("%gas_limit%", "10300")
+                                .replace("%storage_limit%", "0"))
+        contents_string = ",".join(content_list)
+        return [forge_template.replace('%BRANCH%', branch).replace("%CONTENT%", contents_string),
+                runops_template.replace('%BRANCH%', branch).replace("%CONTENT%", contents_string),
+                preapply_template.replace('%BRANCH%', branch).replace("%CONTENT%", contents_string)
+                    .replace("%PROTOCOL%", protocol).replace("%SIGNATURE%", DUMMY_SIGNATURE)]
+
+    def builder():
+        op_builder = OperationBuilder(source, 1300, 10300, 0)
+        contents_json = op_builder.serialize([op_builder.transaction(destination, 1000000 + counter, counter)
+                                              for counter, destination in enumerate(destinations)])
+        return [forge_body(branch, contents_json), run_operation_body(branch, contents_json),
+                preapply_body(protocol, branch, contents_json, DUMMY_SIGNATURE)]
+
+    results = {}
+    for name, function in [("templates", templates), ("builder", builder)]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        results[name] = (time.perf_counter() - start) / repeat
+
+    return results
+
+
+
+def main(args):
+    # per delegator debug logs would be timed along with calculations
+    main_logger.setLevel(logging.WARNING)
+
+    for nb_delegators in args.delegators:
+        timings = benchmark_reward_calculation(nb_delegators)
+        print("{} delegators: scalar {:.1f} ms, columnar {:.1f} ms".format(
+            nb_delegators, timings["scalar"] * 1000, timings["columnar"] * 1000))
+
+    for nb_operations in args.operations:
+        timings = benchmark_request_bodies(nb_operations)
+        print("{} operations: templates {:.2f} ms, builder {:.2f} ms".format(
+            nb_operations, timings["templates"] * 1000, timings["builder"] * 1000))
+
+
+if __name__ == '__main__':
+
+    if sys.version_info[0] < 3:
+        raise Exception("Must be using Python 3")
+
+    parser = argparse.ArgumentParser(description="Benchmark reward calculation and operation building")
+    parser.add_argument("--delegators", help="Numbers of synthetic delegators to calculate rewards of", nargs="*",
+                        default=[1000, 100000], type=int)
+    parser.add_argument("--operations", help="Numbers of transactions to build request bodies of", nargs="*",
+                        default=[280, 10000], type=int)
+
+    args = parser.parse_args()
+
+    main(args)
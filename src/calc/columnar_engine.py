@@ -0,0 +1,99 @@
+from array import array
+
+from log_config import main_logger
+from model.payment_log import PaymentRecord
+
+logger = main_logger
+
+
+class RewardColumns:
+    """
+    Rewards of delegators kept as columns instead of one PaymentRecord per delegator.
+    Iterating yields PaymentRecord objects, so that scalar consumers can still use it.
+    """
+
+    def __init__(self, addresses, ratios, rewards, fee_rates=None, balances=None) -> None:
+        super().__init__()
+        self.addresses = addresses
+        self.ratios = ratios
+        self.rewards = rewards
+        # delegated balances in mutez, fee tiers of delegators are looked up by them
+        self.balances = balances if balances is not None else [None] * len(addresses)
+        # fee rates resolved by reward calculator, None if fee rates are left to payment calculation
+        self.fee_rates = fee_rates
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __iter__(self):
+        fee_rates = self.fee_rates if self.fee_rates is not None else [None] * len(self.addresses)
+        for address, ratio, reward, fee_rate, balance in zip(self.addresses, self.ratios, self.rewards, fee_rates,
+                                                             self.balances):
+            yield PaymentRecord(address=address, reward=reward, ratio=ratio, fee_rate=fee_rate, balance=balance)
+
+
+def round_column(values, rc):
+    if rc.scale:
+        return array('d', [round(value, rc.scale) for value in values])
+    return array('d', values)
+
+
+def calculate_rewards(addresses, balances, delegate_staking_balance, total_rewards, excluded, min_delegations, rc,
+                      fee_rates=None):
+    """
+    Column version of reward calculators. Excluded delegators' balances are removed from staking balance,
+    delegators below minimum delegation are skipped, others share total_rewards by their balance.
+    :param addresses: delegator addresses
+    :param balances: delegator balances in mutez, same order as addresses
+    :param excluded: excluded flags, same order as addresses
+    :param min_delegations: minimum delegation amounts in mutez, same order as addresses
+    :param total_rewards: rewards in mutez
+    :param fee_rates: optional fee rates, same order as addresses
+    :return: RewardColumns, rewards are in mutez
+    """
+    effective_delegate_staking_balance = delegate_staking_balance - sum(
+        balance for balance, is_excluded in zip(balances, excluded) if is_excluded)
+
+    selected = [i for i, is_excluded in enumerate(excluded)
+                if not is_excluded and balances[i] >= min_delegations[i]]
+
+    nb_skipped = len(addresses) - excluded.count(True) - len(selected)
+    if nb_skipped:
+        logger.debug("Skipping {} delegators: Low delegation amount".format(nb_skipped))
+
+    ratios = round_column([balances[i] / effective_delegate_staking_balance for i in selected], rc)
+    rewards = array('q', [total_rewards * balances[i] // effective_delegate_staking_balance for i in selected])
+
+    return RewardColumns([addresses[i] for i in selected], ratios, rewards,
+                         [fee_rates[i] for i in selected] if fee_rates is not None else None,
+                         array('q', [balances[i] for i in selected]))
+
+
+def calculate_delegator_payments(reward_columns, fee_calc, rounding_command):
+    """
+    Column version of delegators step of PaymentCalculator.
+    :return: (fee_rates, payments, fees) columns in order of reward_columns, amounts are in mutez
+    """
+    rewards = reward_columns.rewards
+    unit = rounding_command.unit
+
+    fee_rates = reward_columns.fee_rates
+    if fee_rates is None:
+        fee_rates = [fee_calc.calculate(address, balance) for address, balance in
+                     zip(reward_columns.addresses, reward_columns.balances)]
+
+    # there are only a few distinct fee rates (same objects), share of delegator is computed once per rate
+    distinct = {id(fee_rate): fee_rate for fee_rate in fee_rates}
+    shares = {key: (fee_rate.denominator - fee_rate.numerator, fee_rate.denominator, float(fee_rate))
+              for key, fee_rate in distinct.items()}
+    rate_shares = [shares[id(fee_rate)] for fee_rate in fee_rates]
+
+    payments = array('q', [reward * share // denominator for reward, (share, denominator, _) in
+                           zip(rewards, rate_shares)])
+    if unit > 1:
+        payments = array('q', [payment - payment % unit for payment in payments])
+
+    fees = array('q', [reward - payment for reward, payment in zip(rewards, payments)])
+
+    return array('d', [float_rate for _, _, float_rate in rate_shares]), payments, fees
+
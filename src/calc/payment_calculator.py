@@ -1,5 +1,8 @@
-from model.payment_log import PaymentRecord
-from util.num_utils import floorf
+from math import floor
+
+from calc.columnar_engine import RewardColumns, calculate_delegator_payments
+from model.payment_batch import PaymentBatch
+from util.num_utils import to_fraction
 
 
 class PaymentCalculator:
@@ -20,30 +23,18 @@ class PaymentCalculator:
     # owners reward = owners payment = total reward - delegators reward
     # founders reward = delegators fee = total reward - delegators reward
     ####
+    # all amounts are in mutez. Amounts are rounded down; rounding leftovers of delegators and owners end up in
+    # founders reward. Leftover of dividing founders reward among founders is given to the last founder.
+    # If there are no founders, baker keeps founders reward.
+    ####
     def calculate(self):
-        pymnts = []
+        pymnts = PaymentBatch(self.cycle)
 
         # 1- calculate delegators payments
-        delegators_total_pymnt = 0
-        delegators_total_ratio = 0
-        delegators_total_fee = 0
-        for ri in self.reward_list:
-            # set fee rate
-            fee_rate = self.fee_calc.calculate(ri.address)
-            pymnt_amnt = self.rounding_command.roundDown(ri.reward * (1 - fee_rate))
-
-            # this indicates, service fee is very low (e.g. 0) and pymnt_amnt is rounded up
-            if pymnt_amnt - ri.reward > 0:
-                pymnt_amnt = ri.reward
-
-            fee = (ri.reward - pymnt_amnt)
-
-            pr = PaymentRecord.DelegatorInstance(self.cycle, ri.address, ri.ratio, fee_rate, ri.reward, fee, pymnt_amnt)
-            pymnts.append(pr)
-
-            delegators_total_pymnt = delegators_total_pymnt + pymnt_amnt
-            delegators_total_ratio = delegators_total_ratio + ri.ratio
-            delegators_total_fee = delegators_total_fee + fee
+        if isinstance(self.reward_list, RewardColumns):
+            delegators_total_pymnt, delegators_total_fee = self.calculate_delegators_columnar(pymnts)
+        else:
+            delegators_total_pymnt, delegators_total_fee = self.calculate_delegators(pymnts)
 
         # 2- calculate deposit owners payments. They share the remaining rewards according to their ratio (check config)
         owners_total_pymnt = 0
@@ -54,9 +45,9 @@ class PaymentCalculator:
         if len(self.owners_map) > 0:
             no_owners = False
             for address, ratio in self.owners_map.items():
-                owner_pymnt_amnt = self.rounding_command.roundDown(ratio * owners_total_reward)
+                owner_pymnt_amnt = self.rounding_command.roundDown(floor(to_fraction(ratio) * owners_total_reward))
                 owners_total_pymnt = owners_total_pymnt + owner_pymnt_amnt
-                pymnts.append(PaymentRecord.OwnerInstance(self.cycle, address, ratio, owner_pymnt_amnt, owner_pymnt_amnt))
+                pymnts.append_row(address, 'O', ratio, 0, owner_pymnt_amnt, 0, owner_pymnt_amnt)
 
         # move remaining rewards to service fee bucket
         # 3- service fee is shared among founders according to founders_map ratios
@@ -72,17 +63,18 @@ class PaymentCalculator:
         if len(self.founders_map) > 0:
             no_founders = False
             for address, ratio in self.founders_map.items():
-                # founder pymnt is rounded to scale 6 regardless of the settings.
-                # because we allow difference between total_sum and self.total_rewards be less than 5e-6
-                founder_pymnt_amnt = floorf(ratio * founders_total_reward, 6)
-                pymnts.append(PaymentRecord.FounderInstance(self.cycle, address, ratio, founder_pymnt_amnt))
+                # founder pymnt is not rounded to payment scale, so that nothing is left to the last founder
+                # but the remainder of the division
+                founder_pymnt_amnt = floor(to_fraction(ratio) * founders_total_reward)
+                founders_total_pymnt = founders_total_pymnt + founder_pymnt_amnt
+                pymnts.append_row(address, 'F', ratio, 0, 0, 0, founder_pymnt_amnt)
+
+            pymnts.payments[-1] = pymnts.payments[-1] + (founders_total_reward - founders_total_pymnt)
 
         ###
         # sanity check
         #####
-        total_sum = 0
-        for payment_log in pymnts:
-            total_sum = total_sum + payment_log.payment
+        total_sum = pymnts.total_payment()
 
         # if no owners/no founders, add that would-be amount to total_sum
         # the baker will keep (owners_total_reward + founders_total_reward) automatically when unfrozen
@@ -91,13 +83,34 @@ class PaymentCalculator:
         if no_founders:
             total_sum = total_sum + founders_total_reward
 
-        # if there is a minor difference due to floor function; it is added to last payment
-        if self.total_rewards - total_sum > 1e-6:
-            last_pymnt_log = pymnts[-1]  # last payment, probably one of the founders
-            last_pymnt_log.payment = last_pymnt_log.payment + (self.total_rewards - total_sum)
-
         # this must never return true
-        if abs(total_sum - self.total_rewards) > 5e-6:
+        if total_sum != self.total_rewards:
             raise Exception("Calculated reward {} is not equal to total reward {}".format(total_sum, self.total_rewards))
 
         return pymnts
+
+    def calculate_delegators(self, pymnts):
+        delegators_total_pymnt = 0
+        delegators_total_fee = 0
+        for ri in self.reward_list:
+            # set fee rate, unless reward calculator resolved it already
+            fee_rate = ri.fee_rate if ri.fee_rate is not None else self.fee_calc.calculate(ri.address, ri.balance)
+            pymnt_amnt = self.rounding_command.roundDown(
+                ri.reward * (fee_rate.denominator - fee_rate.numerator) // fee_rate.denominator)
+
+            fee = (ri.reward - pymnt_amnt)
+
+            pymnts.append_row(ri.address, 'D', ri.ratio, float(fee_rate), ri.reward, fee, pymnt_amnt)
+
+            delegators_total_pymnt = delegators_total_pymnt + pymnt_amnt
+            delegators_total_fee = delegators_total_fee + fee
+
+        return delegators_total_pymnt, delegators_total_fee
+
+    def calculate_delegators_columnar(self, pymnts):
+        columns = self.reward_list
+        fee_rates, payments, fees = calculate_delegator_payments(columns, self.fee_calc, self.rounding_command)
+
+        pymnts.extend_columns('D', columns.addresses, columns.ratios, fee_rates, columns.rewards, fees, payments)
+
+        return sum(payments), sum(fees)
@@ -1,19 +1,101 @@
+from bisect import bisect_right
+
+from util.num_utils import to_fraction, to_mutez
+
+ZERO_FEE = to_fraction(0)
+
+
+class FeePolicy:
+    """
+    Policy of a delegator. fee_rate is None if fee rate is decided by balance (standard fee or fee tiers).
+    """
+    __slots__ = ('fee_rate', 'excluded', 'min_delegation_mutez')
+
+    def __init__(self, fee_rate=None, excluded=False, min_delegation_mutez=0) -> None:
+        self.fee_rate = fee_rate
+        self.excluded = excluded
+        self.min_delegation_mutez = min_delegation_mutez
+
+
 class ServiceFeeCalculator:
-    def __init__(self, supporters_set, specials_map, standard_fee):
-        self.supporters_set = supporters_set
-        self.specials_map = {}
+    """
+    Precompiled address -> policy index. Supporters, specials, excluded delegators and minimum delegation overrides
+    are merged into a single map, so that a delegator list is processed with one lookup per delegator.
+
+    fee_tiers map minimum balance in tez to fee. Delegators without a special rate pay the fee of the highest tier
+    their balance reaches, or the standard fee if they reach none.
+    """
+
+    def __init__(self, supporters_set, specials_map, standard_fee, excluded_set=None, min_delegation_amt=0,
+                 min_delegation_map=None, fee_tiers=None):
+        # fee rates are kept as exact fractions, so that fees in mutez are not affected by float representation
+        self.standard_fee = to_fraction(standard_fee) / 100
 
-        self.standard_fee = standard_fee / 100.0
+        # tier thresholds in mutez, ascending, and fee rates of tiers. Fee rate objects are shared by all
+        # delegators of a tier.
+        tiers = sorted((to_mutez(balance), to_fraction(fee) / 100) for balance, fee in (fee_tiers or {}).items())
+        self.tier_balances = [balance for balance, _ in tiers]
+        self.tier_fees = [fee for _, fee in tiers]
 
+        self.default_policy = FeePolicy(min_delegation_mutez=to_mutez(min_delegation_amt))
+
+        self.policies = {}
         for addr, ratio in specials_map.items():
-            self.specials_map[addr] = ratio / 100.0
+            self.__policy(addr).fee_rate = to_fraction(ratio) / 100
+        for addr in supporters_set:
+            self.__policy(addr).fee_rate = ZERO_FEE
+        for addr, amount in (min_delegation_map or {}).items():
+            self.__policy(addr).min_delegation_mutez = to_mutez(amount)
+        for addr in excluded_set or ():
+            self.__policy(addr).excluded = True
+
+    def __policy(self, address):
+        if address not in self.policies:
+            self.policies[address] = FeePolicy(min_delegation_mutez=self.default_policy.min_delegation_mutez)
+        return self.policies[address]
+
+    def get_policy(self, address):
+        return self.policies.get(address, self.default_policy)
+
+    def fee_for_balance(self, balance):
+        tier = bisect_right(self.tier_balances, balance)
+        return self.tier_fees[tier - 1] if tier else self.standard_fee
+
+    def calculate(self, ktAddress, balance):
+        """
+        :param balance: delegated balance in mutez, fee tier is selected by it
+        """
+        fee_rate = self.get_policy(ktAddress).fee_rate
+
+        if fee_rate is None and self.tier_balances:
+            if balance is None:
+                raise Exception("Balance of '{}' is needed to select a fee tier".format(ktAddress))
+            fee_rate = self.fee_for_balance(balance)
+        elif fee_rate is None:
+            fee_rate = self.standard_fee
+
+        return fee_rate
+
+    def apply(self, addresses, balances):
+        """
+        Resolves policies of a delegator list in one pass.
+        :param addresses: delegator addresses
+        :param balances: delegator balances in mutez, same order as addresses
+        :return: (fee_rates, excluded, min_delegations) columns in order of addresses
+        """
+        fee_rates, excluded, min_delegations = [], [], []
+        policies, default_policy = self.policies, self.default_policy
+        tiered = bool(self.tier_balances)
+
+        for address, balance in zip(addresses, balances):
+            policy = policies.get(address, default_policy)
 
-    def calculate(self, ktAddress):
-        service_fee = self.standard_fee
+            fee_rate = policy.fee_rate
+            if fee_rate is None:
+                fee_rate = self.fee_for_balance(balance) if tiered else self.standard_fee
 
-        if ktAddress in self.supporters_set:
-            service_fee = 0.0
-        elif ktAddress in self.specials_map:
-            service_fee = self.specials_map[ktAddress]
+            fee_rates.append(fee_rate)
+            excluded.append(policy.excluded)
+            min_delegations.append(policy.min_delegation_mutez)
 
-        return service_fee
+        return fee_rates, excluded, min_delegations
@@ -0,0 +1,62 @@
+import random
+from unittest import TestCase
+
+from calc.payment_calculator import PaymentCalculator
+from calc.service_fee_calculator import ServiceFeeCalculator
+from rpc.rpc_reward_calculator import RpcRewardCalculatorApi
+from tzscan.tzscan_reward_calculator import TzScanRewardCalculatorApi
+from util.rounding_command import RoundingCommand
+
+FIELDS = ["cycle", "address", "ratio", "fee_rate", "reward", "fee", "type", "payment", "paid", "hash"]
+
+
+def as_rows(payment_logs):
+    return [tuple(getattr(pl, field) for field in FIELDS) for pl in payment_logs]
+
+
+class TestColumnarEngine(TestCase):
+
+    def setUp(self):
+        rnd = random.Random(42)
+        self.addresses = ["KT1{:033d}".format(i) for i in range(2000)]
+        self.balances = [rnd.choice([rnd.randint(1, 10 ** 6), rnd.randint(1, 10 ** 12)]) for _ in self.addresses]
+        self.staking_balance = sum(self.balances) + 10 ** 13
+        self.total_rewards = 123456789012
+
+        self.excluded_set = set(rnd.sample(self.addresses, 20))
+        supporters_set = set(rnd.sample(self.addresses, 30))
+        specials_map = {address: rnd.choice([0, 2.5, 7, 12.3]) for address in rnd.sample(self.addresses, 50)}
+        self.fee_calc = ServiceFeeCalculator(supporters_set, specials_map, 9.5)
+        self.founders_map = {"tz1founder1": 0.3, "tz1founder2": 0.7}
+        self.owners_map = {"tz1owner1": 0.6, "tz1owner2": 0.4}
+
+    def payments(self, calc_api, reward_data, scale):
+        rewards, total_rewards = calc_api.calculate(reward_data)
+        pymnt_calc = PaymentCalculator(self.founders_map, self.owners_map, rewards, total_rewards, self.fee_calc,
+                                       100, RoundingCommand(scale))
+        return as_rows(pymnt_calc.calculate())
+
+    def test_rpc_columnar_matches_scalar(self):
+        reward_data = {"delegate_staking_balance": self.staking_balance, "total_rewards": self.total_rewards,
+                       "delegators": dict(zip(self.addresses, self.balances))}
+
+        for scale in [None, 6, 3]:
+            rc = RoundingCommand(scale)
+            scalar = RpcRewardCalculatorApi({}, 1, self.excluded_set, rc)
+            columnar = RpcRewardCalculatorApi({}, 1, self.excluded_set, rc, columnar=True)
+
+            self.assertEqual(self.payments(scalar, reward_data, scale), self.payments(columnar, reward_data, scale))
+
+    def test_tzscan_columnar_matches_scalar(self):
+        reward_data = {"delegate_staking_balance": str(self.staking_balance), "blocks_rewards": self.total_rewards,
+                       "future_blocks_rewards": 0, "endorsements_rewards": 7654321, "future_endorsements_rewards": 0,
+                       "lost_rewards_denounciation": 0, "lost_fees_denounciation": 0, "fees": 1234,
+                       "delegators_balance": [[{"tz": address}, str(balance)]
+                                              for address, balance in zip(self.addresses, self.balances)]}
+
+        for scale in [None, 6, 3]:
+            rc = RoundingCommand(scale)
+            scalar = TzScanRewardCalculatorApi({}, 1, self.excluded_set, rc)
+            columnar = TzScanRewardCalculatorApi({}, 1, self.excluded_set, rc, columnar=True)
+
+            self.assertEqual(self.payments(scalar, reward_data, scale), self.payments(columnar, reward_data, scale))
@@ -0,0 +1,39 @@
+from unittest import TestCase
+
+from calc.payment_calculator import PaymentCalculator
+from calc.service_fee_calculator import ServiceFeeCalculator
+from model.payment_log import PaymentRecord
+from util.num_utils import to_mutez, format_tez
+from util.rounding_command import RoundingCommand
+
+
+class TestPaymentCalculator(TestCase):
+
+    def test_integer_payments(self):
+        total_rewards = 1000000007
+        rewards = [PaymentRecord(address="KT1a", reward=333333335, ratio=1 / 3),
+                   PaymentRecord(address="KT1b", reward=333333335, ratio=1 / 3),
+                   PaymentRecord(address="KT1c", reward=100000001, ratio=0.1)]
+        fee_calc = ServiceFeeCalculator({"KT1c"}, {"KT1b": 7.3}, 9.5)
+        founders_map = {"tz1founder1": 0.3, "tz1founder2": 0.7}
+
+        pymnts = PaymentCalculator(founders_map, {}, rewards, total_rewards, fee_calc, 10, RoundingCommand(3)).calculate()
+        by_address = {pl.address: pl for pl in pymnts}
+
+        # 90.5% of 333.333335 rounded down to 3 digits
+        self.assertEqual(301666000, by_address["KT1a"].payment)
+        self.assertEqual(333333335 - 301666000, by_address["KT1a"].fee)
+        self.assertEqual(309000000, by_address["KT1b"].payment)
+        self.assertEqual(100000000, by_address["KT1c"].payment)
+
+        # founders share fees exactly, last founder takes the remainder
+        fees = sum(pl.fee for pl in pymnts if pl.type == 'D')
+        self.assertEqual(fees * 3 // 10, by_address["tz1founder1"].payment)
+        self.assertEqual(fees, by_address["tz1founder1"].payment + by_address["tz1founder2"].payment)
+
+    def test_tez_conversion(self):
+        self.assertEqual(12345678, to_mutez("12.345678"))
+        self.assertEqual(300000, to_mutez(0.3))
+        self.assertEqual("12.345678", format_tez(12345678))
+        self.assertEqual("0.000001", format_tez(1))
+        self.assertEqual("-1.500000", format_tez(-1500000))
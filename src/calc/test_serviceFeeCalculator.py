@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+from calc.payment_calculator import PaymentCalculator
+from calc.service_fee_calculator import ServiceFeeCalculator, ZERO_FEE
+from rpc.rpc_reward_calculator import RpcRewardCalculatorApi
+from util.num_utils import to_fraction
+from util.rounding_command import RoundingCommand
+
+
+class TestServiceFeeCalculator(TestCase):
+
+    def setUp(self):
+        self.fee_calc = ServiceFeeCalculator({"KT1sup"}, {"KT1spc": 7.5, "KT1sup": 3}, 10, {"KT1exc"}, 100,
+                                             {"KT1low": 1}, {1000: 8, 10000: 5})
+
+    def test_apply(self):
+        addresses = ["KT1sup", "KT1spc", "KT1exc", "KT1low", "KT1a", "KT1b", "KT1c"]
+        balances = [10 ** 11, 10 ** 11, 10 ** 11, 2 * 10 ** 6, 999 * 10 ** 6, 1000 * 10 ** 6, 10 ** 11]
+
+        fee_rates, excluded, min_delegations = self.fee_calc.apply(addresses, balances)
+
+        # supporters take precedence over specials, specials over tiers
+        self.assertEqual([ZERO_FEE, to_fraction(7.5) / 100, to_fraction(5) / 100, to_fraction(10) / 100,
+                          to_fraction(10) / 100, to_fraction(8) / 100, to_fraction(5) / 100], fee_rates)
+        self.assertEqual([False, False, True, False, False, False, False], excluded)
+        self.assertEqual([100000000, 100000000, 100000000, 1000000, 100000000, 100000000, 100000000], min_delegations)
+
+        self.assertEqual(fee_rates, [self.fee_calc.calculate(a, b) for a, b in zip(addresses, balances)])
+
+    def test_tiered_payments(self):
+        reward_data = {"delegate_staking_balance": 10 ** 12, "total_rewards": 10 ** 9,
+                       "delegators": {"KT1exc": 10 ** 11, "KT1low": 2 * 10 ** 6, "KT1x": 50 * 10 ** 6,
+                                      "KT1a": 500 * 10 ** 6, "KT1c": 10 ** 11}}
+
+        for columnar in [False, True]:
+            calc_api = RpcRewardCalculatorApi({}, 0, set(), RoundingCommand(None), columnar=columnar,
+                                              fee_calc=self.fee_calc)
+            rewards, total_rewards = calc_api.calculate(reward_data)
+            pymnts = PaymentCalculator({}, {}, rewards, total_rewards, self.fee_calc, 1, RoundingCommand(None)).calculate()
+            by_address = {pl.address: pl for pl in pymnts}
+
+            # excluded and below minimum delegation are skipped, min delegation override lets KT1low in
+            self.assertEqual({"KT1low", "KT1a", "KT1c"}, set(by_address))
+            self.assertEqual(0.1, by_address["KT1a"].fee_rate)
+            self.assertEqual(0.05, by_address["KT1c"].fee_rate)
+
+    def test_tiered_payments_without_resolved_fees(self):
+        # reward calculator does not resolve fee rates, payment calculator looks them up by delegator balance
+        reward_data = {"delegate_staking_balance": 10 ** 12, "total_rewards": 10 ** 9,
+                       "delegators": {"KT1spc": 10 ** 11, "KT1a": 500 * 10 ** 6, "KT1b": 2000 * 10 ** 6,
+                                      "KT1c": 10 ** 11}}
+
+        for columnar in [False, True]:
+            calc_api = RpcRewardCalculatorApi({}, 0, set(), RoundingCommand(None), columnar=columnar)
+            rewards, total_rewards = calc_api.calculate(reward_data)
+            pymnts = PaymentCalculator({}, {}, rewards, total_rewards, self.fee_calc, 1, RoundingCommand(None)).calculate()
+            by_address = {pl.address: pl for pl in pymnts}
+
+            self.assertEqual(0.075, by_address["KT1spc"].fee_rate)
+            self.assertEqual(0.1, by_address["KT1a"].fee_rate)
+            self.assertEqual(0.08, by_address["KT1b"].fee_rate)
+            self.assertEqual(0.05, by_address["KT1c"].fee_rate)
+
+    def test_balance_is_needed_for_tiers(self):
+        self.assertEqual(to_fraction(7.5) / 100, self.fee_calc.calculate("KT1spc", None))
+        self.assertRaises(Exception, self.fee_calc.calculate, "KT1a", None)
@@ -3,7 +3,7 @@ from config.yaml_conf_parser import YamlConfParser
 from exception.configuration import ConfigurationException
 from model.baking_conf import FOUNDERS_MAP, OWNERS_MAP, BAKING_ADDRESS, SUPPORTERS_SET, EXCLUDED_DELEGATORS_SET, \
     PYMNT_SCALE, PRCNT_SCALE, SERVICE_FEE, FULL_SUPPORTERS_SET, MIN_DELEGATION_AMT, PAYMENT_ADDRESS, SPECIALS_MAP, \
-    DELEGATOR_PAYS_XFER_FEE
+    DELEGATOR_PAYS_XFER_FEE, FEE_TIERS, MIN_DELEGATION_MAP
 from util.address_validator import AddressValidator
 from util.fee_validator import FeeValidator
 
@@ -32,6 +32,8 @@ class BakingYamlConfParser(YamlConfParser):
         self.__validate_address_set(conf_obj, SUPPORTERS_SET)
         self.__validate_address_set(conf_obj, EXCLUDED_DELEGATORS_SET)
         self.__validate_specials_map(conf_obj)
+        self.__validate_fee_tiers(conf_obj)
+        self.__validate_min_delegation_map(conf_obj)
         self.__validate_scale(conf_obj, PYMNT_SCALE)
         self.__validate_scale(conf_obj, PRCNT_SCALE)
         self.__parse_bool(conf_obj, DELEGATOR_PAYS_XFER_FEE, True)
@@ -175,6 +177,37 @@ class BakingYamlConfParser(YamlConfParser):
             addr_validator.validate(key)
             FeeValidator("specials_map:" + key).validate(value)
 
+    def __validate_fee_tiers(self, conf_obj):
+        if FEE_TIERS not in conf_obj or not conf_obj[FEE_TIERS]:
+            conf_obj[FEE_TIERS] = dict()
+            return
+
+        if isinstance(conf_obj[FEE_TIERS], str) and conf_obj[FEE_TIERS].lower() == 'none':
+            conf_obj[FEE_TIERS] = dict()
+            return
+
+        for key, value in conf_obj[FEE_TIERS].items():
+            if not self.__validate_non_negative_int(key):
+                raise ConfigurationException("Invalid value:'{}'. {} minimum balances must be non negative integers".
+                                             format(key, FEE_TIERS))
+            FeeValidator("fee_tiers:" + str(key)).validate(value)
+
+    def __validate_min_delegation_map(self, conf_obj):
+        if MIN_DELEGATION_MAP not in conf_obj or not conf_obj[MIN_DELEGATION_MAP]:
+            conf_obj[MIN_DELEGATION_MAP] = dict()
+            return
+
+        if isinstance(conf_obj[MIN_DELEGATION_MAP], str) and conf_obj[MIN_DELEGATION_MAP].lower() == 'none':
+            conf_obj[MIN_DELEGATION_MAP] = dict()
+            return
+
+        addr_validator = AddressValidator(MIN_DELEGATION_MAP)
+        for key, value in conf_obj[MIN_DELEGATION_MAP].items():
+            addr_validator.validate(key)
+            if not self.__validate_non_negative_int(value):
+                raise ConfigurationException("Invalid value:'{}'. {} amounts must be non negative integers".
+                                             format(value, MIN_DELEGATION_MAP))
+
     def __validate_address_set(self, conf_obj, set_name):
         if set_name not in conf_obj:
             conf_obj[set_name] = set()
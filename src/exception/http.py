@@ -0,0 +1,2 @@
+class CircuitOpenException(Exception):
+    pass
@@ -0,0 +1,2 @@
+class OperationLimitException(Exception):
+    pass
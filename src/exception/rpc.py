@@ -0,0 +1,2 @@
+class RpcException(Exception):
+    pass
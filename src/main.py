@@ -16,12 +16,17 @@ from config.yaml_baking_conf_parser import BakingYamlConfParser
 from config.yaml_conf_parser import YamlConfParser
 from log_config import main_logger
 from model.baking_conf import BakingConf
+from pay.batch_payer import FORGE_LOCAL, FORGE_VERIFY, FORGE_RPC
 from pay.payment_consumer import PaymentConsumer
 from pay.payment_producer import PaymentProducer
+from pay.snapshot_prefetcher import SnapshotPrefetcher
+from rpc.rpc_reward_api import BALANCE_STRATEGIES, BALANCE_STRATEGY_CONTRACT
 from util.client_utils import get_client_path
 from util.dir_utils import get_payment_root, \
-    get_calculations_root, get_successful_payments_dir, get_failed_payments_dir
+    get_calculations_root, get_successful_payments_dir, get_failed_payments_dir, get_cache_file
+from util.http_session import SessionManager, DEFAULT_TIMEOUT, DEFAULT_RATE, DEFAULT_BURST
 from util.process_life_cycle import ProcessLifeCycle
+from util.response_cache import ResponseCache, MB
 
 LINER = "--------------------------------------------"
 
@@ -74,7 +79,12 @@ def main(args):
 
     # 4. get network config     
     config_client_manager = SimpleClientManager(client_path)
-    network_config_map = init_network_config(args.network, config_client_manager, args.node_addr)
+    # reward data may be read from several nodes, everything else is done through the first one
+    primary_node_addr = args.node_addr.split(',')[0].strip()
+    # connections to tzscan and public nodes are shared by all apis
+    session_manager = SessionManager(timeout=args.http_timeout, rate=args.http_rate, burst=args.http_burst)
+    network_config_map = init_network_config(args.network, config_client_manager, primary_node_addr,
+                                             session_manager)
     network_config = network_config_map[args.network]
 
     # 5- load baking configuration file
@@ -85,7 +95,16 @@ def main(args):
     wllt_clnt_mngr = WalletClientManager(client_path, contracts_by_alias, addresses_by_pkh, managers,
                                          verbose=args.verbose)
 
-    provider_factory = ProviderFactory(args.reward_data_provider)
+    # responses at finalized blocks never change, keep them on disk across runs
+    response_cache = None
+    if args.cache_max_size > 0:
+        cache_file = get_cache_file(os.path.expanduser(args.cache_dir), args.network)
+        logger.info("Using response cache {}".format(cache_file))
+        response_cache = ResponseCache(cache_file, args.cache_max_size * MB)
+
+    provider_factory = ProviderFactory(args.reward_data_provider, args.rpc_transport, args.rpc_parallelism,
+                                       response_cache, args.rpc_balance_strategy, session_manager,
+                                       args.tzscan_immutable_finalized, args.columnar_calc)
     parser = BakingYamlConfParser(ConfigParser.load_file(config_file_path), wllt_clnt_mngr, provider_factory,
                                   network_config, args.node_addr)
     parser.parse()
@@ -129,7 +148,9 @@ def main(args):
     life_cycle.start(not dry_run)
 
     # 9- service fee calculator
-    srvc_fee_calc = ServiceFeeCalculator(cfg.get_full_supporters_set(), cfg.get_specials_map(), cfg.get_service_fee())
+    srvc_fee_calc = ServiceFeeCalculator(cfg.get_full_supporters_set(), cfg.get_specials_map(), cfg.get_service_fee(),
+                                         cfg.get_excluded_delegators_set(), cfg.get_min_delegation_amount(),
+                                         cfg.get_min_delegation_map(), cfg.get_fee_tiers())
 
     if args.initial_cycle is None:
         recent = get_latest_report_file(payments_root)
@@ -144,14 +165,27 @@ def main(args):
                         service_fee_calc=srvc_fee_calc, release_override=args.release_override,
                         payment_offset=args.payment_offset, baking_cfg=cfg, life_cycle=life_cycle,
                         payments_queue=payments_queue, dry_run=dry_run, wllt_clnt_mngr=wllt_clnt_mngr,
-                        node_url=args.node_addr, provider_factory=provider_factory, verbose=args.verbose)
+                        node_url=args.node_addr, provider_factory=provider_factory, verbose=args.verbose,
+                        backfill_parallelism=args.backfill_parallelism)
     p.start()
 
+    # persisted delegator balances need the response cache
+    if args.reward_data_provider == 'rpc' and response_cache and not args.no_snapshot_prefetch:
+        prefetcher = SnapshotPrefetcher(name='prefetcher', network_config=network_config,
+                                        reward_api=provider_factory.newRewardApi(network_config, baking_address,
+                                                                                 wllt_clnt_mngr, args.node_addr,
+                                                                                 validate=False),
+                                        block_api=provider_factory.newBlockApi(network_config, wllt_clnt_mngr,
+                                                                               args.node_addr),
+                                        life_cycle=life_cycle, verbose=args.verbose)
+        prefetcher.start()
+
     for i in range(NB_CONSUMERS):
         c = PaymentConsumer(name='consumer' + str(i), payments_dir=payments_root, key_name=payment_address,
-                            client_path=client_path, payments_queue=payments_queue, node_addr=args.node_addr,
+                            client_path=client_path, payments_queue=payments_queue, node_addr=primary_node_addr,
                             wllt_clnt_mngr=wllt_clnt_mngr, verbose=args.verbose, dry_run=dry_run,
-                            delegator_pays_xfer_fee=cfg.get_delegator_pays_xfer_fee())
+                            delegator_pays_xfer_fee=cfg.get_delegator_pays_xfer_fee(), forge_mode=args.forge_mode,
+                            rpc_transport=provider_factory.newRpcTransport(wllt_clnt_mngr, primary_node_addr))
         time.sleep(1)
         c.start()
 
@@ -163,6 +197,8 @@ def main(args):
         logger.info("Interrupted.")
         life_cycle.stop()
 
+    provider_factory.close()
+
 
 def get_baking_configuration_file(config_dir):
     config_file = None
@@ -209,7 +245,60 @@ if __name__ == '__main__':
                         default='tzscan')
     parser.add_argument("-r", "--reports_dir", help="Directory to create reports", default='~/pymnt/reports')
     parser.add_argument("-f", "--config_dir", help="Directory to find baking configurations", default='~/pymnt/cfg')
-    parser.add_argument("-A", "--node_addr", help="Node host:port pair", default='127.0.0.1:8732')
+    parser.add_argument("-A", "--node_addr",
+                        help="Node host:port pair. A comma separated list of nodes can be given to spread rpc reads "
+                             "among them. Reads go to the fastest healthy node and fail over to others. "
+                             "Payments are made through the first node.",
+                        default='127.0.0.1:8732')
+    parser.add_argument("-T", "--rpc_transport",
+                        help="How node RPC is read. 'http' talks to the node directly over a pooled connection. "
+                             "'client' calls tezos-client for each request, use it if the node is not reachable "
+                             "from this host (e.g. docker setups).",
+                        choices=['http', 'client'], default='http')
+    parser.add_argument("--rpc_parallelism",
+                        help="Maximum number of concurrent node RPC requests while fetching delegator balances.",
+                        default=8, type=int)
+    parser.add_argument("--rpc_balance_strategy",
+                        help="How delegator balances are read from node. 'contract' makes one request per delegator. "
+                             "'raw' reads all balances in a single raw context request and cross checks a sample "
+                             "of them against per delegator requests.",
+                        choices=BALANCE_STRATEGIES, default=BALANCE_STRATEGY_CONTRACT)
+    parser.add_argument("--cache_dir", help="Directory to keep cached node responses", default='~/pymnt/cache')
+    parser.add_argument("--cache_max_size",
+                        help="Maximum size of response cache in MB. Least recently used entries are evicted. "
+                             "Set to 0 to disable the cache.",
+                        default=512, type=int)
+    parser.add_argument("--tzscan_immutable_finalized",
+                        help="Serve tzscan data of cycles whose rewards are unfrozen from response cache without "
+                             "revalidating it. Other cached tzscan data is revalidated with conditional requests.",
+                        action="store_true")
+    parser.add_argument("--columnar_calc",
+                        help="Calculate rewards and payments column by column instead of delegator by delegator. "
+                             "Results are identical, it is faster for bakers with many delegators.",
+                        action="store_true")
+    parser.add_argument("--no_snapshot_prefetch",
+                        help="Do not read delegator balances of upcoming cycles in background as soon as their "
+                             "snapshot is selected. Prefetching is only done with rpc provider and response cache.",
+                        action="store_true")
+    parser.add_argument("--forge_mode",
+                        help="How payment operations are forged. local: in process, forge RPC is used only if the "
+                             "protocol is not supported. verify: in process and by forge RPC, RPC result is used "
+                             "and differences are logged. rpc: by forge RPC only.",
+                        default=FORGE_LOCAL, choices=[FORGE_LOCAL, FORGE_VERIFY, FORGE_RPC])
+    parser.add_argument("--backfill_parallelism",
+                        help="When more than one cycle is pending, fetch reward data of that many cycles in parallel. "
+                             "Payments are still made in cycle order. 1 disables parallel backfill.",
+                        default=1, type=int)
+    parser.add_argument("--http_timeout",
+                        help="Timeout in seconds of requests to tzscan and public nodes.",
+                        default=DEFAULT_TIMEOUT, type=int)
+    parser.add_argument("--http_rate",
+                        help="Maximum number of requests per second to tzscan and public nodes. Set to 0 to disable.",
+                        default=DEFAULT_RATE, type=float)
+    parser.add_argument("--http_burst",
+                        help="Number of requests to tzscan and public nodes that may be sent at once before "
+                             "--http_rate applies.",
+                        default=DEFAULT_BURST, type=int)
     parser.add_argument("-D", "--dry_run",
                         help="Run without injecting payments. Suitable for testing. Does not require locking.",
                         action="store_true")
@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+from util.dir_utils import get_cache_file
+from util.response_cache import ResponseCache, MB
+
+
+def main(args):
+    cache_file = get_cache_file(os.path.expanduser(args.cache_dir), args.network)
+    if not os.path.isfile(cache_file):
+        print("No cache file found at {}".format(cache_file))
+        return
+
+    cache = ResponseCache(cache_file, args.cache_max_size * MB)
+
+    if args.command == 'stats':
+        stats = cache.stats()
+        print("Cache file  : {}".format(cache_file))
+        print("Entries     : {}".format(stats["entries"]))
+        print("Scopes      : {}".format(stats["scopes"]))
+        print("Size        : {:.2f} MB".format(stats["size"] / MB))
+    elif args.command == 'list':
+        for scope, nb_entries, size, last_access in cache.list_scopes():
+            print("{}\t{}\t{:.2f} KB\t{}".format(scope, nb_entries, size / 1024,
+                                                 datetime.fromtimestamp(last_access).isoformat(sep=' ')))
+    elif args.command == 'prune':
+        older_than = time.time() - args.days * 24 * 60 * 60 if args.days is not None else None
+        removed = cache.prune(max_size=args.cache_max_size * MB, older_than=older_than, scope=args.scope)
+        print("Removed {} entries".format(removed))
+    elif args.command == 'clear':
+        removed = cache.prune(max_size=0)
+        print("Removed {} entries".format(removed))
+
+    cache.close()
+
+
+if __name__ == '__main__':
+
+    if sys.version_info[0] < 3:
+        raise Exception("Must be using Python 3")
+
+    parser = argparse.ArgumentParser(description="Inspect and prune the response cache")
+    parser.add_argument("command", help="stats: summary, list: entries per scope (block), "
+                                        "prune: evict entries, clear: remove all entries",
+                        choices=['stats', 'list', 'prune', 'clear'])
+    parser.add_argument("-N", "--network", help="network name", choices=['ZERONET', 'ALPHANET', 'MAINNET'],
+                        default='MAINNET')
+    parser.add_argument("--cache_dir", help="Directory to keep cached node responses", default='~/pymnt/cache')
+    parser.add_argument("--cache_max_size", help="Size limit in MB to prune down to", default=512, type=int)
+    parser.add_argument("--days", help="With prune, remove entries not used for this many days", type=int)
+    parser.add_argument("--scope", help="With prune, remove all entries of this scope (e.g. a block hash)")
+
+    args = parser.parse_args()
+
+    main(args)
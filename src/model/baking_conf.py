@@ -13,6 +13,8 @@ SUPPORTERS_SET = 'supporters_set'
 PAYMENT_ADDRESS = 'payment_address'
 MIN_DELEGATION_AMT = 'min_delegation_amt'
 DELEGATOR_PAYS_XFER_FEE = 'delegator_pays_xfer_fee'
+FEE_TIERS = 'fee_tiers'
+MIN_DELEGATION_MAP = 'min_delegation_map'
 ### extensions
 FULL_SUPPORTERS_SET = "full_supporters_set"
 
@@ -73,6 +75,12 @@ class BakingConf:
     def get_delegator_pays_xfer_fee(self):
         return self.get_attribute(DELEGATOR_PAYS_XFER_FEE)
 
+    def get_fee_tiers(self):
+        return self.get_attribute(FEE_TIERS)
+
+    def get_min_delegation_map(self):
+        return self.get_attribute(MIN_DELEGATION_MAP)
+
 
     def __repr__(self) -> str:
         return json.dumps(self.__dict__, cls=CustomJsonEncoder, indent=1)
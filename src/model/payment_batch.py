@@ -0,0 +1,92 @@
+from array import array
+
+from Constants import PAYMENT_FAILED, PAYMENT_DONE
+from model.payment_log import PaymentRecord
+
+
+class PaymentBatch:
+    """
+    Payment records of a single cycle kept in columns. Amounts are stored in typed arrays, so that a batch of
+    many thousands of payments does not carry an object per payment. Iterating or indexing yields PaymentRecord
+    objects for consumers working on records. Fields which are not known (None in a PaymentRecord) are stored as 0.
+    """
+
+    def __init__(self, cycle=None) -> None:
+        super().__init__()
+        self.cycle = cycle
+        self.addresses = []
+        self.types = []
+        self.ratios = array('d')
+        self.fee_rates = array('d')
+        self.rewards = array('q')
+        self.fees = array('q')
+        self.payments = array('q')
+        # PAYMENT_FAILED, PAYMENT_DONE or PAYMENT_UNKNOWN
+        self.paid = array('b')
+        self.hashes = []
+
+    @staticmethod
+    def FromRecords(records, cycle=None):
+        records = list(records)
+        batch = PaymentBatch(cycle if cycle is not None or not records else records[0].cycle)
+        for record in records:
+            batch.append(record)
+        return batch
+
+    def append(self, record):
+        self.append_row(record.address, record.type, record.ratio, record.fee_rate, record.reward, record.fee,
+                        record.payment, record.paid, record.hash)
+
+    def append_row(self, address, type, ratio, fee_rate, reward, fee, payment, paid=False, hash=""):
+        self.addresses.append(address)
+        self.types.append(type)
+        self.ratios.append(ratio or 0)
+        self.fee_rates.append(fee_rate or 0)
+        self.rewards.append(reward or 0)
+        self.fees.append(fee or 0)
+        self.payments.append(payment or 0)
+        self.paid.append(self.status(paid))
+        self.hashes.append(hash)
+
+    def extend_columns(self, type, addresses, ratios, fee_rates, rewards, fees, payments):
+        """
+        Appends unpaid payments of the same type given as columns of equal length.
+        """
+        self.addresses.extend(addresses)
+        self.types.extend([type] * len(addresses))
+        self.ratios.extend(ratios)
+        self.fee_rates.extend(fee_rates)
+        self.rewards.extend(rewards)
+        self.fees.extend(fees)
+        self.payments.extend(payments)
+        self.paid.extend([0] * len(addresses))
+        self.hashes.extend([""] * len(addresses))
+
+    def set_result(self, indices, paid, hash):
+        """
+        :param paid: True, False or one of payment statuses
+        """
+        status = self.status(paid)
+        for i in indices:
+            self.paid[i] = status
+            self.hashes[i] = hash
+
+    @staticmethod
+    def status(paid):
+        if paid is True:
+            return PAYMENT_DONE
+        return int(paid) if paid else PAYMENT_FAILED
+
+    def total_payment(self):
+        return sum(self.payments)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __getitem__(self, i):
+        return PaymentRecord(self.cycle, self.addresses[i], self.ratios[i], self.fee_rates[i], self.rewards[i],
+                             self.fees[i], self.types[i], self.payments[i], self.paid[i], self.hashes[i])
+
+    def __iter__(self):
+        for i in range(len(self.addresses)):
+            yield self[i]
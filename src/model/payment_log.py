@@ -1,9 +1,14 @@
 from Constants import EXIT_PAYMENT_TYPE
+from util.num_utils import to_mutez
 
 
 class PaymentRecord():
+    # no per instance __dict__, batches may contain tens of thousands of records
+    __slots__ = ('cycle', 'address', 'ratio', 'fee_rate', 'reward', 'fee', 'type', 'payment', 'paid', 'hash',
+                 'balance')
+
     def __init__(self, cycle=None, address=None, ratio=None, fee_rate=None, reward=None, fee=None, type=None,
-                 payment=None, paid=False, hash=""):
+                 payment=None, paid=False, hash="", balance=None):
         self.cycle = cycle
         self.address = address
         self.ratio = ratio
@@ -14,6 +19,8 @@ class PaymentRecord():
         self.payment = payment
         self.paid = paid
         self.hash = hash
+        # delegated balance in mutez, set by reward calculators
+        self.balance = balance
 
     @staticmethod
     def BakerInstance(cycle, address, reward):
@@ -38,12 +45,12 @@ class PaymentRecord():
     @staticmethod
     def FromPaymentCSVDictRow(row, cyle):
         try:
+            # paid is PAYMENT_FAILED, PAYMENT_DONE or PAYMENT_UNKNOWN
             paid = int(row["paid"])
-            paid = paid > 0
         except ValueError as ve:
             raise Exception("Unable to read paid value.") from ve
 
-        return PaymentRecord(cyle, row["address"], None, None, None, None, row["type"], float(row["payment"]), paid,
+        return PaymentRecord(cyle, row["address"], None, None, None, None, row["type"], to_mutez(row["payment"]), paid,
                              row["hash"])
 
     @staticmethod
@@ -54,7 +61,6 @@ class PaymentRecord():
     def FromPaymentCSVDictRows(rows, cycle):
         items = []
         for row in rows:
-            print(row)
             items.append(PaymentRecord.FromPaymentCSVDictRow(row, cycle))
         return items
 
@@ -1,39 +1,53 @@
 import configparser
 import base58
 import os
+from concurrent.futures import ThreadPoolExecutor
 
+from Constants import PAYMENT_UNKNOWN
+from exception.operation import OperationLimitException
+from exception.rpc import RpcException
 from log_config import main_logger
-from util.client_utils import check_response
-from util.rpc_utils import parse_json_response
+from model.payment_batch import PaymentBatch
+from pay.batch_sizer import BatchSizer, get_limits, is_limit_error
+from pay.inclusion_tracker import InclusionTracker
+from pay.operation_builder import OperationBuilder, forge_body, run_operation_body, preapply_body
+from rpc.rpc_transport import ClientRpcTransport
+from util.forge_utils import forge_operation, SUPPORTED_PROTOCOLS
+from util.num_utils import format_tez
 from random import randint
 from time import sleep
 
 logger = main_logger
 
-MAX_TX_PER_BLOCK = 280
 PKH_LENGHT = 36
 CONFIRMATIONS = 1
 
-COMM_HEAD = " rpc get http://{}/chains/main/blocks/head"
-COMM_COUNTER = " rpc get http://{}/chains/main/blocks/head/context/contracts/{}/counter"
-CONTENT = '{"kind":"transaction","source":"%SOURCE%","destination":"%DESTINATION%","fee":"%fee%","counter":"%COUNTER%","gas_limit": "%gas_limit%", "storage_limit": "%storage_limit%","amount":"%AMOUNT%"}'
-FORGE_JSON = '{"branch": "%BRANCH%","contents":[%CONTENT%]}'
-RUNOPS_JSON = '{"branch": "%BRANCH%","contents":[%CONTENT%], "signature":"edsigtXomBKi5CTRf5cjATJWSyaRvhfYNHqSUGrn4SdbYRcGwQrUGjzEfQDTuqHhuA8b2d8NarZjz8TRf65WkpQmo423BtomS8Q"}'
-PREAPPLY_JSON = '[{"protocol":"%PROTOCOL%","branch":"%BRANCH%","contents":[%CONTENT%],"signature":"%SIGNATURE%"}]'
-COMM_FORGE = " rpc post http://%NODE%/chains/main/blocks/head/helpers/forge/operations with '%JSON%'"
-COMM_RUNOPS = " rpc post http://%NODE%/chains/main/blocks/head/helpers/scripts/run_operation with '%JSON%'"
-COMM_PREAPPLY = " rpc post http://%NODE%/chains/main/blocks/head/helpers/preapply/operations with '%JSON%'"
-COMM_INJECT = " rpc post http://%NODE%/injection/operation with '\"%OPERATION_HASH%\"'"
-COMM_WAIT = " wait for %OPERATION% to be included --confirmations {}".format(CONFIRMATIONS)
+PATH_HEAD = "/chains/main/blocks/head"
+PATH_COUNTER = "/chains/main/blocks/head/context/contracts/{}/counter"
+PATH_FORGE = "/chains/main/blocks/head/helpers/forge/operations"
+PATH_RUNOPS = "/chains/main/blocks/head/helpers/scripts/run_operation"
+PATH_PREAPPLY = "/chains/main/blocks/head/helpers/preapply/operations"
+PATH_INJECT = "/injection/operation"
+
+# local: operations are forged in process, forge RPC is used for unsupported protocols
+# verify: operations are forged both ways, RPC result is used if they differ
+# rpc: forge RPC only
+FORGE_LOCAL = 'local'
+FORGE_VERIFY = 'verify'
+FORGE_RPC = 'rpc'
 
 FEE_INI = 'fee.ini'
 DUMMY_FEE = 1000
 
 
 class BatchPayer():
-    def __init__(self, node_url, pymnt_addr, wllt_clnt_mngr, delegator_pays_xfer_fee):
+    def __init__(self, node_url, pymnt_addr, wllt_clnt_mngr, delegator_pays_xfer_fee, forge_mode=FORGE_LOCAL,
+                 rpc_transport=None):
         super(BatchPayer, self).__init__()
         self.pymnt_addr = pymnt_addr
+        self.forge_mode = forge_mode
+        # operations are posted to the node over http if a transport is given, else through tezos-client
+        self.transport = rpc_transport if rpc_transport else ClientRpcTransport(wllt_clnt_mngr, node_url)
         self.node_url = node_url
         self.wllt_clnt_mngr = wllt_clnt_mngr
 
@@ -78,65 +92,175 @@ class BatchPayer():
         logger.debug("Payment address is {}".format(self.source))
         logger.debug("Signing address is {}, manager alias is {}".format(self.manager, self.manager_alias))
 
-        self.comm_head = COMM_HEAD.format(self.node_url)
-        self.comm_counter = COMM_COUNTER.format(self.node_url, self.source)
-        self.comm_runops = COMM_RUNOPS.format().replace("%NODE%", self.node_url)
-        self.comm_forge = COMM_FORGE.format().replace("%NODE%", self.node_url)
-        self.comm_preapply = COMM_PREAPPLY.format().replace("%NODE%", self.node_url)
-        self.comm_inject = COMM_INJECT.format().replace("%NODE%", self.node_url)
-        self.comm_wait = COMM_WAIT.format()
+        self.path_counter = PATH_COUNTER.format(self.source)
+        self.op_builder = OperationBuilder(self.source, self.default_fee, self.gas_limit, self.storage_limit)
 
     def pay(self, payment_items_in, verbose=None, dry_run=None):
-
-        # initialize the result list with already paid items
-        payment_logs = [pi for pi in payment_items_in if pi.paid]
-
-        payment_items = [pi for pi in payment_items_in if not pi.paid]
-
-        if payment_logs:
-            for pl in payment_logs:
-                logger.info("Reward already paid for cycle %s address %s amount %f tz type %s",
-                            pl.cycle, pl.address, pl.payment, pl.type)
-
-        # split payments into lists of MAX_TX_PER_BLOCK or less size
-        # [list_of_size_MAX_TX_PER_BLOCK,list_of_size_MAX_TX_PER_BLOCK,list_of_size_MAX_TX_PER_BLOCK,...]
-        payment_items_chunks = [payment_items[i:i + MAX_TX_PER_BLOCK] for i in
-                                range(0, len(payment_items), MAX_TX_PER_BLOCK)]
-
+        """
+        Pays unpaid items of a PaymentBatch, a list of PaymentRecord is converted into a batch first.
+        Results are written into the batch, which is returned.
+        """
+        if isinstance(payment_items_in, PaymentBatch):
+            batch = payment_items_in
+        else:
+            batch = PaymentBatch.FromRecords(payment_items_in)
+
+        unpaid = []
+        for i, paid in enumerate(batch.paid):
+            if paid == PAYMENT_UNKNOWN:
+                logger.warning("Reward payment for cycle %s address %s amount %s tz is injected in operation %s before "
+                               "but its inclusion is unknown. Not paying again, check the operation",
+                               batch.cycle, batch.addresses[i], format_tez(batch.payments[i]), batch.hashes[i])
+            elif paid:
+                logger.info("Reward already paid for cycle %s address %s amount %s tz type %s",
+                            batch.cycle, batch.addresses[i], format_tez(batch.payments[i]), batch.types[i])
+            else:
+                unpaid.append(i)
+
+        # results are written into batch as they are known, so that a report can be written whatever happens
+        try:
+            nb_batches = self.pay_in_batches(batch, unpaid, verbose, dry_run)
+            logger.debug("Payment is done in {} batches".format(nb_batches))
+        except Exception as e:
+            logger.error("Payment is stopped, remaining items are not paid: {}".format(e))
+
+        return batch
+
+    def pay_in_batches(self, batch, unpaid, verbose=None, dry_run=None):
+        """
+        Pays given indices of batch in operation groups. Items of an injected operation are marked PAYMENT_UNKNOWN
+        with its hash at once, they are marked paid or failed when inclusion is checked.
+        :return: number of batches
+        :raises RpcException: if inclusion of an injected operation cannot be checked
+        """
         op_counter = OpCounter()
-        logger.debug("Payment will be done in {} batches".format(len(payment_items_chunks)))
-
-        for payment_items_chunk in payment_items_chunks:
-            logger.debug("Payment of a batch started")
-            payments_log = \
-                self.pay_single_batch_wrap(payment_items_chunk, verbose=verbose, dry_run=dry_run, op_counter=op_counter)
-            payment_logs.extend(payments_log)
-
-            logger.debug("Payment of a batch is complete")
-
-        return payment_logs
-
-    def pay_single_batch_wrap(self, payment_items, op_counter, verbose=None, dry_run=None):
 
+        # unpaid items are split into operation groups packed up to protocol limits
+        sizer = BatchSizer(self.op_builder, get_limits(self.transport, verbose))
+        position = 0
+        nb_batches = 0
+
+        # a batch is injected only after the previous one is included, node rejects counters in the future.
+        # Preparation of the next batch (forging and signing with locally advanced counter) is done while
+        # the previous batch waits for inclusion.
+        tracker = InclusionTracker(self.transport, CONFIRMATIONS)
+        in_flight = None
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            index_chunk = self.next_chunk(batch, unpaid, position, sizer, op_counter)
+            preparation = executor.submit(self.prepare_batch, batch, index_chunk, op_counter, verbose) \
+                if index_chunk else None
+
+            while index_chunk:
+                logger.debug("Payment of a batch started")
+                prepared = preparation.result()
+
+                if in_flight and not self.wait_for_inclusion(batch, tracker, in_flight):
+                    # counters of prepared batch follow the dropped operation, re-read counter and prepare again
+                    op_counter.set(None)
+                    prepared = None
+
+                # batch may be shrunk if it exceeds a limit, remaining items go to next batch
+                return_code, operation_hash, index_chunk = \
+                    self.pay_single_batch_wrap(batch, index_chunk, op_counter, sizer, prepared, verbose,
+                                               dry_run=dry_run)
+
+                if return_code and operation_hash:
+                    # injected operation is on record, and not paid again, even if its inclusion cannot be checked
+                    batch.set_result(index_chunk, PAYMENT_UNKNOWN, operation_hash)
+                    in_flight = (operation_hash, index_chunk)
+                    tracker.add(operation_hash)
+                else:
+                    in_flight = None
+                    batch.set_result(index_chunk, return_code, operation_hash)
+
+                position += len(index_chunk)
+                nb_batches += 1
+
+                index_chunk = self.next_chunk(batch, unpaid, position, sizer, op_counter)
+                if index_chunk:
+                    preparation = executor.submit(self.prepare_batch, batch, index_chunk, op_counter, verbose)
+
+                logger.debug("Payment of a batch is injected")
+
+        # drain operations in flight
+        if in_flight:
+            self.wait_for_inclusion(batch, tracker, in_flight)
+
+        return nb_batches
+
+    def next_chunk(self, batch, unpaid, position, sizer, op_counter):
+        """
+        :return: indices of unpaid items from position on that fit into one operation group
+        """
+        count = sizer.take((self.payment_amount(batch, i) for i in unpaid[position:]), op_counter.get())
+        return unpaid[position:position + count]
+
+    def payment_amount(self, batch, i):
+        pymnt_amnt = batch.payments[i]  # in micro tezos
+
+        if self.delegator_pays_xfer_fee:
+            pymnt_amnt = max(pymnt_amnt - int(self.default_fee), 0)  # ensure not less than 0
+
+        return pymnt_amnt
+
+    def wait_for_inclusion(self, batch, tracker, in_flight):
+        operation_hash, indices = in_flight
+
+        logger.debug("Waiting for operation {} to be included. Please be patient until the block has {} "
+                     "confirmation(s)".format(operation_hash, CONFIRMATIONS))
+        included = tracker.wait_for(operation_hash)
+        batch.set_result(indices, included, operation_hash)
+
+        logger.debug("Operation {} is {}".format(operation_hash, "included" if included else "not included"))
+        return included
+
+    def pay_single_batch_wrap(self, batch, indices, op_counter, sizer, prepared, verbose=None, dry_run=None):
+        """
+        :return: (return code, operation hash, indices). Indices are a prefix of given indices if the batch
+        is shrunk to fit protocol limits
+        """
         max_try = 3
         return_code = False
         operation_hash = ""
 
         # due to unknown reasons, some times a batch fails to pre-apply
         # trying after some time should be OK
-        for attempt in range(max_try):
-            return_code, operation_hash = \
-                self.pay_single_batch(payment_items, op_counter, verbose, dry_run=dry_run)
+        previous = None
+        attempt = 0
+        while attempt < max_try:
+            if not prepared:
+                prepared = self.prepare_batch(batch, indices, op_counter, verbose, previous=previous)
+
+            if prepared:
+                try:
+                    return_code, operation_hash = self.submit_batch(prepared, sizer, verbose, dry_run=dry_run)
+                except OperationLimitException as e:
+                    if len(prepared.contents) > 1:
+                        # nothing is injected, try a smaller batch right away with the same counter
+                        nb_transactions = sizer.shrink(len(prepared.contents))
+                        indices = indices[:sizer.take(self.payment_amount(batch, i) for i in indices)]
+                        logger.warning("Batch exceeds a protocol limit, trying again with {} payments: {}"
+                                       .format(nb_transactions, e))
+                        op_counter.rollback()
+                        previous = None
+                        prepared = None
+                        continue
+
+                    logger.error("Single payment exceeds a protocol limit: {}".format(e))
+                    return_code, operation_hash = False, ""
 
             if dry_run or not return_code:
                 op_counter.rollback()
+                # force re-read of counter, previous batches are included already
+                op_counter.set(None)
+                # contents are reused by next attempt if counter is still the same
+                previous = prepared or previous
+                prepared = None
             else:
+                # keep counter, next batch is prepared before this one is included
                 op_counter.commit()
 
-            # we do not want to preserve counter anymore
-            # force re-read of counter at every try
-            op_counter.set(None)
-
             # if successful, do not try anymore
             if return_code:
                 break
@@ -147,92 +271,157 @@ class BatchPayer():
             if attempt < max_try - 1:
                 self.wait_random()
 
-        for payment_item in payment_items:
-            payment_item.paid = return_code
-            payment_item.hash = operation_hash
+            attempt += 1
 
-        return payment_items
+        return return_code, operation_hash, indices
 
     def wait_random(self):
         slp_tm = randint(10, 50)
         logger.debug("Wait for {} seconds before trying again".format(slp_tm))
         sleep(slp_tm)
 
-    def pay_single_batch(self, payment_records, op_counter, verbose=None, dry_run=None):
-
+    def prepare_batch(self, batch, indices, op_counter, verbose=None, previous=None):
+        """
+        Creates, forges and signs operations of a batch. Counter is advanced by the number of operations.
+        :param previous: PreparedBatch of a failed attempt for the same indices, its contents are reused
+        if they start at the same counter
+        :return: PreparedBatch, None if counter or head cannot be read or forging fails
+        """
         if not op_counter.get():
-            counter = parse_json_response(self.wllt_clnt_mngr.send_request(self.comm_counter))
-            counter = int(counter)
-            op_counter.set(counter)
+            success, counter = self.get(self.path_counter, verbose)
+            if not success:
+                logger.error("Error in counter response '{}'".format(counter))
+                return None
+            op_counter.set(int(counter))
+
+        success, head = self.get(PATH_HEAD, verbose)
+        if not success:
+            logger.error("Error in head response '{}'".format(head))
+            return None
 
-        head = parse_json_response(self.wllt_clnt_mngr.send_request(self.comm_head))
         branch = head["hash"]
         protocol = head["metadata"]["protocol"]
 
         logger.debug("head: branch {} counter {} protocol {}".format(branch, op_counter.get(), protocol))
 
-        content_list = []
+        first_counter = op_counter.get() + 1
 
-        for payment_item in payment_records:
-            pymnt_amnt = int(payment_item.payment * 1e6)  # expects in micro tezos
+        if previous and previous.first_counter == first_counter:
+            contents, contents_json = previous.contents, previous.contents_json
+            op_counter.inc(len(contents))
+        else:
+            contents = []
+            for i in indices:
+                pymnt_amnt = self.payment_amount(batch, i)
 
-            if self.delegator_pays_xfer_fee:
-                pymnt_amnt = max(pymnt_amnt - int(self.default_fee), 0)  # ensure not less than 0
+                if pymnt_amnt <= 0:  # zero check
+                    continue
 
-            if pymnt_amnt < 1e-3:  # zero check
-                continue
+                op_counter.inc()
+                content = self.op_builder.transaction(batch.addresses[i], pymnt_amnt, op_counter.get())
+                contents.append(content)
 
-            op_counter.inc()
-            content = CONTENT.replace("%SOURCE%", self.source).replace("%DESTINATION%", payment_item.address) \
-                .replace("%AMOUNT%", str(pymnt_amnt)).replace("%COUNTER%", str(op_counter.get())) \
-                .replace("%fee%", self.default_fee).replace("%gas_limit%", self.gas_limit).replace("%storage_limit%",
-                                                                                                   self.storage_limit)
-            content_list.append(content)
+                logger.info("Payment content: {}".format(content))
 
-            logger.info("Payment content: {}".format(content))
+            # contents are serialized once, stage bodies only wrap them
+            contents_json = self.op_builder.serialize(contents)
 
-        contents_string = ",".join(content_list)
+        # forge the operations
+        logger.debug("Forging {} operations".format(len(contents)))
+        bytes = self.forge(branch, protocol, contents, contents_json, verbose)
+        if not bytes:
+            return None
+
+        # sign the operations
+        signed_bytes = self.wllt_clnt_mngr.sign(bytes, self.manager_alias)
+
+        return PreparedBatch(branch, protocol, contents, contents_json, first_counter, bytes, signed_bytes)
+
+    def forge(self, branch, protocol, contents, contents_json, verbose=None):
+        local_bytes = None
+        if self.forge_mode != FORGE_RPC and protocol in SUPPORTED_PROTOCOLS:
+            local_bytes = forge_operation(branch, contents)
+
+            if self.forge_mode == FORGE_LOCAL:
+                return local_bytes
+
+        forge_json = forge_body(branch, contents_json)
+        if verbose: logger.debug("forge_json is |{}|".format(forge_json))
+        success, rpc_bytes = self.post(PATH_FORGE, forge_json, verbose)
+        if not success:
+            logger.error("Error in forge response '{}'".format(rpc_bytes))
+            return None
+
+        if local_bytes is not None and local_bytes != rpc_bytes:
+            logger.error("Locally forged operation differs from forge RPC result. Local '{}' RPC '{}'"
+                         .format(local_bytes, rpc_bytes))
+
+        return rpc_bytes
+
+    def get(self, path, verbose=None):
+        """
+        :return: (success, decoded response). Error description is returned instead of response on failure.
+        """
+        try:
+            return True, self.transport.get(path, verbose)
+        except RpcException as e:
+            return False, str(e)
+
+    def post(self, path, body, verbose=None):
+        """
+        :return: (success, decoded response). Error description is returned instead of response on failure.
+        """
+        try:
+            response = self.transport.post(path, body, verbose)
+        except RpcException as e:
+            return False, str(e)
+
+        # operation errors may be reported in a successful answer
+        errors = operation_errors(response)
+        if errors:
+            return False, errors
+
+        return True, response
+
+    def submit_batch(self, prepared, sizer, verbose=None, dry_run=None):
+        """
+        Runs, pre-applies and injects a prepared batch. Does not wait for inclusion.
+        :return: (return code, operation hash)
+        :raises OperationLimitException: if the node rejects the batch for exceeding a protocol limit
+        """
+        branch, protocol, contents_json = prepared.branch, prepared.protocol, prepared.contents_json
 
         # run the operations
-        logger.debug("Running {} operations".format(len(content_list)))
-        runops_json = RUNOPS_JSON.replace('%BRANCH%', branch).replace("%CONTENT%", contents_string)
-        runops_command_str = self.comm_runops.replace("%JSON%", runops_json)
-        if verbose: logger.debug("runops_command_str is |{}|".format(runops_command_str))
-        runops_command_response = self.wllt_clnt_mngr.send_request(runops_command_str)
-        if not check_response(runops_command_response):
-            error_desc = parse_json_response(runops_command_response)
+        logger.debug("Running {} operations".format(len(prepared.contents)))
+        runops_json = run_operation_body(branch, contents_json)
+        if verbose: logger.debug("runops_json is |{}|".format(runops_json))
+        success, runops_response = self.post(PATH_RUNOPS, runops_json, verbose)
+        if not success:
+            error_desc = runops_response
             # for content in runops_command_response["contents"]:
             #    op_result = content["metadata"]["operation_result"]
             #    if op_result["status"] == 'failed':
             #        error_desc = op_result["errors"]
             #        break
+            if is_limit_error(error_desc):
+                raise OperationLimitException(error_desc)
             logger.error("Error in run_operation response '{}'".format(error_desc))
             return False, ""
 
-        # forge the operations
-        logger.debug("Forging {} operations".format(len(content_list)))
-        forge_json = FORGE_JSON.replace('%BRANCH%', branch).replace("%CONTENT%", contents_string)
-        forge_command_str = self.comm_forge.replace("%JSON%", forge_json)
-        if verbose: logger.debug("forge_command_str is |{}|".format(forge_command_str))
-        forge_command_response = self.wllt_clnt_mngr.send_request(forge_command_str)
-        if not check_response(forge_command_response):
-            logger.error("Error in forge response '{}'".format(forge_command_response))
-            return False, ""
+        sizer.observe(prepared, runops_response)
 
-        # sign the operations
-        bytes = parse_json_response(forge_command_response, verbose=verbose)
-        signed_bytes = self.wllt_clnt_mngr.sign(bytes, self.manager_alias)
+        signed_bytes = prepared.signed_bytes
 
         # pre-apply operations
         logger.debug("Preapplying the operations")
-        preapply_json = PREAPPLY_JSON.replace('%BRANCH%', branch).replace("%CONTENT%", contents_string).replace(
-            "%PROTOCOL%", protocol).replace("%SIGNATURE%", signed_bytes)
-        preapply_command_str = self.comm_preapply.replace("%JSON%", preapply_json)
-
-        if verbose: logger.debug("preapply_command_str is |{}|".format(preapply_command_str))
-        preapply_command_response = self.wllt_clnt_mngr.send_request(preapply_command_str)
-        if not check_response(preapply_command_response):
-            logger.error("Error in preapply response '{}'".format(preapply_command_response))
+        preapply_json = preapply_body(protocol, branch, contents_json, signed_bytes)
+
+        if verbose: logger.debug("preapply_json is |{}|".format(preapply_json))
+        success, preapply_response = self.post(PATH_PREAPPLY, preapply_json, verbose)
+        if not success:
+            if is_limit_error(preapply_response):
+                raise OperationLimitException(preapply_response)
+            logger.error("Error in preapply response '{}'".format(preapply_response))
             return False, ""
 
         # not necessary
@@ -242,7 +431,7 @@ class BatchPayer():
         if dry_run: return True, ""
 
         # inject the operations
-        logger.debug("Injecting {} operations".format(len(content_list)))
+        logger.debug("Injecting {} operations".format(len(prepared.contents)))
         decoded = base58.b58decode(signed_bytes).hex()
 
         if signed_bytes.startswith("edsig"):  # edsig signature
@@ -263,25 +452,52 @@ class BatchPayer():
                 "Signature length must be 128 but it is {}. Signature is '{}'".format(len(signed_bytes), signed_bytes))
             # return False, ""
 
-        signed_operation_bytes = bytes + decoded_signature
-        inject_command_str = self.comm_inject.replace("%OPERATION_HASH%", signed_operation_bytes)
-        if verbose: logger.debug("inject_command_str is |{}|".format(inject_command_str))
-        inject_command_response = self.wllt_clnt_mngr.send_request(inject_command_str)
-        if not check_response(inject_command_response):
-            logger.error("Error in inject response '{}'".format(inject_command_response))
+        signed_operation_bytes = prepared.bytes + decoded_signature
+        if verbose: logger.debug("signed_operation_bytes is |{}|".format(signed_operation_bytes))
+        success, operation_hash = self.post(PATH_INJECT, '"{}"'.format(signed_operation_bytes), verbose)
+        if not success:
+            if is_limit_error(operation_hash):
+                raise OperationLimitException(operation_hash)
+            logger.error("Error in inject response '{}'".format(operation_hash))
             return False, ""
 
-        operation_hash = parse_json_response(inject_command_response)
         logger.debug("Operation hash is {}".format(operation_hash))
 
-        # wait for inclusion
-        logger.debug("Waiting for operation {} to be included. Please be patient until the block has {} confirmation(s)"
-                     .format(operation_hash, CONFIRMATIONS))
-        self.wllt_clnt_mngr.send_request(self.comm_wait.replace("%OPERATION%", operation_hash))
+        return True, operation_hash
 
-        logger.debug("Operation {} is included".format(operation_hash))
 
-        return True, operation_hash
+def operation_errors(response):
+    """
+    :param response: decoded answer of a payment RPC. run_operation answers an operation group,
+    preapply a list of them, forge and injection a string
+    :return: errors of operations which are not applied, empty if there are none
+    """
+    groups = response if isinstance(response, list) else [response]
+
+    errors = []
+    for group in groups:
+        if not isinstance(group, dict):
+            continue
+
+        errors.extend(group.get("errors", []))
+        for content in group.get("contents", []):
+            result = content.get("metadata", {}).get("operation_result", {})
+            if result.get("status", "applied") != "applied":
+                errors.extend(result.get("errors", [{"status": result["status"]}]))
+
+    return errors
+
+
+class PreparedBatch:
+    def __init__(self, branch, protocol, contents, contents_json, first_counter, bytes, signed_bytes) -> None:
+        super().__init__()
+        self.branch = branch
+        self.protocol = protocol
+        self.contents = contents
+        self.contents_json = contents_json
+        self.first_counter = first_counter
+        self.bytes = bytes
+        self.signed_bytes = signed_bytes
 
 
 class OpCounter:
@@ -290,11 +506,11 @@ class OpCounter:
         self.__counter = None
         self.__counter_backup = None
 
-    def inc(self):
+    def inc(self, count=1):
         if self.__counter is None:
             raise Exception("Counter is not set!!!")
 
-        self.__counter += 1
+        self.__counter += count
 
     def get(self):
         return self.__counter
@@ -0,0 +1,143 @@
+from log_config import main_logger
+from util.forge_utils import zarith_size, BRANCH_SIZE, CONTRACT_ID_SIZE, SIGNATURE_SIZE
+
+logger = main_logger
+
+PATH_CONSTANTS = "/chains/main/blocks/head/context/constants"
+
+# used if constants cannot be read from the node, values of athens on mainnet
+DEFAULT_LIMITS = {"max_operation_data_length": 16384,
+                  "hard_gas_limit_per_block": 8000000,
+                  "hard_gas_limit_per_operation": 800000,
+                  "hard_storage_limit_per_operation": 60000}
+
+# counters below 2^35 are forged in 5 bytes at most
+MAX_COUNTER_SIZE = 5
+
+# size of an operation group is reduced to this ratio after a limit error
+SHRINK_RATIO = 0.8
+
+# error ids reported by the node when an operation group exceeds a protocol limit
+LIMIT_ERRORS = ["oversized_operation", "gas_exhausted.block", "gas_limit_too_high", "storage_limit_too_high"]
+
+
+def get_limits(transport, verbose=None):
+    try:
+        constants = transport.get(PATH_CONSTANTS, verbose)
+    except Exception as e:
+        logger.warning("Protocol constants cannot be read, using default limits: {}".format(e))
+        return dict(DEFAULT_LIMITS)
+
+    return {key: int(constants.get(key, default)) for key, default in DEFAULT_LIMITS.items()}
+
+
+def is_limit_error(error):
+    error = str(error)
+    return any(limit_error in error for limit_error in LIMIT_ERRORS)
+
+
+class BatchSizer:
+    """
+    Packs payments into operation groups as close to protocol limits as possible. Forged size and declared gas
+    of each transaction are known before forging, so a group is cut where the next transaction would exceed
+    the operation size limit or the block gas limit. Forged size of each group corrects the size estimate,
+    run_operation results are only logged. If the node still rejects a group for a limit, groups are shrunk
+    for the rest of the payment.
+    """
+
+    def __init__(self, op_builder, limits) -> None:
+        super().__init__()
+        self.size_limit = limits["max_operation_data_length"] - BRANCH_SIZE - SIGNATURE_SIZE
+        self.gas_limit = limits["hard_gas_limit_per_block"]
+        self.tx_gas = int(op_builder.gas_limit)
+
+        if self.tx_gas > limits["hard_gas_limit_per_operation"]:
+            logger.warning("Gas limit {} is above protocol limit {}".format(self.tx_gas,
+                                                                            limits["hard_gas_limit_per_operation"]))
+        if int(op_builder.storage_limit) > limits["hard_storage_limit_per_operation"]:
+            logger.warning("Storage limit {} is above protocol limit {}".format(
+                op_builder.storage_limit, limits["hard_storage_limit_per_operation"]))
+
+        # tag, source, fee, gas limit, storage limit, destination and no parameters flag.
+        # Counter and amount differ per transaction
+        self.tx_size = 1 + CONTRACT_ID_SIZE + zarith_size(op_builder.fee) + zarith_size(op_builder.gas_limit) + \
+                       zarith_size(op_builder.storage_limit) + CONTRACT_ID_SIZE + 1
+
+        # bytes per transaction the estimate fell short of a forged group
+        self.size_correction = 0
+        # maximum number of transactions in a group, set after a limit error
+        self.max_count = None
+
+    def take(self, amounts, counter=None):
+        """
+        :param amounts: amounts of candidate payments in order. Zero amounts are not paid and take no space
+        :param counter: current counter of the source, a safe counter size is assumed if not known
+        :return: number of candidates packed into the next operation group. It includes at least one
+        transaction if there is any
+        """
+        size = 0
+        gas = 0
+        count = 0
+        nb_transactions = 0
+
+        for amount in amounts:
+            if amount > 0:
+                if self.max_count and nb_transactions >= self.max_count:
+                    break
+
+                if counter is not None:
+                    counter += 1
+                tx_size = self.tx_size + self.size_correction + zarith_size(amount) + \
+                          (zarith_size(counter) if counter is not None else MAX_COUNTER_SIZE)
+
+                if nb_transactions and (size + tx_size > self.size_limit or gas + self.tx_gas > self.gas_limit):
+                    break
+
+                size += tx_size
+                gas += self.tx_gas
+                nb_transactions += 1
+
+            count += 1
+
+        return count
+
+    def shrink(self, count):
+        """
+        Called when a group of count transactions exceeds a limit.
+        :return: number of transactions to try next
+        """
+        self.max_count = max(int(count * SHRINK_RATIO), 1)
+        return self.max_count
+
+    def estimate(self, contents):
+        return sum(self.tx_size + zarith_size(content["amount"]) + zarith_size(content["counter"])
+                   for content in contents)
+
+    def observe(self, prepared, runops_response):
+        """
+        Compares a forged and simulated group with the estimate.
+        :param prepared: PreparedBatch
+        :param runops_response: decoded run_operation response of the group
+        """
+        nb_transactions = len(prepared.contents)
+        if not nb_transactions:
+            return
+
+        forged_size = len(prepared.bytes) // 2 - BRANCH_SIZE
+        estimated_size = self.estimate(prepared.contents)
+        if forged_size > estimated_size:
+            self.size_correction = max(self.size_correction,
+                                       -(-(forged_size - estimated_size) // nb_transactions))
+            logger.warning("Forged size {} is above estimated size {}, transaction size is corrected by {} bytes"
+                           .format(forged_size, estimated_size, self.size_correction))
+
+        consumed_gas = 0
+        storage_size = 0
+        for content in runops_response.get("contents", []):
+            result = content.get("metadata", {}).get("operation_result", {})
+            consumed_gas += int(result.get("consumed_gas", 0))
+            storage_size += int(result.get("paid_storage_size_diff", 0))
+
+        logger.debug("Operation group of {} transactions: {} of {} bytes, gas {} declared {} of {}, "
+                     "storage {} bytes".format(nb_transactions, forged_size, self.size_limit, consumed_gas,
+                                               nb_transactions * self.tx_gas, self.gas_limit, storage_size))
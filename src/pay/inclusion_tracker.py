@@ -0,0 +1,91 @@
+import time
+
+from exception.rpc import RpcException
+from log_config import main_logger
+
+logger = main_logger
+
+PATH_HEAD_HEADER = "/chains/main/blocks/head/header"
+PATH_OPERATION_HASHES = "/chains/main/blocks/{}/operation_hashes"
+
+POLL_INTERVAL = 5
+# operations not included within max_operations_ttl blocks are dropped by the node
+MAX_WAIT_BLOCKS = 60
+# consecutive failed polls before waiting is given up
+MAX_POLL_ERRORS = 10
+
+
+class InclusionTracker:
+    """
+    Tracks inclusion of all injected operations together. New blocks are read once for all operations in flight,
+    instead of one 'wait for <op> to be included' per operation.
+    """
+
+    def __init__(self, transport, confirmations=1, poll_interval=POLL_INTERVAL, max_wait_blocks=MAX_WAIT_BLOCKS,
+                 max_poll_errors=MAX_POLL_ERRORS) -> None:
+        super().__init__()
+        self.transport = transport
+        self.confirmations = confirmations
+        self.poll_interval = poll_interval
+        self.max_wait_blocks = max_wait_blocks
+        self.max_poll_errors = max_poll_errors
+
+        # operation hash -> level at which it was injected
+        self.in_flight = {}
+        # operation hash -> level at which it was included, None if it was not included in time
+        self.results = {}
+        self.last_checked_level = None
+
+    def add(self, operation_hash):
+        level = self.__get_head_level()
+        if self.last_checked_level is None:
+            # operation may already be included in head, but not in a block before it
+            self.last_checked_level = level - 1
+        self.in_flight[operation_hash] = level
+
+    def wait_for(self, operation_hash):
+        """
+        Blocks until operation is included with enough confirmations or dropped. Failed polls are retried.
+        :return: True if operation is included
+        :raises RpcException: if max_poll_errors polls in a row fail, inclusion status is unknown then
+        """
+        nb_errors = 0
+        while operation_hash in self.in_flight or \
+                (operation_hash in self.results and not self.__is_confirmed(operation_hash)):
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+                nb_errors = 0
+            except RpcException as e:
+                nb_errors += 1
+                if nb_errors >= self.max_poll_errors:
+                    raise
+                logger.warning("Inclusion check failed {} time(s), trying again: {}".format(nb_errors, e))
+
+        return self.results.get(operation_hash) is not None
+
+    def poll(self):
+        head_level = self.__get_head_level()
+
+        for level in range(self.last_checked_level + 1, head_level + 1):
+            included = {op_hash for ops in self.transport.get(PATH_OPERATION_HASHES.format(level)) for op_hash in ops}
+
+            for operation_hash in [oh for oh in self.in_flight if oh in included]:
+                logger.debug("Operation {} is included at level {}".format(operation_hash, level))
+                self.results[operation_hash] = level
+                del self.in_flight[operation_hash]
+
+        self.last_checked_level = max(self.last_checked_level, head_level)
+
+        for operation_hash, injection_level in list(self.in_flight.items()):
+            if head_level - injection_level > self.max_wait_blocks:
+                logger.warning("Operation {} is not included in {} blocks".format(operation_hash, self.max_wait_blocks))
+                self.results[operation_hash] = None
+                del self.in_flight[operation_hash]
+
+    def __is_confirmed(self, operation_hash):
+        return self.results[operation_hash] is None or \
+               self.last_checked_level - self.results[operation_hash] + 1 >= self.confirmations
+
+    def __get_head_level(self):
+        return int(self.transport.get(PATH_HEAD_HEADER)["level"])
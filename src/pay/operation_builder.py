@@ -0,0 +1,62 @@
+import json
+from json.encoder import encode_basestring_ascii
+
+# run_operation does not check signatures, any well formed signature is accepted
+DUMMY_SIGNATURE = "edsigtXomBKi5CTRf5cjATJWSyaRvhfYNHqSUGrn4SdbYRcGwQrUGjzEfQDTuqHhuA8b2d8NarZjz8TRf65WkpQmo423BtomS8Q"
+
+JSON_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+
+class OperationBuilder:
+    """
+    Builds transaction contents of a batch as data. Contents are serialized once, request bodies of
+    forge, run_operation and preapply only wrap the serialized contents.
+    """
+
+    def __init__(self, source, fee, gas_limit, storage_limit) -> None:
+        super().__init__()
+        self.source = source
+        self.fee = str(fee)
+        self.gas_limit = str(gas_limit)
+        self.storage_limit = str(storage_limit)
+
+        # fields shared by all transactions of the builder are encoded once. Serializing a transaction only
+        # fills in destination, counter and amount, in the same key order as transaction() below.
+        self.row_format = '{"kind":"transaction","source":' + self.__encode(source) + ',"destination":%s,"fee":' + \
+                          self.__encode(self.fee) + ',"counter":%s,"gas_limit":' + self.__encode(self.gas_limit) + \
+                          ',"storage_limit":' + self.__encode(self.storage_limit) + ',"amount":%s}'
+
+    def transaction(self, destination, amount, counter):
+        # amounts and counters are strings in RPC json
+        return {"kind": "transaction", "source": self.source, "destination": destination, "fee": self.fee,
+                "counter": str(counter), "gas_limit": self.gas_limit, "storage_limit": self.storage_limit,
+                "amount": str(amount)}
+
+    def serialize(self, contents):
+        """
+        Serializes transactions created by this builder into a json array.
+        """
+        row_format = self.row_format
+        return '[' + ','.join([row_format % (encode_basestring_ascii(content["destination"]),
+                                             encode_basestring_ascii(content["counter"]),
+                                             encode_basestring_ascii(content["amount"]))
+                               for content in contents]) + ']'
+
+    @staticmethod
+    def __encode(value):
+        return JSON_ENCODER.encode(value)
+
+
+def forge_body(branch, contents_json):
+    return '{"branch":' + JSON_ENCODER.encode(branch) + ',"contents":' + contents_json + '}'
+
+
+def run_operation_body(branch, contents_json):
+    return '{"branch":' + JSON_ENCODER.encode(branch) + ',"contents":' + contents_json + \
+           ',"signature":"' + DUMMY_SIGNATURE + '"}'
+
+
+def preapply_body(protocol, branch, contents_json, signature):
+    return '[{"protocol":' + JSON_ENCODER.encode(protocol) + ',"branch":' + JSON_ENCODER.encode(branch) + \
+           ',"contents":' + contents_json + ',"signature":' + JSON_ENCODER.encode(signature) + '}]'
+
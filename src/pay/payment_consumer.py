@@ -2,31 +2,40 @@ import csv
 import threading
 import os
 
-from Constants import EXIT_PAYMENT_TYPE
+from Constants import EXIT_PAYMENT_TYPE, PAYMENT_DONE, PAYMENT_UNKNOWN
 from emails.email_manager import EmailManager
 from log_config import main_logger
-from pay.batch_payer import BatchPayer
+from pay.batch_payer import BatchPayer, FORGE_LOCAL
 from util.dir_utils import payment_report_file_path, get_busy_file
+from util.num_utils import format_tez
 
 logger = main_logger
 
 
 def count_and_log_failed(payment_logs, pymnt_cycle):
     nb_failed = 0
-    for pymnt_itm in payment_logs:
-        if pymnt_itm.paid:
-            logger.info("Reward paid for cycle %s address %s amount %f tz type %s",
-                        pymnt_cycle, pymnt_itm.address, pymnt_itm.payment, pymnt_itm.type)
+    for address, type, payment, paid, hash in zip(payment_logs.addresses, payment_logs.types, payment_logs.payments,
+                                                  payment_logs.paid, payment_logs.hashes):
+        if paid == PAYMENT_DONE:
+            logger.info("Reward paid for cycle %s address %s amount %s tz type %s",
+                        pymnt_cycle, address, format_tez(payment), type)
+        elif paid == PAYMENT_UNKNOWN:
+            # kept in failed report, but not paid again by a retry
+            nb_failed = nb_failed + 1
+            logger.warning("Reward payment for cycle %s address %s amount %s tz is injected in operation %s but its "
+                           "inclusion is unknown. Check the operation before paying again!",
+                           pymnt_cycle, address, format_tez(payment), hash)
         else:
             nb_failed = nb_failed + 1
-            logger.warning("No Reward paid for cycle %s address %s amount %f tz: Reason client failed!",
-                           pymnt_cycle, pymnt_itm.address, pymnt_itm.payment)
+            logger.warning("No Reward paid for cycle %s address %s amount %s tz: Reason client failed!",
+                           pymnt_cycle, address, format_tez(payment))
     return nb_failed
 
 
 class PaymentConsumer(threading.Thread):
     def __init__(self, name, payments_dir, key_name, client_path, payments_queue, node_addr, wllt_clnt_mngr,
-                 verbose=None, dry_run=None, delegator_pays_xfer_fee=True):
+                 verbose=None, dry_run=None, delegator_pays_xfer_fee=True, forge_mode=FORGE_LOCAL,
+                 rpc_transport=None):
         super(PaymentConsumer, self).__init__()
 
         self.name = name
@@ -40,6 +49,8 @@ class PaymentConsumer(threading.Thread):
         self.mm = EmailManager()
         self.wllt_clnt_mngr = wllt_clnt_mngr
         self.delegator_pays_xfer_fee = delegator_pays_xfer_fee
+        self.forge_mode = forge_mode
+        self.rpc_transport = rpc_transport
 
         logger.debug('Consumer "%s" created', self.name)
 
@@ -70,7 +81,8 @@ class PaymentConsumer(threading.Thread):
                 # payment_log = regular_payer.pay(payment_items[0], self.verbose, dry_run=self.dry_run)
                 # payment_logs = [payment_log]
 
-                batch_payer = BatchPayer(self.node_addr, self.key_name, self.wllt_clnt_mngr, self.delegator_pays_xfer_fee)
+                batch_payer = BatchPayer(self.node_addr, self.key_name, self.wllt_clnt_mngr, self.delegator_pays_xfer_fee,
+                                         self.forge_mode, self.rpc_transport)
 
                 # 3- do the payment
                 payment_logs = batch_payer.pay(payment_items, self.verbose, dry_run=self.dry_run)
@@ -116,10 +128,10 @@ class PaymentConsumer(threading.Thread):
             csv_writer = csv.writer(f, delimiter='\t', quotechar='"', quoting=csv.QUOTE_MINIMAL)
             csv_writer.writerow(["address", "type", "payment", "hash", "paid"])
 
-            for payment_item in payment_logs:
+            for address, type, payment, hash, paid in zip(payment_logs.addresses, payment_logs.types,
+                                                          payment_logs.payments, payment_logs.hashes,
+                                                          payment_logs.paid):
                 # write row to csv file
-                csv_writer.writerow(
-                    [payment_item.address, payment_item.type, "{0:f}".format(payment_item.payment), payment_item.hash,
-                     "1" if payment_item.paid else "0"])
+                csv_writer.writerow([address, type, format_tez(payment), hash, paid])
 
         return report_file
@@ -1,26 +1,34 @@
 import _thread
 import csv
 import os
+import queue
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from Constants import RunMode
 from calc.payment_calculator import PaymentCalculator
+from exception.http import CircuitOpenException
 from exception.tzscan import TzScanException
 from log_config import main_logger
+from model.payment_batch import PaymentBatch
 from model.payment_log import PaymentRecord
 from pay.double_payment_check import check_past_payment
 from util.dir_utils import get_calculation_report_file, get_failed_payments_dir, PAYMENT_FAILED_DIR, PAYMENT_DONE_DIR, \
     remove_busy_file, get_busy_file
+from util.num_utils import format_tez
 from util.rounding_command import RoundingCommand
 
 logger = main_logger
 
+# seconds to wait for room in a full payments queue before checking for exit again
+QUEUE_WAIT = 30
+
 
 class PaymentProducer(threading.Thread):
     def __init__(self, name, initial_payment_cycle, network_config, payments_dir, calculations_dir, run_mode,
                  service_fee_calc, release_override, payment_offset, baking_cfg, payments_queue, life_cycle,
-                 dry_run, wllt_clnt_mngr, node_url, provider_factory, verbose=False):
+                 dry_run, wllt_clnt_mngr, node_url, provider_factory, verbose=False, backfill_parallelism=1):
         super(PaymentProducer, self).__init__()
         self.baking_address = baking_cfg.get_baking_address()
         self.owners_map = baking_cfg.get_owners_map()
@@ -37,7 +45,8 @@ class PaymentProducer(threading.Thread):
         self.reward_api = provider_factory.newRewardApi(network_config, self.baking_address, wllt_clnt_mngr, node_url)
         self.block_api = provider_factory.newBlockApi(network_config, wllt_clnt_mngr, node_url)
         self.reward_calculator_api = provider_factory.newCalcApi(self.founders_map, self.min_delegation_amt,
-                                                                 self.excluded_delegators_set, rc)
+                                                                 self.excluded_delegators_set, rc,
+                                                                 fee_calc=service_fee_calc)
 
         self.fee_calc = service_fee_calc
         self.initial_payment_cycle = initial_payment_cycle
@@ -53,6 +62,8 @@ class PaymentProducer(threading.Thread):
         self.payments_queue = payments_queue
         self.life_cycle = life_cycle
         self.dry_run = dry_run
+        # number of cycles fetched and calculated in parallel when more than one cycle is pending, 1 disables
+        self.backfill_parallelism = backfill_parallelism
         logger.debug('Producer started')
 
     def exit(self):
@@ -94,9 +105,15 @@ class PaymentProducer(threading.Thread):
                              format(payment_cycle, current_cycle, self.nw_config['NB_FREEZE_CYCLE'],
                                     self.release_override))
 
+                last_released_cycle = current_cycle - (self.nw_config['NB_FREEZE_CYCLE'] + 1) - self.release_override
+
                 # payments should not pass beyond last released reward cycle
-                if payment_cycle <= current_cycle - (self.nw_config['NB_FREEZE_CYCLE'] + 1) - self.release_override:
-                    if not self.payments_queue.full():
+                if payment_cycle <= last_released_cycle:
+                    if self.backfill_parallelism > 1 and self.run_mode != RunMode.ONETIME \
+                            and payment_cycle < last_released_cycle:
+                        payment_cycle = self.backfill(payment_cycle, last_released_cycle)
+
+                    elif not self.payments_queue.full():
 
                         paid = self.try_to_pay(payment_cycle)
 
@@ -151,6 +168,46 @@ class PaymentProducer(threading.Thread):
 
         return
 
+    def backfill(self, first_cycle, last_cycle):
+        """
+        Fetches reward data of cycles [first_cycle, last_cycle] in threads. Payments of each cycle are calculated
+        in this thread as soon as its data is fetched, while later cycles are still being fetched. Calculation is
+        small next to fetching. Calculated cycles are sent to payment consumer in cycle order. Backfill stops at
+        the first failed cycle.
+        :return: next cycle to pay
+        """
+        cycles = list(range(first_cycle, last_cycle + 1))
+        logger.info("Backfilling cycles {} to {} with parallelism {}".format(first_cycle, last_cycle,
+                                                                           self.backfill_parallelism))
+
+        with ThreadPoolExecutor(max_workers=self.backfill_parallelism) as fetch_executor:
+            fetches = [fetch_executor.submit(self.reward_api.get_rewards_for_cycle_map, cycle, self.verbose)
+                       for cycle in cycles]
+
+            try:
+                for cycle, fetch in zip(cycles, fetches):
+                    if self.exiting or not self.life_cycle.is_running():
+                        return cycle
+
+                    try:
+                        reward_data = fetch.result()
+
+                        logger.info("Payment cycle is " + str(cycle))
+                        pymnt_logs, total_rewards = self.make_payment_calculations(cycle, reward_data)
+
+                        if not self.send_payments(cycle, pymnt_logs, total_rewards):
+                            return cycle
+                    except Exception:
+                        logger.error("Error at reward calculation of cycle {} in backfill".format(cycle),
+                                     exc_info=True)
+                        return cycle
+            finally:
+                # fetches not started yet are not needed if backfill stops early
+                for fetch in fetches:
+                    fetch.cancel()
+
+        return last_cycle + 1
+
     def try_to_pay(self, payment_cycle):
         try:
             logger.info("Payment cycle is " + str(payment_cycle))
@@ -161,32 +218,58 @@ class PaymentProducer(threading.Thread):
             # 2- make payment calculations from reward data
             pymnt_logs, total_rewards = self.make_payment_calculations(payment_cycle, reward_data)
 
-            # 3- check for past payment evidence for current cycle
-            past_payment_state = check_past_payment(self.payments_root, payment_cycle)
-            if not self.dry_run and total_rewards > 0 and past_payment_state:
-                logger.warn(past_payment_state)
-                total_rewards = 0
-
-            # 4- if total_rewards > 0, proceed with payment
-            if total_rewards > 0:
-                report_file_path = get_calculation_report_file(self.calculations_dir, payment_cycle)
-
-                # 5- send to payment consumer
-                self.payments_queue.put(pymnt_logs)
-
-                # 6- create calculations report file. This file contains calculations details
-                self.create_calculations_report(payment_cycle, pymnt_logs, report_file_path, total_rewards)
-
-            # processing of cycle is done
-            logger.info("Reward creation done for cycle %s", payment_cycle)
-            return True
+            return self.send_payments(payment_cycle, pymnt_logs, total_rewards)
         except TzScanException:
             logger.warn("Tzscan error at reward calculation", exc_info=True)
             return False
+        except CircuitOpenException as e:
+            logger.warning("Reward data provider is not available: {}".format(e))
+            return False
         except Exception:
             logger.error("Error at reward calculation", exc_info=True)
             return False
 
+    def send_payments(self, payment_cycle, pymnt_logs, total_rewards):
+        """
+        :return: False if payments could not be queued because producer is exiting
+        """
+        # 3- check for past payment evidence for current cycle
+        past_payment_state = check_past_payment(self.payments_root, payment_cycle)
+        if not self.dry_run and total_rewards > 0 and past_payment_state:
+            logger.warn(past_payment_state)
+            total_rewards = 0
+
+        # 4- if total_rewards > 0, proceed with payment
+        if total_rewards > 0:
+            report_file_path = get_calculation_report_file(self.calculations_dir, payment_cycle)
+
+            # 5- send to payment consumer
+            if not self.put_payments(pymnt_logs):
+                return False
+
+            # 6- create calculations report file. This file contains calculations details
+            self.create_calculations_report(payment_cycle, pymnt_logs, report_file_path, total_rewards)
+
+        # processing of cycle is done
+        logger.info("Reward creation done for cycle %s", payment_cycle)
+
+        return True
+
+    def put_payments(self, pymnt_logs):
+        """
+        Puts payments into payments queue, waits while the queue is full.
+        :return: False if producer is exiting before there is room in the queue
+        """
+        while not self.exiting and self.life_cycle.is_running():
+            try:
+                self.payments_queue.put(pymnt_logs, timeout=QUEUE_WAIT)
+                return True
+            except queue.Full:
+                logger.info("Payments queue is full. Wait for {} seconds.".format(QUEUE_WAIT))
+
+        logger.info("Producer is exiting, payments are not queued")
+        return False
+
     def wait_until_next_cycle(self, nb_blocks_remaining):
         for x in range(nb_blocks_remaining):
             time.sleep(self.nw_config['BLOCK_TIME_IN_SEC'])
@@ -201,38 +284,22 @@ class PaymentProducer(threading.Thread):
             writer = csv.writer(f, delimiter='\t', quotechar='"', quoting=csv.QUOTE_MINIMAL)
             # write headers and total rewards
             writer.writerow(["address", "type", "ratio", "reward", "fee_rate", "payment", "fee"])
-            writer.writerow([self.baking_address, "B", 1.0, total_rewards, 0, total_rewards, 0])
+            writer.writerow([self.baking_address, "B", 1.0, format_tez(total_rewards), 0, format_tez(total_rewards), 0])
 
-            for pymnt_log in payment_logs:
+            # payment logs are a PaymentBatch, rows are read from its columns
+            for address, type, ratio, reward, fee_rate, payment, fee in \
+                    zip(payment_logs.addresses, payment_logs.types, payment_logs.ratios, payment_logs.rewards,
+                        payment_logs.fee_rates, payment_logs.payments, payment_logs.fees):
                 # write row to csv file
-                writer.writerow([pymnt_log.address, pymnt_log.type,
-                                 "{0:f}".format(pymnt_log.ratio),
-                                 "{0:f}".format(pymnt_log.reward),
-                                 "{0:f}".format(pymnt_log.fee_rate),
-                                 "{0:f}".format(pymnt_log.payment),
-                                 "{0:f}".format(pymnt_log.fee)])
+                writer.writerow([address, type, "{0:f}".format(ratio), format_tez(reward), "{0:f}".format(fee_rate),
+                                 format_tez(payment), format_tez(fee)])
 
-                logger.info("Reward created for cycle %s address %s amount %f fee %f tz type %s",
-                            payment_cycle, pymnt_log.address, pymnt_log.payment, pymnt_log.fee,
-                            pymnt_log.type)
+                logger.info("Reward created for cycle %s address %s amount %s fee %s tz type %s",
+                            payment_cycle, address, format_tez(payment), format_tez(fee), type)
 
     def make_payment_calculations(self, payment_cycle, reward_data):
-
-        if reward_data["delegators_nb"] == 0:
-            logger.warn("No delegators at cycle {}. Check your delegation status".format(payment_cycle))
-            return [], 0
-
-        rewards, total_rewards = self.reward_calculator_api.calculate(reward_data)
-
-        logger.info("Total rewards={}".format(total_rewards))
-
-        if total_rewards == 0: return [], 0
-        fm, om = self.founders_map, self.owners_map
-        rouding_command = RoundingCommand(self.pymnt_scale)
-        pymnt_calc = PaymentCalculator(fm, om, rewards, total_rewards, self.fee_calc, payment_cycle, rouding_command)
-        payment_logs = pymnt_calc.calculate()
-
-        return payment_logs, total_rewards
+        return calculate_payments(self.reward_calculator_api, self.fee_calc, self.founders_map, self.owners_map,
+                                  self.pymnt_scale, payment_cycle, reward_data)
 
     @staticmethod
     def create_exit_payment():
@@ -267,29 +334,48 @@ class PaymentProducer(threading.Thread):
                 # do not double pay
                 continue
 
-            # 2.2 - if queue is full, wait for sometime
-            # make sure the queue is not full
-            while self.payments_queue.full():
-                logger.info("Payments queue is full. Wait for 30 seconds.")
-                time.sleep(30)
-
             cycle = int(os.path.splitext(os.path.basename(payment_failed_report_file))[0])
 
-            # 2.3 read payments/failed/csv_report.csv file into a list of dictionaries
+            # 2.2 read payments/failed/csv_report.csv file into a list of dictionaries
             with open(payment_failed_report_file) as f:
                 # read csv into list of dictionaries
                 dict_rows = [{key: value for key, value in row.items()} for row in
                              csv.DictReader(f, delimiter='\t', skipinitialspace=True)]
 
-                batch = PaymentRecord.FromPaymentCSVDictRows(dict_rows, cycle)
+                batch = PaymentBatch.FromRecords(PaymentRecord.FromPaymentCSVDictRows(dict_rows, cycle), cycle)
 
-                # 2.4 put records into payment_queue. payment_consumer will make payments
+                # 2.3 put records into payment_queue. payment_consumer will make payments
+                # queue waits while it is full, stop retrying if producer is exiting
                 if batch:
-                    self.payments_queue.put(batch)
+                    if not self.put_payments(batch):
+                        return
                 else:
                     logger.info("Nothing to pay.")
 
-            # 2.5 rename payments/failed/csv_report.csv to payments/failed/csv_report.csv.BUSY
+            # 2.4 rename payments/failed/csv_report.csv to payments/failed/csv_report.csv.BUSY
             # mark the files as in use. we do not want it to be read again
             # BUSY file will be removed, if successful payment is done
             os.rename(payment_failed_report_file, get_busy_file(payment_failed_report_file))
+
+
+def calculate_payments(reward_calculator_api, fee_calc, founders_map, owners_map, pymnt_scale, payment_cycle,
+                       reward_data):
+    """
+    Calculates payments of a cycle from its reward data.
+    :return: (payment logs, total rewards)
+    """
+    if reward_data["delegators_nb"] == 0:
+        logger.warn("No delegators at cycle {}. Check your delegation status".format(payment_cycle))
+        return [], 0
+
+    rewards, total_rewards = reward_calculator_api.calculate(reward_data)
+
+    logger.info("Total rewards={}".format(format_tez(total_rewards)))
+
+    if total_rewards == 0: return [], 0
+    rouding_command = RoundingCommand(pymnt_scale)
+    pymnt_calc = PaymentCalculator(founders_map, owners_map, rewards, total_rewards, fee_calc, payment_cycle,
+                                   rouding_command)
+    payment_logs = pymnt_calc.calculate()
+
+    return payment_logs, total_rewards
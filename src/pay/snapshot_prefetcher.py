@@ -0,0 +1,64 @@
+import threading
+import time
+
+from log_config import main_logger
+
+logger = main_logger
+
+
+class SnapshotPrefetcher(threading.Thread):
+    """
+    Roll snapshot of cycle N is selected NB_FREEZE_CYCLE cycles before N starts, long before its rewards
+    are unfrozen. This thread reads delegator balances of such cycles as soon as their snapshot is known
+    and lets reward api persist them. Payment time then only needs unfrozen rewards lookup.
+    """
+
+    def __init__(self, name, network_config, reward_api, block_api, life_cycle, verbose=False):
+        super(SnapshotPrefetcher, self).__init__()
+        self.name = name
+        self.daemon = True
+        self.nw_config = network_config
+        self.reward_api = reward_api
+        self.block_api = block_api
+        self.life_cycle = life_cycle
+        self.verbose = verbose
+        self.prefetched_cycles = set()
+
+    def run(self):
+        logger.debug('Snapshot prefetcher started')
+
+        while self.life_cycle.is_running():
+            try:
+                current_level = self.block_api.get_current_level()
+                current_cycle = self.block_api.level_to_cycle(current_level)
+
+                self.prefetch(current_cycle)
+
+                # new snapshot is selected at the beginning of next cycle
+                nb_blocks_remaining = (current_cycle + 1) * self.nw_config['BLOCKS_PER_CYCLE'] - current_level
+                self.wait_blocks(nb_blocks_remaining + 1)
+            except Exception:
+                logger.warning("Error at snapshot prefetcher", exc_info=True)
+                self.wait_blocks(1)
+
+        logger.info("Snapshot prefetcher returning ...")
+
+    def prefetch(self, current_cycle):
+        # from last released cycle to the last cycle whose snapshot is already selected
+        first_cycle = current_cycle - (self.nw_config['NB_FREEZE_CYCLE'] + 1)
+        last_cycle = current_cycle + self.nw_config['NB_FREEZE_CYCLE']
+
+        for cycle in range(max(first_cycle, 0), last_cycle + 1):
+            if cycle in self.prefetched_cycles or not self.life_cycle.is_running():
+                continue
+
+            if self.reward_api.prefetch_delegators(cycle, verbose=self.verbose):
+                self.prefetched_cycles.add(cycle)
+                logger.debug("Delegator balances of cycle {} are prefetched".format(cycle))
+
+    def wait_blocks(self, nb_blocks):
+        for x in range(nb_blocks):
+            time.sleep(self.nw_config['BLOCK_TIME_IN_SEC'])
+
+            if not self.life_cycle.is_running():
+                break
@@ -0,0 +1,223 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from Constants import PAYMENT_UNKNOWN, PAYMENT_FAILED
+from exception.rpc import RpcException
+from model.payment_log import PaymentRecord
+from pay.batch_payer import BatchPayer, FORGE_RPC, PATH_RUNOPS, PATH_PREAPPLY, operation_errors
+
+SOURCE = "KT1VYLbR7Cp4xxywWR4c12BPbkmrqSf5UXad"
+SIGNATURE = "edsigtXomBKi5CTRf5cjATJWSyaRvhfYNHqSUGrn4SdbYRcGwQrUGjzEfQDTuqHhuA8b2d8NarZjz8TRf65WkpQmo423BtomS8Q"
+
+
+class FakeWalletClientManager:
+    def get_addr_dict_by_pkh(self, pkh):
+        return {"manager": "tz1manager", "alias": "manager"}
+
+    def sign(self, bytes, alias):
+        return SIGNATURE
+
+
+class FakeNode:
+    """
+    Transport answering payment RPCs. Every injected operation is included in the next block.
+    :param failures: map of path to numbers of calls (1 based) which fail
+    """
+
+    def __init__(self, failures=None) -> None:
+        super().__init__()
+        self.failures = failures or {}
+        self.calls = {}
+        self.level = 100
+        self.blocks = {}
+        self.mempool = []
+
+    def get(self, path, verbose=False, spread=False):
+        self.__count(path)
+
+        if path.endswith("/counter"):
+            return "10"
+        if path == "/chains/main/blocks/head":
+            return {"hash": "BLockGenesisGenesisGenesisGenesisGenesisf79b5d1CoW2", "metadata": {"protocol": "Pt"}}
+        if path == "/chains/main/blocks/head/header":
+            self.level += 1
+            self.blocks[self.level], self.mempool = [self.mempool], []
+            return {"level": self.level}
+        if path.endswith("/operation_hashes"):
+            return self.blocks.get(int(path.split("/")[-2]), [])
+        raise RpcException("GET {} 404".format(path))
+
+    def post(self, path, body, verbose=False):
+        self.__count(path)
+
+        if path.endswith("/forge/operations"):
+            return "abcd"
+        if path.endswith("/injection/operation"):
+            operation_hash = "opHash{}".format(self.calls[path])
+            self.mempool.append(operation_hash)
+            return operation_hash
+        return {}
+
+    def __count(self, path):
+        self.calls[path] = self.calls.get(path, 0) + 1
+        if self.calls[path] in self.failures.get(path, ()):
+            raise RpcException("{} 502".format(path))
+
+
+class TestBatchPayer(TestCase):
+
+    def setUp(self):
+        fee_ini = tempfile.NamedTemporaryFile("w", suffix=".ini", delete=False)
+        fee_ini.write("[KTTX]\nfee=1300\ngas_limit=10300\nstorage_limit=0\nbase=100\n")
+        fee_ini.close()
+        self.addCleanup(os.remove, fee_ini.name)
+
+        # no waiting between polls and retries
+        for patcher in [patch("pay.batch_payer.FEE_INI", fee_ini.name), patch("pay.batch_payer.sleep"),
+                        patch("pay.inclusion_tracker.time.sleep")]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # 600 payments take three operation groups
+        self.payments = [PaymentRecord(cycle=5, address="tz1KqTpEZ7Yob7QbPE4Hy4Wo8fHG8LhKxZSx", payment=1000000 + i,
+                                       type="D") for i in range(600)]
+
+    def pay(self, node):
+        return BatchPayer("node", SOURCE, FakeWalletClientManager(), False, FORGE_RPC, node).pay(self.payments)
+
+    def test_pay(self):
+        batch = self.pay(FakeNode())
+
+        self.assertEqual(600, sum(batch.paid))
+        self.assertEqual({"opHash1", "opHash2", "opHash3"}, set(batch.hashes))
+
+    def test_head_fails_in_the_middle(self):
+        # head is read once per group, preparation of second group fails once and is tried again
+        batch = self.pay(FakeNode({"/chains/main/blocks/head": [2]}))
+
+        self.assertEqual(600, sum(batch.paid))
+        self.assertEqual(3, len(set(batch.hashes)))
+
+    def test_head_fails_for_a_group(self):
+        # pipelined preparation and all three attempts of first group fail, payment goes on with the next groups
+        batch = self.pay(FakeNode({"/chains/main/blocks/head": [1, 2, 3, 4]}))
+
+        first, second, third = self.__chunks(batch)
+        self.assertEqual(["", "opHash1", "opHash2"], [batch.hashes[chunk[0]] for chunk in [first, second, third]])
+        self.assertEqual([0, len(second), len(third)],
+                         [sum(batch.paid[i] for i in chunk) for chunk in [first, second, third]])
+
+    def test_counter_fails_in_the_middle(self):
+        # first operation is dropped, counter is read again for second group and all three attempts fail
+        path_counter = "/chains/main/blocks/head/context/contracts/{}/counter".format(SOURCE)
+        node = FakeNode({path_counter: [2, 3, 4]})
+        node.post = self.__drop_first_injection(node.post, node)
+
+        batch = self.pay(node)
+
+        first, second, third = self.__chunks(batch)
+        self.assertEqual(["opHash1", "", "opHash2"], [batch.hashes[chunk[0]] for chunk in [first, second, third]])
+        self.assertEqual([0, 0, len(third)], [sum(batch.paid[i] for i in chunk) for chunk in [first, second, third]])
+
+    def test_header_fails_after_injection(self):
+        # header is read when first operation is added to tracker, every later read fails
+        batch = self.pay(FakeNode({"/chains/main/blocks/head/header": range(2, 100)}))
+
+        # injected operation is recorded with unknown inclusion, the rest is not paid, batch is returned for reporting
+        first, rest = self.__chunks(batch)
+        self.assertEqual({("opHash1", PAYMENT_UNKNOWN)}, {(batch.hashes[i], batch.paid[i]) for i in first})
+        self.assertEqual({("", PAYMENT_FAILED)}, {(batch.hashes[i], batch.paid[i]) for i in rest})
+
+        # a retry of the failed report pays only items which were not injected
+        node = FakeNode()
+        self.payments = PaymentRecord.FromPaymentCSVDictRows(
+            [{"address": address, "type": "D", "payment": "1", "hash": hash, "paid": str(paid)}
+             for address, hash, paid in zip(batch.addresses, batch.hashes, batch.paid)], 5)
+        retried = self.pay(node)
+
+        self.assertEqual({("opHash1", PAYMENT_UNKNOWN)}, {(retried.hashes[i], retried.paid[i]) for i in first})
+        self.assertEqual(len(rest), sum(retried.paid[i] for i in rest))
+
+    def test_run_operation_fails(self):
+        # node answers all three attempts of first group, but its operations are not applied
+        node = FakeNode()
+        post = node.post
+
+        def runops(path, body, verbose=False):
+            response = post(path, body, verbose)
+            if path == PATH_RUNOPS and node.calls[path] <= 3:
+                return {"contents": [{"metadata": {"operation_result": {"status": "failed", "errors": [
+                    {"kind": "temporary", "id": "proto.004-Pt24m4xi.contract.balance_too_low"}]}}}]}
+            return response
+
+        node.post = runops
+        batch = self.pay(node)
+
+        first, second, third = self.__chunks(batch)
+        self.assertEqual(["", "opHash1", "opHash2"], [batch.hashes[chunk[0]] for chunk in [first, second, third]])
+        self.assertEqual([0, len(second), len(third)],
+                         [sum(batch.paid[i] for i in chunk) for chunk in [first, second, third]])
+
+    def test_group_exceeds_a_limit(self):
+        # every tenth payment is zero and is not sent
+        for payment in self.payments[::10]:
+            payment.payment = 0
+        nb_transactions = [sum(1 for i in chunk if batch.payments[i]) for batch in [self.pay(FakeNode())]
+                           for chunk in self.__chunks(batch)]
+
+        # node rejects first group for its size, groups are shrunk for the rest of the payment
+        node = FakeNode()
+        post = node.post
+
+        def preapply(path, body, verbose=False):
+            if path == PATH_PREAPPLY and PATH_PREAPPLY not in node.calls:
+                node.calls[path] = 1
+                raise RpcException('[{"kind":"temporary","id":"node.prevalidation.oversized_operation"}]')
+            return post(path, body, verbose)
+
+        node.post = preapply
+        batch = self.pay(node)
+
+        chunks = self.__chunks(batch)
+        self.assertEqual(int(nb_transactions[0] * 0.8), sum(1 for i in chunks[0] if batch.payments[i]))
+        self.assertEqual(sum(nb_transactions), sum(1 for i in range(len(batch)) if batch.paid[i] and batch.payments[i]))
+
+    @staticmethod
+    def __drop_first_injection(post, node):
+        def drop(path, body, verbose=False):
+            response = post(path, body, verbose)
+            if response == "opHash1":
+                node.mempool.remove(response)
+            return response
+
+        return drop
+
+    @staticmethod
+    def __chunks(batch):
+        chunks = [[]]
+        for i, operation_hash in enumerate(batch.hashes):
+            if chunks[-1] and batch.hashes[chunks[-1][-1]] != operation_hash:
+                chunks.append([])
+            chunks[-1].append(i)
+        return chunks
+
+
+class TestOperationErrors(TestCase):
+
+    def test_applied(self):
+        applied = {"contents": [{"kind": "transaction", "metadata": {"operation_result": {"status": "applied"}}}] * 2}
+
+        self.assertEqual([], operation_errors(applied))
+        self.assertEqual([], operation_errors([applied]))
+        # forge and injection answers are strings
+        self.assertEqual([], operation_errors("opHash"))
+
+    def test_not_applied(self):
+        error = {"kind": "temporary", "id": "proto.004-Pt24m4xi.gas_exhausted.operation"}
+        preapplied = [{"contents": [{"metadata": {"operation_result": {"status": "failed", "errors": [error]}}},
+                                    {"metadata": {"operation_result": {"status": "skipped"}}}]}]
+
+        self.assertEqual([error, {"status": "skipped"}], operation_errors(preapplied))
+        self.assertEqual([error], operation_errors({"contents": [], "errors": [error]}))
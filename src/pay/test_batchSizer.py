@@ -0,0 +1,44 @@
+from unittest import TestCase
+
+from pay.batch_sizer import BatchSizer, DEFAULT_LIMITS, is_limit_error
+from pay.operation_builder import OperationBuilder
+from util.forge_utils import forge_operation, BRANCH_SIZE
+
+BRANCH = "BLockGenesisGenesisGenesisGenesisGenesisf79b5d1CoW2"
+
+
+class TestBatchSizer(TestCase):
+
+    def setUp(self):
+        self.op_builder = OperationBuilder("KT1VYLbR7Cp4xxywWR4c12BPbkmrqSf5UXad", 1300, 10300, 0)
+        self.sizer = BatchSizer(self.op_builder, DEFAULT_LIMITS)
+
+    def test_estimate(self):
+        contents = [self.op_builder.transaction("tz1KqTpEZ7Yob7QbPE4Hy4Wo8fHG8LhKxZSx", amount, counter)
+                    for amount, counter in [(1, 127), (10 ** 6, 128), (10 ** 12, 2 ** 30)]]
+
+        forged_size = len(forge_operation(BRANCH, contents)) // 2 - BRANCH_SIZE
+        self.assertEqual(forged_size, self.sizer.estimate(contents))
+
+    def test_take(self):
+        amounts = [10 ** 6] * 1000
+        count = self.sizer.take(amounts, 1000)
+
+        contents = [self.op_builder.transaction("tz1KqTpEZ7Yob7QbPE4Hy4Wo8fHG8LhKxZSx", amount, 1001 + k)
+                    for k, amount in enumerate(amounts[:count + 1])]
+        self.assertLessEqual(self.sizer.estimate(contents[:-1]), self.sizer.size_limit)
+        self.assertGreater(self.sizer.estimate(contents), self.sizer.size_limit)
+
+        # zero amounts take no space
+        self.assertEqual(count + 5, self.sizer.take([0] * 5 + amounts, 1000))
+        # a single payment is always taken
+        self.assertEqual(1, BatchSizer(self.op_builder, dict(DEFAULT_LIMITS, hard_gas_limit_per_block=1)).take(amounts))
+
+        self.assertEqual(int(count * 0.8), self.sizer.shrink(count))
+        self.assertEqual(int(count * 0.8), self.sizer.take(amounts, 1000))
+        # limit is on transactions, zero amounts are not counted
+        self.assertEqual(int(count * 0.8) + 5, self.sizer.take([0] * 5 + amounts, 1000))
+
+    def test_is_limit_error(self):
+        self.assertTrue(is_limit_error([{"kind": "temporary", "id": "node.prevalidation.oversized_operation"}]))
+        self.assertFalse(is_limit_error([{"kind": "temporary", "id": "proto.004-Pt24m4xi.counter_in_the_past"}]))
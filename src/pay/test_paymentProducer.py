@@ -0,0 +1,115 @@
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from Constants import RunMode
+from calc.service_fee_calculator import ServiceFeeCalculator
+from pay.payment_producer import PaymentProducer
+from rpc.rpc_reward_calculator import RpcRewardCalculatorApi
+
+
+class FakeBakingConf:
+    def get_baking_address(self): return "tz1baker"
+
+    def get_owners_map(self): return {}
+
+    def get_founders_map(self): return {}
+
+    def get_excluded_delegators_set(self): return set()
+
+    def get_min_delegation_amount(self): return 0
+
+    def get_payment_scale(self): return None
+
+    def get_percentage_scale(self): return None
+
+
+class FakeRewardApi:
+    """
+    Reward data of a cycle, first cycle is the slowest to fetch. Fetching failing_cycle raises.
+    """
+
+    def __init__(self, first_cycle, failing_cycle=None) -> None:
+        super().__init__()
+        self.first_cycle = first_cycle
+        self.failing_cycle = failing_cycle
+
+    def get_rewards_for_cycle_map(self, cycle, verbose=False):
+        if cycle == self.first_cycle:
+            time.sleep(0.2)
+        if cycle == self.failing_cycle:
+            raise Exception("Reward data of cycle {} is not available".format(cycle))
+
+        return {"delegate_staking_balance": 10 ** 12, "total_rewards": 10 ** 9 + cycle, "delegators_nb": 2,
+                "delegators": {"KT1a": 10 ** 11, "KT1b": 3 * 10 ** 11}}
+
+
+class FakeProviderFactory:
+    def __init__(self, reward_api) -> None:
+        super().__init__()
+        self.reward_api = reward_api
+
+    def newRewardApi(self, network_config, baking_address, wllt_clnt_mngr, node_url):
+        return self.reward_api
+
+    def newBlockApi(self, network_config, wllt_clnt_mngr, node_url):
+        return None
+
+    def newCalcApi(self, founders_map, min_delegation_amt, excluded_set, rc, fee_calc=None):
+        return RpcRewardCalculatorApi(founders_map, min_delegation_amt, excluded_set, rc, fee_calc=fee_calc)
+
+
+class FakeLifeCycle:
+    def __init__(self) -> None:
+        super().__init__()
+        self.running = True
+
+    def is_running(self):
+        return self.running
+
+
+class TestPaymentProducer(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.life_cycle = FakeLifeCycle()
+
+    def producer(self, reward_api, payments_queue):
+        return PaymentProducer("producer", 10, {}, self.dir, self.dir, RunMode.FOREVER,
+                               ServiceFeeCalculator(set(), {}, 10), 0, 0, FakeBakingConf(), payments_queue,
+                               self.life_cycle, False, None, None, FakeProviderFactory(reward_api),
+                               backfill_parallelism=3)
+
+    def test_backfill(self):
+        payments_queue = queue.Queue(50)
+
+        next_cycle = self.producer(FakeRewardApi(10), payments_queue).backfill(10, 14)
+
+        self.assertEqual(15, next_cycle)
+        self.assertEqual([10, 11, 12, 13, 14], [payments_queue.get().cycle for _ in range(5)])
+
+    def test_backfill_stops_at_failed_cycle(self):
+        payments_queue = queue.Queue(50)
+
+        next_cycle = self.producer(FakeRewardApi(10, failing_cycle=12), payments_queue).backfill(10, 14)
+
+        # cycles before the failed one are sent, payment goes on from the failed cycle
+        self.assertEqual(12, next_cycle)
+        self.assertEqual([10, 11], [payments_queue.get().cycle for _ in range(payments_queue.qsize())])
+
+    def test_backfill_stops_if_queue_is_full_on_exit(self):
+        # consumer is stopped, queue is never emptied
+        payments_queue = queue.Queue(1)
+        payments_queue.put("not consumed")
+        threading.Timer(0.5, lambda: setattr(self.life_cycle, "running", False)).start()
+
+        with patch("pay.payment_producer.QUEUE_WAIT", 0.01):
+            next_cycle = self.producer(FakeRewardApi(10), payments_queue).backfill(10, 14)
+
+        self.assertEqual(10, next_cycle)
+        self.assertEqual(1, payments_queue.qsize())
@@ -0,0 +1,52 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from pay.snapshot_prefetcher import SnapshotPrefetcher
+
+NETWORK = {"BLOCKS_PER_CYCLE": 8, "NB_FREEZE_CYCLE": 5, "BLOCK_TIME_IN_SEC": 60}
+
+
+class TestSnapshotPrefetcher(TestCase):
+
+    def setUp(self):
+        self.reward_api = Mock()
+        self.block_api = Mock()
+        self.block_api.level_to_cycle.side_effect = lambda level: level // NETWORK["BLOCKS_PER_CYCLE"]
+        self.life_cycle = Mock()
+        self.life_cycle.is_running.return_value = True
+        self.prefetcher = SnapshotPrefetcher("prefetcher", NETWORK, self.reward_api, self.block_api, self.life_cycle)
+
+    def prefetched(self):
+        return [args[0] for args, _ in self.reward_api.prefetch_delegators.call_args_list]
+
+    def test_prefetch(self):
+        # snapshot of the last cycle is not selected yet
+        self.reward_api.prefetch_delegators.side_effect = lambda cycle, verbose: cycle < 25
+
+        self.prefetcher.prefetch(20)
+
+        # from last released cycle to the last cycle whose snapshot can be selected
+        self.assertEqual(list(range(14, 26)), self.prefetched())
+
+        # only cycles which were not prefetched are tried again
+        self.reward_api.prefetch_delegators.reset_mock()
+        self.prefetcher.prefetch(21)
+        self.assertEqual([25, 26], self.prefetched())
+
+    def test_first_cycles(self):
+        self.prefetcher.prefetch(2)
+
+        self.assertEqual(list(range(0, 8)), self.prefetched())
+
+    @patch("pay.snapshot_prefetcher.time.sleep")
+    def test_run_waits_for_next_cycle(self, sleep):
+        # second level read fails, application stops at third level read
+        self.block_api.get_current_level.side_effect = [165, Exception("node is down"), 168]
+        self.life_cycle.is_running.side_effect = lambda: self.block_api.get_current_level.call_count < 3
+
+        self.prefetcher.run()
+
+        # level 165 is in cycle 20, next snapshot is selected at level 168 and read a block later.
+        # A failure waits a block. Stop is noticed before prefetching and after a block of waiting
+        self.assertEqual([60] * (4 + 1 + 1), [args[0] for args, _ in sleep.call_args_list])
+        self.assertEqual(list(range(14, 26)), self.prefetched())
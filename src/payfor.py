@@ -15,6 +15,7 @@ from pay.payment_consumer import PaymentConsumer
 from util.client_utils import get_client_path
 from util.dir_utils import get_payment_root, \
     get_successful_payments_dir, get_failed_payments_dir
+from util.num_utils import to_mutez, format_tez
 from util.process_life_cycle import ProcessLifeCycle
 
 LINER = "--------------------------------------------"
@@ -25,7 +26,6 @@ payments_queue = queue.Queue(BUF_SIZE)
 logger = main_logger
 
 life_cycle = ProcessLifeCycle()
-MUTEZ = 1
 
 
 def main(args):
@@ -73,7 +73,7 @@ def main(args):
     for line in payment_lines:
         pkh, amt = line.split(":")
         pkh = pkh.strip()
-        amt = float(amt.strip())
+        amt = to_mutez(amt)
 
         payments_dict[pkh] = amt
 
@@ -131,11 +131,10 @@ def main(args):
     payment_items = []
     for key, value in payments_dict.items():
         pi = PaymentRecord.ManualInstance(file_name, key, value)
-        pi.payment = pi.payment * MUTEZ
         payment_items.append(pi)
 
-        logger.info("Reward created for cycle %s address %s amount %f fee %f tz type %s",
-                    pi.cycle, pi.address, pi.payment, pi.fee,
+        logger.info("Reward created for cycle %s address %s amount %s fee %s tz type %s",
+                    pi.cycle, pi.address, format_tez(pi.payment), format_tez(pi.fee),
                     pi.type)
 
     payments_queue.put(payment_items)
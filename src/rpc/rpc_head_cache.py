@@ -0,0 +1,35 @@
+import threading
+import time
+
+COMM_HEAD = "/chains/main/blocks/head"
+
+
+class RpcHeadCache:
+    """
+    Keeps the last head block read from the node for ttl seconds. A new block can not appear
+    more often than once per block time, so block and reward apis can share a single head read.
+    """
+
+    def __init__(self, transport, ttl) -> None:
+        super().__init__()
+        self.transport = transport
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.head = None
+        self.fetch_time = 0
+
+    def get_head(self, verbose=False):
+        with self.lock:
+            if self.head is None or time.time() - self.fetch_time >= self.ttl:
+                self.head = self.transport.get(COMM_HEAD, verbose)
+                self.fetch_time = time.time()
+
+            return self.head
+
+    def get_current_level(self, verbose=False):
+        head = self.get_head(verbose)
+        return int(head["metadata"]["level"]["level"]), head["hash"]
+
+    def invalidate(self):
+        with self.lock:
+            self.head = None
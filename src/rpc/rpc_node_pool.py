@@ -0,0 +1,146 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from log_config import main_logger
+
+logger = main_logger
+
+COMM_HEADER = "/chains/main/blocks/head/header"
+
+DEFAULT_PROBE_INTERVAL = 30
+PROBE_TIMEOUT = 5
+# nodes more than this many levels behind the best known head are not used
+DEFAULT_MAX_LEVEL_LAG = 2
+# weight of the newest latency sample in the moving average
+LATENCY_SMOOTHING = 0.3
+
+
+class RpcNode:
+    def __init__(self, url) -> None:
+        super().__init__()
+        self.url = url
+        self.latency = None
+        self.level = None
+        self.healthy = True
+        self.last_failure = 0
+
+    def update_latency(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self.latency
+
+    def __repr__(self) -> str:
+        return "{}(healthy={}, level={}, latency={})".format(self.url, self.healthy, self.level,
+                                                             "{:.3f}".format(self.latency) if self.latency else None)
+
+
+class RpcNodePool:
+    """
+    A set of nodes serving the same chain. Nodes are probed in background for head level and latency.
+    Reads are routed to the fastest healthy node, other nodes are used for failover.
+    """
+
+    def __init__(self, node_urls, probe_interval=DEFAULT_PROBE_INTERVAL, max_level_lag=DEFAULT_MAX_LEVEL_LAG) -> None:
+        super().__init__()
+        if not node_urls:
+            raise Exception("At least one node is required")
+
+        self.nodes = [RpcNode(url) for url in node_urls]
+        self.primary = node_urls[0]
+        self.probe_interval = probe_interval
+        self.max_level_lag = max_level_lag
+        self.lock = threading.Lock()
+        self.round_robin = 0
+        self.session = requests.Session()
+        self.prober = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        # a single node has nothing to choose from
+        if len(self.nodes) < 2:
+            return
+
+        # pool may be shared, only the first call starts a prober
+        with self.lock:
+            if self.prober:
+                return
+            self.prober = threading.Thread(target=self.probe_endless, name='node_prober', daemon=True)
+
+        self.probe()
+        self.prober.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.prober and self.prober.is_alive():
+            self.prober.join()
+
+    def probe_endless(self):
+        while not self.stopped.wait(self.probe_interval):
+            try:
+                self.probe()
+            except Exception:
+                logger.warning("Error while probing nodes", exc_info=True)
+
+    def probe(self):
+        with ThreadPoolExecutor(max_workers=len(self.nodes)) as executor:
+            results = list(executor.map(self.probe_node, self.nodes))
+
+        with self.lock:
+            levels = [level for level, _ in results if level is not None]
+            best_level = max(levels) if levels else None
+
+            for node, (level, latency) in zip(self.nodes, results):
+                node.level = level
+                node.healthy = level is not None and level >= best_level - self.max_level_lag
+                if latency is not None:
+                    node.update_latency(latency)
+
+        logger.debug("Node pool state: {}".format(self.nodes))
+
+    def probe_node(self, node):
+        start = time.time()
+        try:
+            resp = self.session.get("http://{}{}".format(node.url, COMM_HEADER), timeout=PROBE_TIMEOUT)
+            if resp.status_code != 200:
+                return None, None
+            return int(resp.json()["level"]), time.time() - start
+        except Exception:
+            return None, None
+
+    def candidates(self, spread=False):
+        """
+        :param spread: rotate among healthy nodes instead of always starting with the fastest one.
+        Suitable for requests that can be served by any node, e.g. requests at a fixed block hash.
+        :return: node urls in the order they should be tried
+        """
+        with self.lock:
+            healthy = sorted([node for node in self.nodes if node.healthy],
+                             key=lambda node: node.latency if node.latency is not None else float('inf'))
+            # last resort, starting with the one that failed least recently
+            unhealthy = sorted([node for node in self.nodes if not node.healthy], key=lambda node: node.last_failure)
+
+            if spread and healthy:
+                self.round_robin = (self.round_robin + 1) % len(healthy)
+                healthy = healthy[self.round_robin:] + healthy[:self.round_robin]
+
+        return [node.url for node in healthy + unhealthy]
+
+    def report_success(self, url, latency):
+        with self.lock:
+            for node in self.nodes:
+                if node.url == url:
+                    node.update_latency(latency)
+
+    def report_failure(self, url):
+        # node is not used until next probe finds it healthy
+        with self.lock:
+            for node in self.nodes:
+                if node.url == url and len(self.nodes) > 1:
+                    if node.healthy:
+                        logger.warning("Node {} is marked as unhealthy".format(url))
+                    node.healthy = False
+                    node.last_failure = time.time()
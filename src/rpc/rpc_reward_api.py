@@ -1,22 +1,42 @@
-from api.reward_api import RewardApi
+import random
+from concurrent.futures import ThreadPoolExecutor
 
+from api.reward_api import RewardApi
+from exception.rpc import RpcException
 from log_config import main_logger
-from tzscan.mirror_selection_helper import TzScanMirrorSelector
-from util.rpc_utils import parse_json_response
-from tzscan.tzscan_reward_api import TzScanRewardApiImpl
 
 logger = main_logger
 
-COMM_HEAD = " rpc get http://{}/chains/main/blocks/head"
-COMM_DELEGATES = " rpc get http://{}/chains/main/blocks/{}/context/delegates/{}"
-COMM_BLOCK = " rpc get http://{}/chains/main/blocks/{}~{}/"
+COMM_DELEGATES = "/chains/main/blocks/{}/context/delegates/{}"
+COMM_BLOCK = "/chains/main/blocks/{}~{}/"
 COMM_SNAPSHOT = COMM_BLOCK + "context/raw/json/rolls/owner/snapshot/{}/"
-COMM_DELEGATE_BALANCE = " rpc get http://{}/chains/main/blocks/{}/context/contracts/{}"
+COMM_BLOCK_HASH = COMM_BLOCK + "hash"
+COMM_DELEGATE_BALANCE = "/chains/main/blocks/{}/context/contracts/{}"
+COMM_RAW_CONTRACTS = "/chains/main/blocks/{}/context/raw/json/contracts/index?depth={}"
+
+DEFAULT_PARALLELISM = 8
+
+# contract: one request per delegated contract
+# raw: all contract balances in a single raw context request, matched locally
+BALANCE_STRATEGY_CONTRACT = 'contract'
+BALANCE_STRATEGY_RAW = 'raw'
+BALANCE_STRATEGIES = [BALANCE_STRATEGY_CONTRACT, BALANCE_STRATEGY_RAW]
+
+# contract index -> contract -> balance
+RAW_CONTRACTS_DEPTH = 2
+# number of balances from raw context cross checked against contract rpc
+RAW_BALANCE_CHECK_SIZE = 10
+
+# cache scope of cycle -> snapshot block mapping
+SNAPSHOT_CACHE_SCOPE = "snapshots"
+# cache scope of (baker, cycle) -> delegator balances at snapshot block
+DELEGATORS_CACHE_SCOPE = "delegators"
 
 
 class RpcRewardApiImpl(RewardApi):
 
-    def __init__(self, nw, baking_address, wllt_clnt_mngr, node_url, validate=True):
+    def __init__(self, nw, baking_address, transport, head_cache, validate_api=None, validate_executor=None,
+                 parallelism=DEFAULT_PARALLELISM, cache=None, balance_strategy=BALANCE_STRATEGY_CONTRACT):
         super(RpcRewardApiImpl, self).__init__()
 
         self.blocks_per_cycle = nw['BLOCKS_PER_CYCLE']  
@@ -24,15 +44,28 @@ class RpcRewardApiImpl(RewardApi):
         self.blocks_per_roll_snapshot = nw['BLOCKS_PER_ROLL_SNAPSHOT']
         
         self.baking_address = baking_address
-        self.wllt_clnt_mngr = wllt_clnt_mngr
-        self.node_url = node_url
+        self.transport = transport
+        self.head_cache = head_cache
+        self.parallelism = parallelism
+        self.cache = cache
+        self.balance_strategy = balance_strategy
         
-        self.validate = validate
-        if self.validate:
-            mirror_selector = TzScanMirrorSelector(nw)
-            mirror_selector.initialize()
-            self.validate_api = TzScanRewardApiImpl(nw, self.baking_address, mirror_selector)
+        # reward data of validate_api is fetched by validate_executor while rpc data is collected
+        self.validate = validate_api is not None
+        self.validate_api = validate_api
+        self.validate_executor = validate_executor
 
+    def prefetch_delegators(self, cycle, verbose=False):
+        """
+        Reads and persists delegator balances of a cycle whose snapshot is already selected, so that
+        payment time only needs the unfrozen rewards lookup.
+        :return: False if snapshot of the cycle is not known yet
+        """
+        if self.__get_snapshot_block_hash(cycle, verbose) == "":
+            return False
+
+        self.__get_delegators_and_delgators_balance(cycle, verbose)
+        return True
 
     def get_nb_delegators(self, cycle, verbose=False):
         _, delegators = self.__get_delegators_and_delgators_balance(cycle)
@@ -42,24 +75,26 @@ class RpcRewardApiImpl(RewardApi):
     def get_rewards_for_cycle_map(self, cycle, verbose=False):
 
         reward_data = {}
-        
-        reward_data["delegate_staking_balance"], reward_data["delegators"] = self.__get_delegators_and_delgators_balance(cycle)      
-        reward_data["delegators_nb"] = len(reward_data["delegators"])
-        
-        current_level, head_hash = self.__get_current_level(verbose)        
+
+        current_level, head_hash = self.__get_current_level(verbose)
 
         # Get last block in cycle where rewards are unfrozen
         level_for_relevant_request = (cycle + self.preserved_cycles + 1) * self.blocks_per_cycle
+        unfrozen = current_level - level_for_relevant_request >= 0
+
+        validation_future = None
+        if self.validate and unfrozen:
+            validation_future = self.validate_executor.submit(self.validate_api.get_rewards_for_cycle_map, cycle)
+
+        reward_data["delegate_staking_balance"], reward_data["delegators"] = self.__get_delegators_and_delgators_balance(cycle)
+        reward_data["delegators_nb"] = len(reward_data["delegators"])
 
-        if current_level - level_for_relevant_request >= 0:
-            request_metadata = COMM_BLOCK.format(self.node_url, head_hash, current_level - level_for_relevant_request)+'/metadata/'
-            response_metadata = self.wllt_clnt_mngr.send_request(request_metadata)
-            metadata = parse_json_response(response_metadata)
-            balance_updates = metadata["balance_updates"]
+        if unfrozen:
+            request_metadata = COMM_BLOCK.format(head_hash, current_level - level_for_relevant_request) + 'metadata'
+            balance_updates = self.transport.stream(request_metadata, "balance_updates", verbose)
 
             unfrozen_rewards = unfrozen_fees = 0
-            for i in range(len(balance_updates)):
-                balance_update = balance_updates[i]
+            for balance_update in balance_updates:
                 if balance_update["kind"] == "freezer":
                     if balance_update["delegate"] == self.baking_address:
                         if balance_update["category"] == "rewards":
@@ -67,8 +102,8 @@ class RpcRewardApiImpl(RewardApi):
                         elif balance_update["category"] == "fees":
                             unfrozen_fees = -int(balance_update["change"])
             reward_data["total_rewards"] = unfrozen_rewards + unfrozen_fees
-            if self.validate:
-                self.__validate_reward_data(reward_data, cycle)
+            if validation_future:
+                self.__validate_reward_data(reward_data, validation_future.result())
         else:
             logger.warn("Please wait until the rewards and fees for cycle {} are unfrozen".format(cycle))        
             reward_data["total_rewards"] = 0
@@ -76,65 +111,168 @@ class RpcRewardApiImpl(RewardApi):
         return reward_data
 
     def __get_current_level(self, verbose=False):
-        response = self.wllt_clnt_mngr.send_request(COMM_HEAD.format(self.node_url))
-        head = parse_json_response(response)
-        current_level = int(head["metadata"]["level"]["level"])
-        head_hash = head["hash"]
-        return current_level, head_hash
+        return self.head_cache.get_current_level(verbose)
         
+    def __delegators_cache_key(self, cycle):
+        return "{}/{}".format(self.baking_address, cycle)
+
     def __get_delegators_and_delgators_balance(self, cycle, verbose=False):
+
+        if self.cache:
+            cached = self.cache.get(DELEGATORS_CACHE_SCOPE, self.__delegators_cache_key(cycle))
+            if cached is not None:
+                # stored as list of pairs to keep order of delegators
+                return cached["delegate_staking_balance"], dict(cached["delegators"])
         
         hash_snapshot_block = self.__get_snapshot_block_hash(cycle)
         if hash_snapshot_block == "":
             return 0, []
             
-        request = COMM_DELEGATES.format(self.node_url, hash_snapshot_block, self.baking_address)
-        response = self.wllt_clnt_mngr.send_request(request)
-        
-        delegate_staking_balance = 0
-        delegators = {}
-        
-        try:
-            response = parse_json_response(response)
-            delegate_staking_balance = int(response["staking_balance"])
-
-            delegators_addresses = response["delegated_contracts"]
-            for delegator in delegators_addresses:
-                request = COMM_DELEGATE_BALANCE.format(self.node_url, hash_snapshot_block, delegator)
-                response = self.wllt_clnt_mngr.send_request(request)
-                response = parse_json_response(response)
-                delegators[delegator] = int(response["balance"])
-        except:
-            logger.warn('No delegators or unexpected error')
-        
+        response = self.__get_delegate(hash_snapshot_block, verbose)
+
+        delegate_staking_balance = int(response["staking_balance"])
+        delegators_addresses = response["delegated_contracts"]
+
+        if not delegators_addresses:
+            logger.warning('No delegators found at snapshot block {}'.format(hash_snapshot_block))
+
+        if self.balance_strategy == BALANCE_STRATEGY_RAW and delegators_addresses:
+            delegators = self.__get_delegators_balance_raw(hash_snapshot_block, delegators_addresses, verbose)
+        else:
+            delegators = self.__get_delegators_balance(hash_snapshot_block, delegators_addresses, verbose)
+
+        if self.cache:
+            self.cache.put(DELEGATORS_CACHE_SCOPE, self.__delegators_cache_key(cycle),
+                           {"delegate_staking_balance": delegate_staking_balance,
+                            "delegators": list(delegators.items())})
+
         return delegate_staking_balance, delegators
+
+    def __get_delegate(self, hash_snapshot_block, verbose=False):
+        request = COMM_DELEGATES.format(hash_snapshot_block, self.baking_address)
+
+        if self.cache:
+            response = self.cache.get(hash_snapshot_block, request)
+            if response is not None:
+                return response
+
+        # delegated contracts list can be large, decode it while it is received
+        delegated_contracts = self.transport.stream(request, "delegated_contracts", verbose, spread=True)
+        addresses = list(delegated_contracts)
+        response = delegated_contracts.rest
+        response["delegated_contracts"] = addresses
+
+        if self.cache:
+            self.cache.put(hash_snapshot_block, request, response)
+
+        return response
+
+    def __get_delegator_balance(self, hash_snapshot_block, delegator, verbose=False):
+        request = COMM_DELEGATE_BALANCE.format(hash_snapshot_block, delegator)
+        response = self.__get_at_block(hash_snapshot_block, request, verbose)
+        return int(response["balance"])
+
+    def __get_delegators_balance_raw(self, hash_snapshot_block, delegators_addresses, verbose=False):
+        request = COMM_RAW_CONTRACTS.format(hash_snapshot_block, RAW_CONTRACTS_DEPTH)
+        contracts = self.transport.stream(request, None, verbose, spread=True)
+        balances = parse_raw_contract_balances(contracts, set(delegators_addresses))
+
+        delegators = {delegator: balances.get(delegator) for delegator in delegators_addresses}
+
+        missing_delegators = [delegator for delegator, balance in delegators.items() if balance is None]
+        if missing_delegators:
+            logger.warning("{} delegators are not found in raw context, their balances are requested one by one"
+                           .format(len(missing_delegators)))
+            delegators.update(self.__get_delegators_balance(hash_snapshot_block, missing_delegators, verbose))
+
+        # raw context layout is not a stable api, make sure it agrees with contract rpc
+        missing_delegators = set(missing_delegators)
+        found_delegators = [delegator for delegator in delegators_addresses if delegator not in missing_delegators]
+        for delegator in random.sample(found_delegators, min(RAW_BALANCE_CHECK_SIZE, len(found_delegators))):
+            balance = self.__get_delegator_balance(hash_snapshot_block, delegator, verbose)
+            if balance != delegators[delegator]:
+                raise RpcException("Balance of {} at block {} is {} in raw context but {} in contract rpc"
+                                   .format(delegator, hash_snapshot_block, delegators[delegator], balance))
+
+        return delegators
+
+    # responses for requests at a fixed block hash never change, serve them from cache when possible
+    # such requests do not depend on node's head either, any node can serve them
+    def __get_at_block(self, block_hash, request, verbose=False):
+        if self.cache:
+            response = self.cache.get(block_hash, request)
+            if response is not None:
+                return response
+
+        response = self.transport.get(request, verbose, spread=True)
+
+        if self.cache:
+            self.cache.put(block_hash, request, response)
+
+        return response
+
+    def __get_delegators_balance(self, hash_snapshot_block, delegators_addresses, verbose=False):
+        # at most self.parallelism requests are sent to the node at the same time
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            futures = [(delegator, executor.submit(self.__get_delegator_balance, hash_snapshot_block, delegator, verbose))
+                       for delegator in delegators_addresses]
+
+        # keep the order of delegated contracts list
+        delegators = {}
+        failed_delegators = []
+        for delegator, future in futures:
+            try:
+                delegators[delegator] = future.result()
+            except Exception as e:
+                logger.warning("Balance request failed for delegator {}: {}".format(delegator, e))
+                delegators[delegator] = None
+                failed_delegators.append(delegator)
+
+        # give failed requests one more chance, one at a time. A missing balance must fail the cycle
+        for delegator in failed_delegators:
+            try:
+                delegators[delegator] = self.__get_delegator_balance(hash_snapshot_block, delegator, verbose)
+            except Exception as e:
+                raise RpcException("Unable to get balance of delegator {} at block {}"
+                                   .format(delegator, hash_snapshot_block)) from e
+
+        return delegators
         
     def __get_snapshot_block_hash(self, cycle, verbose=False):
-        
+
+        # snapshot of a cycle does not change once it is selected
+        if self.cache:
+            snapshot = self.cache.get(SNAPSHOT_CACHE_SCOPE, str(cycle))
+            if snapshot is not None:
+                return snapshot["block_hash"]
+
         current_level, head_hash = self.__get_current_level(verbose)
         
         level_for_snapshot_request = (cycle - self.preserved_cycles) * self.blocks_per_cycle + 1    
 
         if current_level - level_for_snapshot_request >= 0:
-            request = COMM_SNAPSHOT.format(self.node_url, head_hash, current_level - level_for_snapshot_request, cycle)
-            response = self.wllt_clnt_mngr.send_request(request)
-            snapshots = parse_json_response(response)
+            request = COMM_SNAPSHOT.format(head_hash, current_level - level_for_snapshot_request, cycle)
+            snapshots = self.transport.get(request, verbose)
     
-            if len(snapshots) == 1:
-                chosen_snapshot = snapshots[0]
-            else:
-                logger.info("Too few or too many possible snapshots found!")
+            if len(snapshots) != 1:
+                raise RpcException("Too few or too many possible snapshots found for cycle {}: {}".format(cycle, snapshots))
+
+            chosen_snapshot = snapshots[0]
             
             level_snapshot_block = (cycle - self.preserved_cycles - 2) * self.blocks_per_cycle + ( chosen_snapshot + 1 ) * self.blocks_per_roll_snapshot
-            request = COMM_BLOCK.format(self.node_url, head_hash, current_level - level_snapshot_block) + " | jq -r .hash"
-            hash_snapshot_block = self.wllt_clnt_mngr.send_request(request).rstrip()
+            request = COMM_BLOCK_HASH.format(head_hash, current_level - level_snapshot_block)
+            hash_snapshot_block = self.transport.get(request, verbose)
+
+            if self.cache:
+                self.cache.put(SNAPSHOT_CACHE_SCOPE, str(cycle), {"snapshot_index": chosen_snapshot,
+                                                                 "level": level_snapshot_block,
+                                                                 "block_hash": hash_snapshot_block})
             return hash_snapshot_block
         else:
             logger.info("Cycle too far in the future")
             return ""
 
-    def __validate_reward_data(self, reward_data_rpc, cycle):
-        reward_data_tzscan = self.validate_api.get_rewards_for_cycle_map(cycle)
+    def __validate_reward_data(self, reward_data_rpc, reward_data_tzscan):
         if not reward_data_rpc["delegate_staking_balance"] == int(reward_data_tzscan["delegate_staking_balance"]):
             raise Exception("Delegate staking balance from local node and tzscan are not identical.")
                 
@@ -144,10 +282,14 @@ class RpcRewardApiImpl(RewardApi):
         if (reward_data_rpc["delegators_nb"]) == 0:
             return
         
-        delegators_balance_tzscan = [ int(reward_data_tzscan["delegators_balance"][i][1]) for i in range(len(reward_data_tzscan["delegators_balance"]))]
-        print(set(list(reward_data_rpc["delegators"].values())))
-        print(set(delegators_balance_tzscan))
-        if not set(list(reward_data_rpc["delegators"].values())) == set(delegators_balance_tzscan):
+        delegators_balance_tzscan = {dbalance[0]["tz"]: int(dbalance[1])
+                                     for dbalance in reward_data_tzscan["delegators_balance"]}
+        mismatches = [address for address in set(reward_data_rpc["delegators"]) | set(delegators_balance_tzscan)
+                      if reward_data_rpc["delegators"].get(address) != delegators_balance_tzscan.get(address)]
+        if mismatches:
+            for address in sorted(mismatches):
+                logger.error("Balance of {} is {} on local node, {} on tzscan".format(
+                    address, reward_data_rpc["delegators"].get(address), delegators_balance_tzscan.get(address)))
             raise Exception("Delegators' balances from local node and tzscan are not identical.")
 
         blocks_rewards = int(reward_data_tzscan["blocks_rewards"])
@@ -163,4 +305,24 @@ class RpcRewardApiImpl(RewardApi):
 
         if not reward_data_rpc["total_rewards"] == total_rewards_tzscan:
             raise Exception("Total rewards from local node and tzscan are not identical.")
-        
+
+
+def parse_raw_contract_balances(contracts, wanted):
+    """
+    :param contracts: JsonArrayStream over raw json listing of contracts index. Indexed storage is listed as
+    [[contract, {"balance": ..., ...}], ...] or {contract: {"balance": ..., ...}, ...}
+    :param wanted: set of contracts to keep, others are dropped as they are received
+    :return: map of contract to balance
+    """
+    balances = {}
+    for contract, data in contracts:
+        if contract in wanted and isinstance(data, dict) and "balance" in data:
+            balances[contract] = int(data["balance"])
+
+    # not an array, whole listing is in rest
+    if isinstance(contracts.rest, dict):
+        for contract, data in contracts.rest.items():
+            if contract in wanted and isinstance(data, dict) and "balance" in data:
+                balances[contract] = int(data["balance"])
+
+    return balances
@@ -1,20 +1,27 @@
 from api.reward_calculator_api import RewardCalculatorApi
+from calc.columnar_engine import calculate_rewards
+from calc.service_fee_calculator import ServiceFeeCalculator
 
 from log_config import main_logger
+from util.num_utils import to_mutez, format_tez
 from util.rounding_command import RoundingCommand
 from model.payment_log import PaymentRecord
 
 logger = main_logger
 
-MUTEZ = 1000000
 
 class RpcRewardCalculatorApi(RewardCalculatorApi):
 
-    def __init__(self, founders_map, min_delegation_amt, excluded_set, rc=RoundingCommand(None)):
+    def __init__(self, founders_map, min_delegation_amt, excluded_set, rc=RoundingCommand(None), columnar=False,
+                 fee_calc=None):
         super(RpcRewardCalculatorApi, self).__init__(founders_map, excluded_set)
-        self.min_delegation_amt_mutez = min_delegation_amt * MUTEZ
+        self.min_delegation_amt_mutez = to_mutez(min_delegation_amt)
         self.logger = main_logger
         self.rc = rc
+        self.columnar = columnar
+        # if a fee calculator is given, fee rates are resolved together with exclusions and set on rewards
+        self.fee_calc = fee_calc
+        self.policy = fee_calc if fee_calc else ServiceFeeCalculator(set(), {}, 0, excluded_set, min_delegation_amt)
 
 
     def calculate(self, reward_data, verbose=False):
@@ -25,39 +32,43 @@ class RpcRewardCalculatorApi(RewardCalculatorApi):
         
         if len(delegators) > 0:        
             
-            total_rewards = reward_data["total_rewards"] / MUTEZ
+            total_rewards = reward_data["total_rewards"]
             
-            if total_rewards > 0:        
-            
-                effective_delegate_staking_balance = delegate_staking_balance
-                effective_delegator_addresses = []
-        
+            addresses = list(delegators)
+            balances = [delegators[address] for address in addresses]
+            fee_rates, excluded, min_delegations = self.policy.apply(addresses, balances)
+            if not self.fee_calc:
+                fee_rates = None
+
+            if total_rewards > 0 and self.columnar:
+                rewards = calculate_rewards(addresses, balances, delegate_staking_balance, total_rewards, excluded,
+                                            min_delegations, self.rc, fee_rates)
+
+            elif total_rewards > 0:
+
                 # excluded addresses are processed
-                for address in delegators:
-                    balance = delegators[address]
-        
-                    if address in self.excluded_set:
-                        effective_delegate_staking_balance -= balance
-                        continue
-                    effective_delegator_addresses.append(address)
-        
-                
-                
+                effective_delegate_staking_balance = delegate_staking_balance - sum(
+                    balance for balance, is_excluded in zip(balances, excluded) if is_excluded)
+
                 # calculate how rewards will be distributed
-                for address in effective_delegator_addresses:
-                    balance = delegators[address]
-        
+                for i, address in enumerate(addresses):
+                    balance = balances[i]
+
+                    if excluded[i]:
+                        continue
+
                     # Skip those that did not delegate minimum amount
-                    if balance < self.min_delegation_amt_mutez:
-                        self.logger.debug("Skipping '{}': Low delegation amount ({:.6f})".format(address, (balance / MUTEZ)))
+                    if balance < min_delegations[i]:
+                        self.logger.debug("Skipping '{}': Low delegation amount ({})".format(address, format_tez(balance)))
                         continue
         
                     ratio = self.rc.round(balance / effective_delegate_staking_balance)
-                    reward = (total_rewards * ratio)
+                    reward = total_rewards * balance // effective_delegate_staking_balance
                     
 #                    print(address, str(ratio*100) + ' %   -->   ', reward)
                     
-                    reward_item = PaymentRecord(address=address, reward=reward, ratio=ratio)
+                    reward_item = PaymentRecord(address=address, reward=reward, ratio=ratio,
+                                                fee_rate=fee_rates[i] if fee_rates else None, balance=balance)
                     
                     rewards.append(reward_item)
 
@@ -0,0 +1,179 @@
+import time
+from abc import ABC, abstractmethod
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from exception.rpc import RpcException
+from log_config import main_logger
+from util.client_utils import check_response
+from util.rpc_utils import parse_json_response, JsonArrayStream, find_json_start
+
+logger = main_logger
+
+COMM_RPC_GET = " rpc get http://{}{}"
+COMM_RPC_POST = " rpc post http://{}{} with '{}'"
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_POOL_SIZE = 10
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class RpcTransport(ABC):
+    def __init__(self, node_url):
+        super(RpcTransport, self).__init__()
+        self.node_url = node_url
+
+    # path    : rpc path starting with '/', e.g. /chains/main/blocks/head
+    # spread  : request does not depend on node's view of head (e.g. it is at a fixed block hash),
+    #           so it may be served by any node
+    # return  : decoded json response
+    @abstractmethod
+    def get(self, path, verbose=False, spread=False):
+        pass
+
+    # path    : rpc path starting with '/'
+    # key     : name of the json member holding a large array, None if response itself is an array
+    # return  : JsonArrayStream yielding array items as they are received
+    @abstractmethod
+    def stream(self, path, key=None, verbose=False, spread=False):
+        pass
+
+    # path    : rpc path starting with '/'
+    # body    : json document as string
+    # return  : decoded json response, RpcException if node reports an error
+    @abstractmethod
+    def post(self, path, body, verbose=False):
+        pass
+
+
+class ClientRpcTransport(RpcTransport):
+    """
+    Legacy transport. Every call spawns a tezos-client process and parses its output.
+    """
+
+    def __init__(self, wllt_clnt_mngr, node_url):
+        super(ClientRpcTransport, self).__init__(node_url)
+        self.wllt_clnt_mngr = wllt_clnt_mngr
+
+    def get(self, path, verbose=False, spread=False):
+        response = self.wllt_clnt_mngr.send_request(COMM_RPC_GET.format(self.node_url, path))
+        return parse_json_response(response, verbose)
+
+    def stream(self, path, key=None, verbose=False, spread=False):
+        # client output is already in memory, only decoding is incremental
+        response = self.wllt_clnt_mngr.send_request(COMM_RPC_GET.format(self.node_url, path))
+        response = response[find_json_start(response):]
+        return JsonArrayStream([response.encode('utf-8')], key)
+
+    def post(self, path, body, verbose=False):
+        response = self.wllt_clnt_mngr.send_request(COMM_RPC_POST.format(self.node_url, path, body))
+        if not check_response(response):
+            raise RpcException('POST {} failed: {}'.format(path, response))
+        return parse_json_response(response, verbose)
+
+
+class HttpRpcTransport(RpcTransport):
+    """
+    Talks to the node RPC server directly over HTTP. Connections are kept alive in a pool
+    so that consecutive reads do not pay for a new connection or a new process.
+    Requests are routed by the node pool and fail over to the next node on error.
+    """
+
+    def __init__(self, node_pool, timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES, pool_size=DEFAULT_POOL_SIZE):
+        super(HttpRpcTransport, self).__init__(node_pool.primary)
+        self.node_pool = node_pool
+        self.timeout = timeout
+
+        # with several nodes, failing over to another node is preferred to retrying the same one
+        if len(node_pool.nodes) > 1:
+            max_retries = min(max_retries, 1)
+
+        # retry only on connection problems and gateway errors, node errors are reported to caller
+        retry = Retry(total=max_retries, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                      raise_on_status=False)
+
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=len(node_pool.nodes), pool_maxsize=pool_size, max_retries=retry))
+
+    def get(self, path, verbose=False, spread=False):
+        resp = self.__request(path, verbose, spread)
+        return resp.json()
+
+    def stream(self, path, key=None, verbose=False, spread=False):
+        # only the initial request can fail over, a broken stream is reported to caller
+        resp = self.__request(path, verbose, spread, stream=True)
+        return JsonArrayStream(self.__iter_content(resp), key)
+
+    def post(self, path, body, verbose=False):
+        # body is encoded once and written to the pooled connection, it never passes through a shell
+        data = body.encode('utf-8')
+        error = None
+
+        # only connection failures fail over, an error answer of a node is final
+        for node_url in self.node_pool.candidates():
+            url = "http://{}{}".format(node_url, path)
+
+            if verbose:
+                logger.debug("Posting {} bytes to {}".format(len(data), url))
+
+            start = time.time()
+            try:
+                resp = self.session.post(url, data=data, headers={'Content-Type': 'application/json'},
+                                         timeout=self.timeout)
+            except requests.RequestException as e:
+                self.node_pool.report_failure(node_url)
+                error = RpcException('POST {} failed: {}'.format(url, e))
+                continue
+
+            self.node_pool.report_success(node_url, time.time() - start)
+
+            if resp.status_code != 200:
+                raise RpcException('POST {} {} {}'.format(url, resp.status_code, resp.text))
+
+            return resp.json()
+
+        raise error
+
+    def __request(self, path, verbose=False, spread=False, stream=False):
+        error = None
+
+        for node_url in self.node_pool.candidates(spread):
+            url = "http://{}{}".format(node_url, path)
+
+            if verbose:
+                logger.debug("Requesting {}".format(url))
+
+            start = time.time()
+            try:
+                resp = self.session.get(url, timeout=self.timeout, stream=stream)
+            except requests.RequestException as e:
+                self.node_pool.report_failure(node_url)
+                error = RpcException('GET {} failed: {}'.format(url, e))
+                continue
+
+            if resp.status_code != 200:
+                # a lagging node may not know the block yet, try others before giving up
+                if resp.status_code >= 500:
+                    self.node_pool.report_failure(node_url)
+                error = RpcException('GET {} {} {}'.format(url, resp.status_code, resp.text))
+                resp.close()
+                continue
+
+            self.node_pool.report_success(node_url, time.time() - start)
+            return resp
+
+        raise error
+
+    @staticmethod
+    def __iter_content(resp):
+        # connection is given back to the pool once the body is consumed
+        try:
+            for chunk in resp.iter_content(STREAM_CHUNK_SIZE):
+                yield chunk
+        except requests.RequestException as e:
+            raise RpcException('GET {} failed: {}'.format(resp.url, e)) from e
+        finally:
+            resp.close()
@@ -0,0 +1,38 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from rpc.rpc_head_cache import RpcHeadCache, COMM_HEAD
+
+
+class TestRpcHeadCache(TestCase):
+
+    def setUp(self):
+        self.level = 100
+        self.transport = Mock()
+        self.transport.get.side_effect = self.get_head
+        self.head_cache = RpcHeadCache(self.transport, ttl=60)
+
+    def get_head(self, path, verbose=False):
+        self.assertEqual(COMM_HEAD, path)
+        self.level += 1
+        return {"hash": "BLhead{}".format(self.level), "metadata": {"level": {"level": self.level}}}
+
+    @patch("rpc.rpc_head_cache.time.time")
+    def test_ttl(self, time):
+        time.return_value = 1000
+        self.assertEqual((101, "BLhead101"), self.head_cache.get_current_level())
+
+        # head is read once within ttl
+        time.return_value = 1059
+        self.assertEqual((101, "BLhead101"), self.head_cache.get_current_level())
+        self.assertEqual(1, self.transport.get.call_count)
+
+        time.return_value = 1060
+        self.assertEqual((102, "BLhead102"), self.head_cache.get_current_level())
+        self.assertEqual(2, self.transport.get.call_count)
+
+    def test_invalidate(self):
+        self.head_cache.get_head()
+        self.head_cache.invalidate()
+
+        self.assertEqual((102, "BLhead102"), self.head_cache.get_current_level())
@@ -0,0 +1,67 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from rpc.rpc_node_pool import RpcNodePool
+
+NODES = ["node1:8732", "node2:8732", "node3:8732"]
+
+
+class TestRpcNodePool(TestCase):
+
+    def setUp(self):
+        self.pool = RpcNodePool(NODES, probe_interval=0.01)
+        self.addCleanup(self.pool.stop)
+        # head levels answered by nodes, None for a node which does not answer
+        self.levels = {url: 100 for url in NODES}
+        self.pool.session = Mock()
+        self.pool.session.get.side_effect = self.get_header
+
+    def get_header(self, url, timeout):
+        level = self.levels[url.split("/")[2]]
+        if level is None:
+            raise ConnectionError(url)
+        return Mock(status_code=200, json=Mock(return_value={"level": level}))
+
+    def test_failover_order(self):
+        for url, latency in zip(NODES, [0.3, 0.1, 0.2]):
+            self.pool.report_success(url, latency)
+
+        # fastest node first
+        self.assertEqual(["node2:8732", "node3:8732", "node1:8732"], self.pool.candidates())
+
+        # a failed node is tried last
+        self.pool.report_failure("node2:8732")
+        self.assertEqual(["node3:8732", "node1:8732", "node2:8732"], self.pool.candidates())
+
+        # spread rotates among healthy nodes
+        self.assertEqual({"node3:8732", "node1:8732"}, {self.pool.candidates(spread=True)[0] for _ in range(2)})
+
+    def test_lagging_node_is_excluded(self):
+        self.levels.update({"node1:8732": 97, "node3:8732": None})
+
+        self.pool.probe()
+
+        self.assertEqual(["node2:8732"], [node.url for node in self.pool.nodes if node.healthy])
+        self.assertEqual("node2:8732", self.pool.candidates()[0])
+
+        # within max level lag is still healthy
+        self.levels["node1:8732"] = 98
+        self.pool.probe()
+        self.assertEqual(["node1:8732", "node2:8732"], [node.url for node in self.pool.nodes if node.healthy])
+
+    def test_recovery_after_unhealthy_mark(self):
+        self.pool.report_failure("node1:8732")
+        self.assertFalse(self.pool.nodes[0].healthy)
+
+        self.pool.probe()
+
+        self.assertTrue(self.pool.nodes[0].healthy)
+
+    def test_start_and_stop(self):
+        self.pool.start()
+        prober = self.pool.prober
+        self.pool.start()
+        self.assertIs(prober, self.pool.prober)
+
+        self.pool.stop()
+        self.assertFalse(prober.is_alive())
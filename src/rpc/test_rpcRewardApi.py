@@ -0,0 +1,197 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import Mock
+
+from exception.rpc import RpcException
+from rpc.rpc_reward_api import RpcRewardApiImpl, DELEGATORS_CACHE_SCOPE, SNAPSHOT_CACHE_SCOPE, \
+    BALANCE_STRATEGY_RAW, parse_raw_contract_balances
+from util.response_cache import ResponseCache
+from util.rpc_utils import JsonArrayStream
+
+NETWORK = {"BLOCKS_PER_CYCLE": 8, "NB_FREEZE_CYCLE": 5, "BLOCKS_PER_ROLL_SNAPSHOT": 2}
+BAKER = "tz1baker"
+
+# rewards of cycle 10 are unfrozen at level (10 + 5 + 1) * 8
+CYCLE = 10
+HEAD_LEVEL = 130
+
+DELEGATORS = [["KT1a", 100], ["KT1b", 300]]
+
+BALANCE_UPDATES = [{"kind": "freezer", "category": "rewards", "delegate": BAKER, "change": "-5000"},
+                   {"kind": "freezer", "category": "fees", "delegate": BAKER, "change": "-20"},
+                   {"kind": "freezer", "category": "rewards", "delegate": "tz1other", "change": "-7000"}]
+
+
+def tzscan_reward_data(balances):
+    return {"delegate_staking_balance": "1000", "delegators_nb": len(balances),
+            "delegators_balance": [[{"tz": address}, str(balance)] for address, balance in balances],
+            "blocks_rewards": "4000", "future_blocks_rewards": "0", "endorsements_rewards": "1000",
+            "future_endorsements_rewards": "0", "lost_rewards_denounciation": "0", "lost_fees_denounciation": "0",
+            "fees": "20"}
+
+
+class TestRpcRewardApiValidation(TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.executor.shutdown)
+
+        self.transport = Mock()
+        self.transport.stream.return_value = BALANCE_UPDATES
+        head_cache = Mock()
+        head_cache.get_current_level.return_value = HEAD_LEVEL, "BLhead"
+        # delegator balances are already persisted
+        cache = Mock()
+        cache.get.side_effect = lambda scope, key: {"delegate_staking_balance": 1000, "delegators": DELEGATORS} \
+            if scope == DELEGATORS_CACHE_SCOPE else None
+
+        self.validate_api = Mock()
+        self.reward_api = RpcRewardApiImpl(NETWORK, BAKER, self.transport, head_cache, validate_api=self.validate_api,
+                                           validate_executor=self.executor, cache=cache)
+
+    def test_reconciled(self):
+        self.validate_api.get_rewards_for_cycle_map.return_value = tzscan_reward_data(DELEGATORS)
+
+        reward_data = self.reward_api.get_rewards_for_cycle_map(CYCLE)
+
+        self.assertEqual(5020, reward_data["total_rewards"])
+        self.assertEqual(dict(DELEGATORS), reward_data["delegators"])
+        self.validate_api.get_rewards_for_cycle_map.assert_called_once_with(CYCLE)
+
+    def test_balance_mismatch(self):
+        self.validate_api.get_rewards_for_cycle_map.return_value = tzscan_reward_data([["KT1a", 100], ["KT1c", 300]])
+
+        with self.assertLogs("main", "ERROR") as logs, self.assertRaisesRegex(Exception, "balances"):
+            self.reward_api.get_rewards_for_cycle_map(CYCLE)
+
+        # every differing address is logged with both balances
+        self.assertEqual(["Balance of KT1b is 300 on local node, None on tzscan",
+                          "Balance of KT1c is None on local node, 300 on tzscan"],
+                         [record.getMessage() for record in logs.records])
+
+    def test_not_validated_before_unfrozen(self):
+        self.reward_api.get_rewards_for_cycle_map(CYCLE + 1)
+
+        self.validate_api.get_rewards_for_cycle_map.assert_not_called()
+
+
+class TestRpcRewardApiBalances(TestCase):
+
+    def setUp(self):
+        self.delegators = ["KT1{}".format(i) for i in range(20)]
+        # delegator to number of balance requests (1 based) which fail
+        self.failures = {}
+        self.requests = []
+        # contract to balance in raw context listing
+        self.raw_balances = {delegator: self.balance(delegator) for delegator in self.delegators}
+
+        self.transport = Mock()
+        self.transport.get.side_effect = self.get
+        self.transport.stream.side_effect = self.stream
+        self.head_cache = Mock()
+        self.head_cache.get_current_level.return_value = HEAD_LEVEL, "BLhead"
+
+    def get(self, path, verbose=False, spread=False):
+        self.requests.append(path)
+        if "/rolls/owner/snapshot/" in path:
+            return [0]
+        if path.endswith("/hash"):
+            return "BLsnapshot"
+
+        delegator = path.split("/")[-1]
+        if self.requests.count(path) in self.failures.get(delegator, ()):
+            raise RpcException("GET {} 502".format(path))
+        return {"balance": str(self.balance(delegator))}
+
+    def stream(self, path, key=None, verbose=False, spread=False):
+        if "/raw/json/contracts/index" in path:
+            listing = [[contract, {"balance": str(balance), "counter": "1"}]
+                       for contract, balance in self.raw_balances.items()]
+            return JsonArrayStream([json.dumps(listing).encode("utf-8")], key)
+        return JsonArrayStream([json.dumps({"staking_balance": "5000", "delegated_contracts": self.delegators})
+                               .encode("utf-8")], key)
+
+    def balance(self, delegator):
+        return 100 * (self.delegators.index(delegator) + 1)
+
+    def reward_api(self, **kwargs):
+        return RpcRewardApiImpl(NETWORK, BAKER, self.transport, self.head_cache, parallelism=4, **kwargs)
+
+    def test_failed_balances_are_retried_one_by_one(self):
+        self.failures = {"KT13": [1], "KT17": [1]}
+
+        reward_data = self.reward_api().get_rewards_for_cycle_map(CYCLE + 1)
+
+        # delegators keep their order, failed ones are read again
+        self.assertEqual([(delegator, self.balance(delegator)) for delegator in self.delegators],
+                         list(reward_data["delegators"].items()))
+        self.assertEqual(2, self.requests.count("/chains/main/blocks/BLsnapshot/context/contracts/KT13"))
+        self.assertEqual(1, self.requests.count("/chains/main/blocks/BLsnapshot/context/contracts/KT12"))
+
+    def test_balance_failing_twice_fails_the_cycle(self):
+        self.failures = {"KT13": [1, 2]}
+
+        with self.assertRaisesRegex(RpcException, "KT13"):
+            self.reward_api().get_rewards_for_cycle_map(CYCLE + 1)
+
+    def test_snapshot_is_cached(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        cache = ResponseCache(os.path.join(tmp_dir.name, "cache.db"))
+        self.addCleanup(cache.close)
+
+        self.assertTrue(self.reward_api(cache=cache).prefetch_delegators(CYCLE))
+        # snapshot 0 of cycle 10 is at level (10 - 5 - 2) * 8 + (0 + 1) * 2
+        self.assertEqual({"snapshot_index": 0, "level": 26, "block_hash": "BLsnapshot"},
+                         cache.get(SNAPSHOT_CACHE_SCOPE, str(CYCLE)))
+
+        # another run finds snapshot and balances without asking the node
+        self.transport.reset_mock()
+        self.head_cache.reset_mock()
+        self.assertTrue(self.reward_api(cache=cache).prefetch_delegators(CYCLE))
+        self.assertEqual(20, self.reward_api(cache=cache).get_nb_delegators(CYCLE))
+
+        self.transport.get.assert_not_called()
+        self.transport.stream.assert_not_called()
+        self.head_cache.get_current_level.assert_not_called()
+
+        # snapshot of a far cycle is not selected yet, nothing is kept
+        self.assertFalse(self.reward_api(cache=cache).prefetch_delegators(CYCLE + 20))
+        self.assertIsNone(cache.get(SNAPSHOT_CACHE_SCOPE, str(CYCLE + 20)))
+
+    def test_raw_balances(self):
+        # a delegator missing in raw context is read by contract rpc
+        del self.raw_balances["KT15"]
+
+        reward_data = self.reward_api(balance_strategy=BALANCE_STRATEGY_RAW).get_rewards_for_cycle_map(CYCLE + 1)
+
+        self.assertEqual([(delegator, self.balance(delegator)) for delegator in self.delegators],
+                         list(reward_data["delegators"].items()))
+        # missing delegator and a sample of the others are read by contract rpc
+        self.assertEqual(11, len([path for path in self.requests if "/context/contracts/" in path]))
+        self.assertIn("/chains/main/blocks/BLsnapshot/context/contracts/KT15", self.requests)
+
+    def test_raw_balances_disagree_with_contract_rpc(self):
+        self.raw_balances = {delegator: balance + 1 for delegator, balance in self.raw_balances.items()}
+
+        with self.assertRaisesRegex(RpcException, "raw context"):
+            self.reward_api(balance_strategy=BALANCE_STRATEGY_RAW).get_rewards_for_cycle_map(CYCLE + 1)
+
+
+class TestParseRawContractBalances(TestCase):
+
+    def test_list(self):
+        listing = [["KT1a", {"balance": "100", "manager": "tz1a"}], ["KT1b", {"balance": "200"}],
+                   ["KT1c", {"balance": "300"}], ["KT1d", {"counter": "1"}]]
+        contracts = JsonArrayStream([json.dumps(listing).encode("utf-8")])
+
+        self.assertEqual({"KT1a": 100, "KT1c": 300}, parse_raw_contract_balances(contracts, {"KT1a", "KT1c", "KT1d"}))
+
+    def test_dict(self):
+        listing = {"KT1a": {"balance": "100"}, "KT1b": {"balance": "200"}, "KT1d": {"counter": "1"}}
+        contracts = JsonArrayStream([json.dumps(listing).encode("utf-8")])
+
+        self.assertEqual({"KT1b": 200}, parse_raw_contract_balances(contracts, {"KT1b", "KT1d", "KT1e"}))
@@ -0,0 +1,80 @@
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from unittest import TestCase
+
+from exception.rpc import RpcException
+from rpc.rpc_node_pool import RpcNodePool
+from rpc.rpc_transport import HttpRpcTransport
+
+# path to (status, body) answered by the local node
+RESPONSES = {
+    "/chains/main/blocks/head/header": (200, b'{"level": 42, "hash": "BLockGenesis"}'),
+    "/chains/main/blocks/head/context/delegates/tz1unknown": (404, b'not found'),
+    "/chains/main/blocks/head/context/busy": (503, b'busy'),
+    "/injection/operation": (200, b'"opHash"'),
+    "/chains/main/blocks/head/helpers/preapply/operations": (500, b'[{"kind":"temporary","id":"failure"}]'),
+}
+
+
+class NodeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.answer()
+
+    def do_POST(self):
+        self.server.bodies.append(self.rfile.read(int(self.headers["Content-Length"])))
+        self.answer()
+
+    def answer(self):
+        self.server.requests.append(self.path)
+        status, body = RESPONSES[self.path]
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpRpcTransport(TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), NodeHandler)
+        self.server.requests = []
+        self.server.bodies = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.transport = HttpRpcTransport(RpcNodePool(["127.0.0.1:{}".format(self.server.server_port)]),
+                                          timeout=5, max_retries=1)
+
+    def test_get(self):
+        self.assertEqual({"level": 42, "hash": "BLockGenesis"}, self.transport.get("/chains/main/blocks/head/header"))
+
+    def test_get_error(self):
+        with self.assertRaisesRegex(RpcException, "404"):
+            self.transport.get("/chains/main/blocks/head/context/delegates/tz1unknown")
+
+        # gateway errors are retried before they are reported
+        with self.assertRaisesRegex(RpcException, "503"):
+            self.transport.get("/chains/main/blocks/head/context/busy")
+        self.assertEqual(2, self.server.requests.count("/chains/main/blocks/head/context/busy"))
+
+    def test_post(self):
+        self.assertEqual("opHash", self.transport.post("/injection/operation", '"abcd"'))
+        self.assertEqual([b'"abcd"'], self.server.bodies)
+
+        # node errors are not retried
+        with self.assertRaisesRegex(RpcException, "500"):
+            self.transport.post("/chains/main/blocks/head/helpers/preapply/operations", "[]")
+        self.assertEqual(1, self.server.requests.count("/chains/main/blocks/head/helpers/preapply/operations"))
+
+    def test_retry_configuration(self):
+        retry = self.transport.session.get_adapter("http://127.0.0.1").max_retries
+        self.assertEqual(1, retry.total)
+        self.assertEqual({502, 503, 504}, set(retry.status_forcelist))
+
+        # with several nodes, a failing node is not retried, next node is tried instead
+        transport = HttpRpcTransport(RpcNodePool(["127.0.0.1:1", "127.0.0.1:2"]))
+        self.assertEqual(1, transport.session.get_adapter("http://127.0.0.1").max_retries.total)
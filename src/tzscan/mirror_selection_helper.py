@@ -1,8 +1,13 @@
 import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 
+from exception.http import CircuitOpenException
 from log_config import main_logger
+from util.http_session import SessionManager
 
 nb_delegators_api = {'MAINNET': {'API_URL': 'http://api%MIRROR%.tzscan.io/v3/head'},
                      'ALPHANET': {'API_URL': 'http://api.alphanet.tzscan.io/v3/head'},
@@ -11,45 +16,156 @@ nb_delegators_api = {'MAINNET': {'API_URL': 'http://api%MIRROR%.tzscan.io/v3/hea
 
 logger = main_logger
 
+NB_MIRRORS = 7
+PROBE_TIMEOUT = 5
+DEFAULT_PROBE_INTERVAL = 60
+# wait between validation rounds while no mirror is live, doubled up to the maximum
+INITIAL_BACKOFF = 1
+MAX_BACKOFF = 60
+# weight of the newest sample in the moving averages
+SMOOTHING = 0.3
+# a mirror whose error score exceeds this is not used until next probe finds it live
+MAX_ERROR_SCORE = 0.5
+# how much errors degrade a mirror in comparison to latency
+ERROR_PENALTY = 10
+
+
+class TzScanMirror:
+    def __init__(self, index) -> None:
+        super().__init__()
+        self.index = index
+        self.latency = None
+        self.error_score = 0.0
+        self.live = False
+
+    def record_success(self, latency):
+        self.latency = latency if self.latency is None else SMOOTHING * latency + (1 - SMOOTHING) * self.latency
+        self.error_score = (1 - SMOOTHING) * self.error_score
+
+    def record_failure(self):
+        self.error_score = SMOOTHING + (1 - SMOOTHING) * self.error_score
+
+    def score(self):
+        """
+        :return: expected cost of a request, lower is better
+        """
+        latency = self.latency if self.latency is not None else PROBE_TIMEOUT
+        return latency * (1 + ERROR_PENALTY * self.error_score)
+
+    def __repr__(self) -> str:
+        return "{}(live={}, latency={}, errors={:.2f})".format(self.index, self.live, "{:.3f}".format(
+            self.latency) if self.latency is not None else None, self.error_score)
+
 
 class TzScanMirrorSelector:
-    def __init__(self, nw) -> None:
+    """
+    Keeps latency and error scores of tzscan mirrors. Requests are routed to mirrors with a probability
+    inversely proportional to their score. Mirrors are probed in background, failures reported by
+    apis only degrade the mirror's score so that callers never wait for a revalidation.
+    """
+
+    def __init__(self, nw, session_manager=None, probe_interval=DEFAULT_PROBE_INTERVAL) -> None:
         super().__init__()
         self.nw_name = nw['NAME']
+        self.session_manager = session_manager if session_manager else SessionManager()
+        self.probe_interval = probe_interval
+        self.all_mirrors = [TzScanMirror(index) for index in range(NB_MIRRORS)]
         self.mirrors = []
+        self.lock = threading.Lock()
+        self.prober = None
 
     def initialize(self):
         self.validate_mirrors_endless()
 
-    def get_mirror(self):
-        mirror_idx = random.randrange(0, len(self.mirrors))
+        if not self.prober:
+            self.prober = threading.Thread(target=self.probe_endless, name='mirror_prober', daemon=True)
+            self.prober.start()
 
-        return self.mirrors[mirror_idx]
+    def get_mirror(self):
+        with self.lock:
+            live = [mirror for mirror in self.all_mirrors if mirror.live]
+            if not live:
+                # nothing is known to work, try the least bad one
+                return min(self.all_mirrors, key=TzScanMirror.score).index
+
+            weights = [1 / max(mirror.score(), 1e-3) for mirror in live]
+
+        return random.choices(live, weights=weights)[0].index
+
+    def get_mirrors(self):
+        """
+        :return: live mirrors, best first
+        """
+        with self.lock:
+            live = sorted([mirror for mirror in self.all_mirrors if mirror.live], key=TzScanMirror.score)
+            if not live:
+                live = [min(self.all_mirrors, key=TzScanMirror.score)]
+
+        return [mirror.index for mirror in live]
+
+    def report_success(self, index, latency):
+        with self.lock:
+            self.all_mirrors[index].record_success(latency)
+
+    def report_failure(self, index):
+        with self.lock:
+            mirror = self.all_mirrors[index]
+            mirror.record_failure()
+            if mirror.live and mirror.error_score > MAX_ERROR_SCORE:
+                logger.warning("tzscan mirror {} is not used until it recovers".format(index))
+                mirror.live = False
+                self.mirrors = [m.index for m in self.all_mirrors if m.live]
 
     def validate_mirrors(self):
-        tmp_mirrors = []
-        for mirror in range(7):
-            if self.validate_mirror(mirror):
-                tmp_mirrors.append(mirror)
+        with ThreadPoolExecutor(max_workers=NB_MIRRORS) as executor:
+            results = list(executor.map(self.validate_mirror, range(NB_MIRRORS)))
 
-        if not tmp_mirrors:
-            logger.error("Unable to find a live tzscan mirror. Consider using RPC api.")
+        with self.lock:
+            for mirror, latency in zip(self.all_mirrors, results):
+                mirror.live = latency is not None
+                if mirror.live:
+                    mirror.record_success(latency)
+                else:
+                    mirror.record_failure()
 
-        self.mirrors = tmp_mirrors
+            self.mirrors = [mirror.index for mirror in self.all_mirrors if mirror.live]
+
+        if not self.mirrors:
+            logger.error("Unable to find a live tzscan mirror. Consider using RPC api.")
 
-        logger.debug("Available mirrors are: {}".format(self.mirrors))
+        logger.debug("Available mirrors are: {}".format(self.all_mirrors))
 
     def validate_mirrors_endless(self):
+        backoff = INITIAL_BACKOFF
 
         while True:
             self.validate_mirrors()
             if self.mirrors:
                 break
 
+            time.sleep(backoff)
+            backoff = min(2 * backoff, MAX_BACKOFF)
+
+    def probe_endless(self):
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                self.validate_mirrors()
+            except Exception:
+                logger.warning("Error while probing tzscan mirrors", exc_info=True)
+
     def validate_mirror(self, mirror):
+        """
+        :return: response time of mirror, None if it is not live
+        """
         uri = nb_delegators_api[self.nw_name]['API_URL']
         uri = uri.replace("%MIRROR%", str(mirror))
 
-        resp = requests.get(uri)
+        start = time.time()
+        try:
+            resp = self.session_manager.get(uri, timeout=PROBE_TIMEOUT)
+        except (CircuitOpenException, requests.exceptions.RequestException) as e:
+            logger.debug("Mirror {} is not reachable: {}".format(mirror, e))
+            return None
 
-        return resp.status_code == 200
+        return time.time() - start if resp.status_code == 200 else None
@@ -0,0 +1,76 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+import requests
+
+from tzscan.mirror_selection_helper import TzScanMirror, TzScanMirrorSelector, NB_MIRRORS, PROBE_TIMEOUT, \
+    ERROR_PENALTY
+
+
+class TestTzScanMirror(TestCase):
+
+    def test_score(self):
+        mirror = TzScanMirror(1)
+        self.assertEqual(PROBE_TIMEOUT, mirror.score())
+
+        mirror.record_success(0.1)
+        mirror.record_success(0.2)
+        self.assertAlmostEqual(0.13, mirror.score())
+
+        # errors weigh more than latency
+        mirror.record_failure()
+        self.assertAlmostEqual(0.13 * (1 + ERROR_PENALTY * 0.3), mirror.score())
+
+
+class TestTzScanMirrorSelector(TestCase):
+
+    def setUp(self):
+        # live mirror to its latency
+        self.latencies = {1: 0.3, 2: 0.1, 3: 0.2}
+
+        self.session_manager = Mock()
+        self.session_manager.get.side_effect = self.get
+        self.selector = TzScanMirrorSelector({"NAME": "MAINNET"}, self.session_manager)
+
+    def get(self, uri, timeout=None):
+        if int(uri.split(".")[0][len("http://api"):]) not in self.latencies:
+            raise requests.exceptions.ConnectionError(uri)
+        return Mock(status_code=200)
+
+    def validate_mirrors(self):
+        self.selector.validate_mirrors()
+        for mirror, latency in self.latencies.items():
+            self.selector.all_mirrors[mirror].latency = latency
+
+    def test_validate_mirrors(self):
+        self.validate_mirrors()
+
+        self.assertEqual([1, 2, 3], self.selector.mirrors)
+        # best first
+        self.assertEqual([2, 3, 1], self.selector.get_mirrors())
+        self.assertIn(self.selector.get_mirror(), [1, 2, 3])
+
+    def test_failing_mirror_is_excluded(self):
+        self.validate_mirrors()
+
+        # a failure degrades the fastest mirror below the others
+        self.selector.report_failure(2)
+        self.assertEqual([3, 1, 2], self.selector.get_mirrors())
+
+        self.selector.report_failure(2)
+        self.assertEqual([3, 1], self.selector.get_mirrors())
+        self.assertEqual([1, 3], self.selector.mirrors)
+        self.assertNotIn(2, {self.selector.get_mirror() for _ in range(50)})
+
+        # next probe finds it live again
+        self.validate_mirrors()
+        self.assertEqual([1, 2, 3], self.selector.mirrors)
+
+    def test_no_live_mirror(self):
+        self.latencies = {}
+        self.validate_mirrors()
+
+        # least bad mirror is tried
+        self.assertEqual([], self.selector.mirrors)
+        self.assertEqual(1, len(self.selector.get_mirrors()))
+        self.assertIn(self.selector.get_mirror(), range(NB_MIRRORS))
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import Mock
+
+from exception.tzscan import TzScanException
+from tzscan.tzscan_reward_api import TzScanRewardApiImpl, MAX_PER_PAGE, PAGE_RETRIES
+from util.response_cache import ResponseCache
+
+NETWORK = {"NAME": "MAINNET", "BLOCKS_PER_CYCLE": 8, "NB_FREEZE_CYCLE": 5}
+BAKER = "tz1baker"
+
+# rewards of cycle 10 are unfrozen at level (10 + 5 + 1) * 8
+CYCLE = 10
+UNFROZEN_LEVEL = 128
+
+
+def response(status_code, body=None, headers=None):
+    return Mock(status_code=status_code, json=Mock(return_value=body), headers=headers or {})
+
+
+class TestTzScanRewardApiCache(TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache = ResponseCache(os.path.join(tmp_dir.name, "cache.db"))
+        self.addCleanup(self.cache.close)
+
+        self.session = Mock()
+        self.block_api = Mock()
+        self.block_api.get_current_level.return_value = UNFROZEN_LEVEL - 1
+
+    def reward_api(self, block_api=None):
+        return TzScanRewardApiImpl(NETWORK, BAKER, Mock(get_mirror=Mock(return_value=1)),
+                                   session_manager=self.session, cache=self.cache, block_api=block_api)
+
+    def sent_headers(self):
+        return [kwargs["headers"] for _, kwargs in self.session.get.call_args_list]
+
+    def test_etag(self):
+        self.session.get.side_effect = [response(200, [3], {"ETag": '"v1"'}), response(304)]
+
+        self.assertEqual([3], self.reward_api().get_nb_delegators(CYCLE))
+        self.assertEqual([3], self.reward_api().get_nb_delegators(CYCLE))
+
+        self.assertEqual([{}, {"If-None-Match": '"v1"'}], self.sent_headers())
+
+    def test_last_modified(self):
+        last_modified = "Wed, 21 Oct 2018 07:28:00 GMT"
+        self.session.get.side_effect = [response(200, [3], {"Last-Modified": last_modified}), response(304)]
+
+        self.assertEqual([3], self.reward_api().get_nb_delegators(CYCLE))
+        self.assertEqual([3], self.reward_api().get_nb_delegators(CYCLE))
+
+        self.assertEqual([{}, {"If-Modified-Since": last_modified}], self.sent_headers())
+
+    def test_no_validator(self):
+        self.session.get.side_effect = [response(200, [3]), response(200, [4])]
+
+        self.assertEqual([3], self.reward_api().get_nb_delegators(CYCLE))
+        self.assertEqual([4], self.reward_api().get_nb_delegators(CYCLE))
+
+        # nothing to revalidate with, nothing is kept
+        self.assertEqual([{}, {}], self.sent_headers())
+        self.assertEqual(0, self.cache.stats()["entries"])
+
+    def test_immutable_finalized(self):
+        self.session.get.side_effect = [response(200, [3]), response(200, [4])]
+
+        # a response received before rewards are unfrozen may change
+        self.assertEqual([3], self.reward_api(self.block_api).get_nb_delegators(CYCLE))
+
+        self.block_api.get_current_level.return_value = UNFROZEN_LEVEL
+        self.assertEqual([4], self.reward_api(self.block_api).get_nb_delegators(CYCLE))
+        self.assertEqual([4], self.reward_api(self.block_api).get_nb_delegators(CYCLE))
+
+        self.assertEqual(2, self.session.get.call_count)
+
+
+class TestTzScanRewardApiPages(TestCase):
+
+    def setUp(self):
+        self.delegators = ["KT1{}".format(i) for i in range(2 * MAX_PER_PAGE + 20)]
+        # page to numbers of requests (1 based) which fail
+        self.failures = {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+        self.session = Mock()
+        self.session.get.side_effect = self.get
+        self.session.metrics.return_value = {"requests": 0, "rejected": 0, "network_time": 0, "throttled_time": 0}
+        self.mirror_selector = Mock()
+        self.mirror_selector.get_mirrors.return_value = [1, 2]
+        self.mirror_selector.get_mirror.return_value = 3
+        self.reward_api = TzScanRewardApiImpl(NETWORK, BAKER, self.mirror_selector, session_manager=self.session)
+
+    def get(self, uri, headers=None):
+        if "/nb_delegators/" in uri:
+            return response(200, [len(self.delegators)])
+
+        p = int(uri.split("&p=")[1].split("&")[0])
+        with self.lock:
+            self.requests.append((p, uri.split(".")[0]))
+            nb_requests = len([request for request in self.requests if request[0] == p])
+        if nb_requests in self.failures.get(p, ()):
+            return response(502)
+
+        page = self.delegators[p * MAX_PER_PAGE:(p + 1) * MAX_PER_PAGE]
+        return response(200, {"delegate_staking_balance": "1000", "delegators_nb": len(self.delegators),
+                              "delegators_balance": [[{"tz": address}, "10"] for address in page]})
+
+    def addresses(self, root):
+        return [delegator[0]["tz"] for delegator in root["delegators_balance"]]
+
+    def test_pages_are_joined_in_order(self):
+        root = self.reward_api.get_rewards_for_cycle_map(CYCLE)
+
+        self.assertEqual(self.delegators, self.addresses(root))
+        # pages are spread over live mirrors
+        self.assertEqual([(0, "http://api1"), (1, "http://api2"), (2, "http://api1")], sorted(self.requests))
+
+    def test_failed_page_is_retried(self):
+        self.failures = {1: [1, 2]}
+
+        root = self.reward_api.get_rewards_for_cycle_map(CYCLE)
+
+        self.assertEqual(self.delegators, self.addresses(root))
+        # retries go to the mirror picked by updated scores
+        self.assertEqual([(1, "http://api2"), (1, "http://api3"), (1, "http://api3")],
+                         [request for request in self.requests if request[0] == 1])
+        self.mirror_selector.report_failure.assert_any_call(2)
+
+    def test_page_failing_every_retry(self):
+        self.failures = {2: range(1, PAGE_RETRIES + 2)}
+
+        with self.assertRaisesRegex(TzScanException, "Page 2"):
+            self.reward_api.get_rewards_for_cycle_map(CYCLE)
+
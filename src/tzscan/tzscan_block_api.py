@@ -1,8 +1,12 @@
+import time
+
 import requests
 
 from api.block_api import BlockApi
+from exception.http import CircuitOpenException
 from exception.tzscan import TzScanException
 from log_config import main_logger
+from util.http_session import SessionManager
 
 logger = main_logger
 
@@ -19,7 +23,7 @@ REVELATION_API = {'MAINNET': {'HEAD_API_URL': 'https://api%MIRROR%.tzscan.io/v1/
 
 class TzScanBlockApiImpl(BlockApi):
 
-    def __init__(self, nw, mirror_selector):
+    def __init__(self, nw, mirror_selector, session_manager=None):
         super(TzScanBlockApiImpl, self).__init__(nw)
 
         self.head_api = HEAD_API[nw['NAME']]
@@ -28,41 +32,45 @@ class TzScanBlockApiImpl(BlockApi):
 
         self.revelation_api = REVELATION_API[nw['NAME']]
         self.mirror_selector = mirror_selector
+        self.session_manager = session_manager if session_manager else SessionManager()
 
     def get_current_level(self, verbose=False):
-        uri = self.head_api['HEAD_API_URL'].replace("%MIRROR%", str(self.mirror_selector.get_mirror()))
-
-        if verbose:
-            logger.debug("Requesting {}".format(uri))
-
-        resp = requests.get(uri, timeout=5)
-        if resp.status_code != 200:
-            # This means something went wrong.
-            self.mirror_selector.validate_mirrors()
-            raise TzScanException('GET {} {}'.format(uri, resp.status_code))
-        root = resp.json()
+        mirror = self.mirror_selector.get_mirror()
+        uri = self.head_api['HEAD_API_URL'].replace("%MIRROR%", str(mirror))
 
-        if verbose:
-            logger.debug("Response from tzscan is: {}".format(root))
+        root = self.__get(uri, mirror, verbose)
 
         current_level = int(root["level"])
 
         return current_level
 
     def get_revelation(self, pkh, verbose=False):
-        uri = self.revelation_api['HEAD_API_URL'].replace("%MIRROR%", str(self.mirror_selector.get_mirror())).replace("%PKH%", pkh)
+        mirror = self.mirror_selector.get_mirror()
+        uri = self.revelation_api['HEAD_API_URL'].replace("%MIRROR%", str(mirror)).replace("%PKH%", pkh)
+
+        root = self.__get(uri, mirror, verbose)
 
+        return len(root) > 0
+
+    def __get(self, uri, mirror, verbose=False):
         if verbose:
             logger.debug("Requesting {}".format(uri))
 
-        resp = requests.get(uri, timeout= 5)
+        start = time.time()
+        try:
+            resp = self.session_manager.get(uri)
+        except (CircuitOpenException, requests.exceptions.RequestException):
+            self.mirror_selector.report_failure(mirror)
+            raise
+
         if resp.status_code != 200:
             # This means something went wrong.
-            self.mirror_selector.validate_mirrors()
+            self.mirror_selector.report_failure(mirror)
             raise TzScanException('GET {} {}'.format(uri, resp.status_code))
+        self.mirror_selector.report_success(mirror, time.time() - start)
         root = resp.json()
 
         if verbose:
             logger.debug("Response from tzscan is: {}".format(root))
 
-        return len(root) > 0
+        return root
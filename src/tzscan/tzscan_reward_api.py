@@ -1,11 +1,24 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 import NetworkConfiguration
 from api.reward_api import RewardApi
+from exception.http import CircuitOpenException
 from exception.tzscan import TzScanException
 
 from log_config import main_logger
+from util.http_session import SessionManager
 
 MAX_PER_PAGE = 50
+# number of pages fetched concurrently
+DEFAULT_PARALLELISM = 4
+# attempts for a page that failed in the concurrent fetch
+PAGE_RETRIES = 3
+# cache scope of (network, baker, cycle) -> tzscan responses
+CACHE_SCOPE = "tzscan/{}/{}/{}"
+# cache key of a response received after rewards of its cycle are unfrozen
+FINALIZED_KEY = "finalized/{}"
 
 logger = main_logger
 
@@ -18,77 +31,192 @@ API = {'MAINNET': {'API_URL': 'http://api%MIRROR%.tzscan.io/v1/'},
        }
 
 
+def conditional_headers(validator):
+    """
+    :param validator: ETag or Last-Modified header of a cached response. Entity tags are always quoted,
+    dates never are
+    :return: headers of a request which is answered with 304 if cached response is still valid
+    """
+    if validator.startswith('"') or validator.startswith('W/"'):
+        return {'If-None-Match': validator}
+    return {'If-Modified-Since': validator}
+
+
 class TzScanRewardApiImpl(RewardApi):
 
-    def __init__(self, nw, baking_address, mirror_selector):
+    def __init__(self, nw, baking_address, mirror_selector, parallelism=DEFAULT_PARALLELISM, session_manager=None,
+                 cache=None, block_api=None):
+        """
+        :param cache: ResponseCache to keep responses in. Cached responses are revalidated with their ETag or
+        Last-Modified header, responses without either are not kept.
+        :param block_api: if given, responses received after rewards of their cycle are unfrozen are kept and
+        served from cache without revalidation
+        """
         super(TzScanRewardApiImpl, self).__init__()
 
         self.api = API[nw['NAME']]
         if self.api is None:
             raise Exception("Unknown network {}".format(nw))
 
+        self.nw_name = nw['NAME']
+        self.blocks_per_cycle = nw['BLOCKS_PER_CYCLE']
+        self.preserved_cycles = nw['NB_FREEZE_CYCLE']
         self.baking_address = baking_address
         self.mirror_selector = mirror_selector
+        self.parallelism = parallelism
+        self.session_manager = session_manager if session_manager else SessionManager()
+        self.cache = cache
+        self.block_api = block_api
+        self.finalized_cycles = set()
 
     def get_nb_delegators(self, cycle, verbose=False):
-        uri = self.api['API_URL'].replace("%MIRROR%", str(self.mirror_selector.get_mirror())) + nb_delegators_call.format(
+        mirror = self.mirror_selector.get_mirror()
+        uri = self.api['API_URL'].replace("%MIRROR%", str(mirror)) + nb_delegators_call.format(
             self.baking_address, cycle)
 
-        if verbose:
-            logger.debug("Requesting {}".format(uri))
-
-        resp = requests.get(uri, timeout=5)
-        if resp.status_code != 200:
-            # This means something went wrong.
-            self.mirror_selector.validate_mirrors()
-            raise TzScanException('GET {} {}'.format(uri, resp.status_code))
-        root = resp.json()
-
-        if verbose:
-            logger.debug("Response from tzscan is {}".format(root))
-
-        return root
+        return self.__get(uri, mirror, verbose, cycle, "nb_delegators")
 
     def get_rewards_for_cycle_map(self, cycle, verbose=False):
         #############
         nb_delegators = self.get_nb_delegators(cycle, verbose)[0]
-        nb_delegators_remaining = nb_delegators
+        nb_pages = (nb_delegators + MAX_PER_PAGE - 1) // MAX_PER_PAGE
 
-        p = 0
         root = {"delegate_staking_balance": 0, "delegators_nb": 0, "delegators_balance": [], "blocks_rewards": 0,
                 "endorsements_rewards": 0, "fees": 0, "future_blocks_rewards": 0, "future_endorsements_rewards": 0,
                 "gain_from_denounciation": 0, "lost_deposit_from_denounciation": 0, "lost_rewards_denounciation": 0,
                 "lost_fees_denounciation": 0}
 
-        while nb_delegators_remaining > 0:
-            uri = self.api['API_URL'].replace("%MIRROR%", str(self.mirror_selector.get_mirror())) + rewards_split_call. \
-                format(self.baking_address, cycle, p, MAX_PER_PAGE)
+        if nb_pages == 0:
+            return root
 
-            if verbose:
-                logger.debug("Requesting {}".format(uri))
+        pages = self.__get_pages(cycle, nb_pages, verbose)
 
-            resp = requests.get(uri, timeout=5)
+        # keep first result as basis; append 'delegators_balance' from other responses
+        root = pages[0]
+        for page in pages[1:]:
+            root["delegators_balance"].extend(page["delegators_balance"])
 
-            if verbose:
-                logger.debug("Response from tzscan is {}".format(resp))
+        # delegators may have been added since nb_delegators was read
+        p = nb_pages
+        while len(root["delegators_balance"]) < nb_delegators and len(pages[-1]["delegators_balance"]) > 0:
+            pages.append(self.__get_page_retry(cycle, p, verbose))
+            root["delegators_balance"].extend(pages[-1]["delegators_balance"])
+            p = p + 1
 
-            if resp.status_code != 200:
-                # This means something went wrong.
-                self.mirror_selector.validate_mirrors()
-                raise TzScanException('GET {} {}'.format(uri, resp.status_code))
+        metrics = self.session_manager.metrics()
+        logger.info("tzscan requests so far: {}, rejected by open circuits: {}, network time: {:.1f}s, "
+                    "throttled time: {:.1f}s".format(metrics["requests"], metrics["rejected"],
+                                                     metrics["network_time"], metrics["throttled_time"]))
 
-            if p == 0:  # keep first result as basis; append 'delegators_balance' from other responses
-                root = resp.json()
-            else:  # only take 'delegators_balance' list and append to 'delegators_balance' list in root
-                root["delegators_balance"].extend(resp.json()["delegators_balance"])
+        return root
 
-            nb_delegators_listed = len(resp.json()["delegators_balance"])
+    def __get_pages(self, cycle, nb_pages, verbose=False):
+        """
+        Fetches pages concurrently, spread over live mirrors. Failed pages are retried one by one
+        on mirrors picked by their updated scores.
+        :return: list of page responses in page order
+        """
+        mirrors = self.mirror_selector.get_mirrors()
+
+        with ThreadPoolExecutor(max_workers=min(self.parallelism, nb_pages)) as executor:
+            futures = [executor.submit(self.__get_page, cycle, p, mirrors[p % len(mirrors)], verbose)
+                       for p in range(nb_pages)]
+
+        pages = []
+        failed = []
+        for p, future in enumerate(futures):
+            try:
+                pages.append(future.result())
+            except (TzScanException, CircuitOpenException, requests.exceptions.RequestException) as e:
+                logger.debug("Page {} of cycle {} failed: {}".format(p, cycle, e))
+                pages.append(None)
+                failed.append(p)
+
+        for p in failed:
+            pages[p] = self.__get_page_retry(cycle, p, verbose)
+
+        return pages
+
+    def __get_page_retry(self, cycle, p, verbose=False):
+        for attempt in range(PAGE_RETRIES):
+            try:
+                return self.__get_page(cycle, p, self.mirror_selector.get_mirror(), verbose)
+            except (TzScanException, CircuitOpenException, requests.exceptions.RequestException) as e:
+                if attempt == PAGE_RETRIES - 1:
+                    raise TzScanException("Page {} of cycle {} failed: {}".format(p, cycle, e))
+
+    def __get_page(self, cycle, p, mirror, verbose=False):
+        uri = self.api['API_URL'].replace("%MIRROR%", str(mirror)) + rewards_split_call. \
+            format(self.baking_address, cycle, p, MAX_PER_PAGE)
+
+        return self.__get(uri, mirror, verbose, cycle, "rewards_split/{}/{}".format(p, MAX_PER_PAGE))
+
+    def __get(self, uri, mirror, verbose=False, cycle=None, cache_key=None):
+        scope = CACHE_SCOPE.format(self.nw_name, self.baking_address, cycle)
+        use_cache = self.cache is not None and cache_key is not None
+        finalized = use_cache and self.__is_finalized(cycle)
+
+        # only responses received after the cycle is finalized are served without asking tzscan
+        if finalized:
+            root = self.cache.get(scope, FINALIZED_KEY.format(cache_key))
+            if root is not None:
+                if verbose:
+                    logger.debug("Using cached response of {}".format(uri))
+                return root
+
+        entry = self.cache.get_entry(scope, cache_key) if use_cache else None
+        headers = conditional_headers(entry[1]) if entry and entry[1] else {}
 
-            nb_delegators_remaining = nb_delegators_remaining - nb_delegators_listed
-            p = p + 1
+        if verbose:
+            logger.debug("Requesting {}".format(uri))
+
+        start = time.time()
+        try:
+            resp = self.session_manager.get(uri, headers=headers)
+        except (CircuitOpenException, requests.exceptions.RequestException):
+            self.mirror_selector.report_failure(mirror)
+            raise
+
+        if resp.status_code == 304 and entry:
+            self.mirror_selector.report_success(mirror, time.time() - start)
+            if verbose:
+                logger.debug("Cached response of {} is still valid".format(uri))
+            root = entry[0]
+        elif resp.status_code != 200:
+            # This means something went wrong.
+            self.mirror_selector.report_failure(mirror)
+            raise TzScanException('GET {} {}'.format(uri, resp.status_code))
+        else:
+            self.mirror_selector.report_success(mirror, time.time() - start)
+            root = resp.json()
+
+            if verbose:
+                logger.debug("Response from tzscan is {}".format(root))
+
+            # a response without validator can not be revalidated, so it is not worth keeping
+            validator = resp.headers.get('ETag') or resp.headers.get('Last-Modified')
+            if use_cache and validator:
+                self.cache.put(scope, cache_key, root, validator)
+
+        if finalized:
+            self.cache.put(scope, FINALIZED_KEY.format(cache_key), root)
 
         return root
 
+    def __is_finalized(self, cycle):
+        """
+        :return: True if rewards of the cycle are unfrozen, so that its data can not change anymore
+        """
+        if self.block_api is None:
+            return False
+
+        if cycle not in self.finalized_cycles:
+            current_level = self.block_api.get_current_level()
+            if current_level >= (cycle + self.preserved_cycles + 1) * self.blocks_per_cycle:
+                self.finalized_cycles.add(cycle)
+
+        return cycle in self.finalized_cycles
+
 
 if __name__ == '__main__':
     api = TzScanRewardApiImpl(NetworkConfiguration.network_config_map['ZERONET'],
@@ -1,18 +1,25 @@
 from api.reward_calculator_api import RewardCalculatorApi
+from calc.columnar_engine import calculate_rewards
+from calc.service_fee_calculator import ServiceFeeCalculator
 from log_config import main_logger
 from model.payment_log import PaymentRecord
+from util.num_utils import to_mutez, format_tez
 from util.rounding_command import RoundingCommand
 
-MUTEZ = 1000000
 
 
 class TzScanRewardCalculatorApi(RewardCalculatorApi):
     # reward_data : payment map returned from tzscan
-    def __init__(self, founders_map, min_delegation_amt, excluded_set, rc=RoundingCommand(None)):
+    def __init__(self, founders_map, min_delegation_amt, excluded_set, rc=RoundingCommand(None), columnar=False,
+                 fee_calc=None):
         super(TzScanRewardCalculatorApi, self).__init__(founders_map, excluded_set)
-        self.min_delegation_amt_mutez = min_delegation_amt * MUTEZ
+        self.min_delegation_amt_mutez = to_mutez(min_delegation_amt)
         self.logger = main_logger
         self.rc = rc
+        self.columnar = columnar
+        # if a fee calculator is given, fee rates are resolved together with exclusions and set on rewards
+        self.fee_calc = fee_calc
+        self.policy = fee_calc if fee_calc else ServiceFeeCalculator(set(), {}, 0, excluded_set, min_delegation_amt)
 
     ##
     # return rewards    : tuple (list of PaymentRecord objects, total rewards)
@@ -29,38 +36,43 @@ class TzScanRewardCalculatorApi(RewardCalculatorApi):
         fees = int(root["fees"])
 
         self.total_rewards = (blocks_rewards + endorsements_rewards + future_blocks_rewards +
-                              future_endorsements_rewards + fees - lost_rewards_denounciation - lost_fees_denounciation) / MUTEZ
+                              future_endorsements_rewards + fees - lost_rewards_denounciation - lost_fees_denounciation)
 
         delegators_balance = root["delegators_balance"]
 
-        effective_delegate_staking_balance = delegate_staking_balance
-        effective_delegators_balance = []
+        addresses = [dbalance[0]["tz"] for dbalance in delegators_balance]
+        balances = [int(dbalance[1]) for dbalance in delegators_balance]
+        fee_rates, excluded, min_delegations = self.policy.apply(addresses, balances)
+        if not self.fee_calc:
+            fee_rates = None
 
-        # excluded addresses are processed
-        for dbalance in delegators_balance:
-            address = dbalance[0]["tz"]
-            balance = int(dbalance[1])
+        if self.columnar:
+            rewards = calculate_rewards(addresses, balances, delegate_staking_balance, self.total_rewards, excluded,
+                                        min_delegations, self.rc, fee_rates)
+            return rewards, self.total_rewards
 
-            if address in self.excluded_set:
-                effective_delegate_staking_balance -= balance
-                continue
-            effective_delegators_balance.append(dbalance)
+        # excluded addresses are processed
+        effective_delegate_staking_balance = delegate_staking_balance - sum(
+            balance for balance, is_excluded in zip(balances, excluded) if is_excluded)
 
         rewards = []
         # calculate how rewards will be distributed
-        for dbalance in effective_delegators_balance:
-            address = dbalance[0]["tz"]
-            balance = int(dbalance[1])
+        for i, address in enumerate(addresses):
+            balance = balances[i]
+
+            if excluded[i]:
+                continue
 
             # Skip those that did not delegate minimum amount
-            if balance < self.min_delegation_amt_mutez:
-                self.logger.debug("Skipping '{}': Low delegation amount ({:.6f})".format(address, (balance / MUTEZ)))
+            if balance < min_delegations[i]:
+                self.logger.debug("Skipping '{}': Low delegation amount ({})".format(address, format_tez(balance)))
                 continue
 
             ratio = self.rc.round(balance / effective_delegate_staking_balance)
-            reward = (self.total_rewards * ratio)
+            reward = self.total_rewards * balance // effective_delegate_staking_balance
 
-            reward_item = PaymentRecord(address=address, reward=reward, ratio=ratio)
+            reward_item = PaymentRecord(address=address, reward=reward, ratio=ratio,
+                                        fee_rate=fee_rates[i] if fee_rates else None, balance=balance)
 
             rewards.append(reward_item)
 
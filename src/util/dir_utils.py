@@ -5,6 +5,7 @@ PAYMENT_FAILED_DIR = "failed"
 BUSY_FILE = ".BUSY"
 PAYMENTS_ROOT_DIR = "payments"
 CALCULATIONS_ROOT_DIR = "calculations"
+CACHE_FILE_SUFFIX = "_cache.db"
 
 
 def payment_report_file_path(pymnt_root, pymnt_cycle, nb_failed):
@@ -44,6 +45,10 @@ def get_calculation_report_file(calculations_root, cycle):
     return os.path.join(calculations_root, str(cycle)+".csv")
 
 
+def get_cache_file(cache_root, network_name):
+    return os.path.join(cache_root, network_name.lower() + CACHE_FILE_SUFFIX)
+
+
 def reward_report_file_path(reward_root, pymnt_cycle):
     return os.path.join(reward_root, str(pymnt_cycle) + '.csv')
 
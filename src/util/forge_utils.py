@@ -0,0 +1,96 @@
+import base58
+
+# protocols whose transaction encoding is implemented below
+ATHENS = "Pt24m4xiPbLDhVgVfABUjirbmda3yohdN82Sp9FeuAXJ4eV9otd"
+SUPPORTED_PROTOCOLS = {ATHENS}
+
+TRANSACTION_TAG = 0x08
+
+BRANCH_PREFIX = bytes.fromhex("0134")
+IMPLICIT_PREFIXES = {"tz1": (bytes.fromhex("06a19f"), 0x00),
+                     "tz2": (bytes.fromhex("06a1a1"), 0x01),
+                     "tz3": (bytes.fromhex("06a1a4"), 0x02)}
+ORIGINATED_PREFIX = bytes.fromhex("025a79")
+
+# sizes in bytes of forged fields
+BRANCH_SIZE = 32
+CONTRACT_ID_SIZE = 22
+SIGNATURE_SIZE = 64
+
+
+def forge_zarith(value):
+    """
+    Encodes a natural number in 7 bit groups, least significant first. High bit of a byte is set if more follow.
+    """
+    value = int(value)
+    if value < 0:
+        raise Exception("Negative value {} cannot be forged as natural number".format(value))
+
+    forged = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            forged.append(byte | 0x80)
+        else:
+            forged.append(byte)
+            return bytes(forged)
+
+
+def zarith_size(value):
+    """
+    Number of bytes forge_zarith produces for a natural number.
+    """
+    return max((int(value).bit_length() + 6) // 7, 1)
+
+
+def decode_check(encoded, prefix):
+    decoded = base58.b58decode_check(encoded)
+    if not decoded.startswith(prefix):
+        raise Exception("'{}' does not have expected prefix".format(encoded))
+    return decoded[len(prefix):]
+
+
+def forge_branch(branch):
+    return decode_check(branch, BRANCH_PREFIX)
+
+
+def forge_address(address):
+    """
+    Encodes a contract id: 0x00, curve tag and 20 bytes key hash for implicit accounts,
+    0x01, 20 bytes contract hash and 0x00 padding for originated accounts.
+    """
+    if address.startswith("KT1"):
+        return b"\x01" + decode_check(address, ORIGINATED_PREFIX) + b"\x00"
+
+    if address[:3] in IMPLICIT_PREFIXES:
+        prefix, curve_tag = IMPLICIT_PREFIXES[address[:3]]
+        return b"\x00" + bytes([curve_tag]) + decode_check(address, prefix)
+
+    raise Exception("Address '{}' cannot be forged".format(address))
+
+
+def forge_transaction(content):
+    """
+    Encodes a transaction without parameters.
+    :param content: operation content as in forge RPC, kind must be transaction
+    """
+    if content["kind"] != "transaction":
+        raise Exception("Operation kind '{}' cannot be forged".format(content["kind"]))
+
+    return b"".join([bytes([TRANSACTION_TAG]),
+                     forge_address(content["source"]),
+                     forge_zarith(content["fee"]),
+                     forge_zarith(content["counter"]),
+                     forge_zarith(content["gas_limit"]),
+                     forge_zarith(content["storage_limit"]),
+                     forge_zarith(content["amount"]),
+                     forge_address(content["destination"]),
+                     b"\x00"])  # no parameters
+
+
+def forge_operation(branch, contents):
+    """
+    Produces the hex string returned by helpers/forge/operations for transactions.
+    """
+    return (forge_branch(branch) + b"".join(forge_transaction(content) for content in contents)).hex()
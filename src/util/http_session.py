@@ -0,0 +1,106 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from exception.http import CircuitOpenException
+from util.rate_limiter import TokenBucket, CircuitBreaker
+
+DEFAULT_TIMEOUT = 5
+# number of hosts (e.g. tzscan mirrors, public nodes) whose connections are kept
+DEFAULT_POOL_CONNECTIONS = 16
+# connections kept alive per host
+DEFAULT_POOL_MAXSIZE = 8
+
+# requests per second to external services, and how many may be sent at once after an idle period
+DEFAULT_RATE = 10
+DEFAULT_BURST = 20
+# consecutive failures of an endpoint before its circuit is opened, and seconds before it is tried again
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 60
+
+DEFAULT_HEADERS = {'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'}
+
+
+class SessionManager:
+    """
+    Shared HTTP session for calls to external services. Connections are pooled per host and kept
+    alive, so that paging and polling the same host do not pay for a new TCP/TLS handshake.
+    All requests share a single rate budget. Each endpoint has its own circuit breaker, so that a
+    failing endpoint is not hammered with retries.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT) -> None:
+        super().__init__()
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # rate 0 disables the limiter
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+
+        self.lock = threading.Lock()
+        self.nb_requests = 0
+        self.nb_rejected = 0
+        self.throttled_time = 0
+        self.network_time = 0
+
+    def get(self, url, timeout=None, **kwargs):
+        breaker = self.__breaker(url)
+        try:
+            breaker.before_request()
+        except CircuitOpenException:
+            with self.lock:
+                self.nb_rejected += 1
+            raise
+
+        throttled = self.bucket.acquire() if self.bucket else 0
+
+        start = time.time()
+        try:
+            resp = self.session.get(url, timeout=timeout or self.timeout, **kwargs)
+        except requests.exceptions.RequestException:
+            breaker.record_failure()
+            raise
+        finally:
+            with self.lock:
+                self.nb_requests += 1
+                self.throttled_time += throttled
+                self.network_time += time.time() - start
+
+        if resp.status_code == 429 or resp.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        return resp
+
+    def metrics(self):
+        with self.lock:
+            return {"requests": self.nb_requests, "rejected": self.nb_rejected,
+                    "throttled_time": self.throttled_time, "network_time": self.network_time}
+
+    def close(self):
+        self.session.close()
+
+    def __breaker(self, url):
+        # endpoint is host and first two path segments, e.g. api1.tzscan.io/v1/rewards_split
+        parts = urlsplit(url)
+        endpoint = parts.netloc + '/'.join(parts.path.split('/')[:3])
+
+        with self.lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+            return self.breakers[endpoint]
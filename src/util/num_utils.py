@@ -1,9 +1,28 @@
-from math import ceil, floor
+from decimal import Decimal
+from fractions import Fraction
 
+MUTEZ = 1000000
 
-def ceilf(num, ndigits):
-    return ceil(num * 10 ** ndigits) / 10 ** ndigits
 
+def to_fraction(num):
+    """
+    :param num: number as written in configuration, e.g. 0.3 or 9.5
+    :return: exact Fraction of the decimal representation, e.g. 3/10 instead of binary approximation of 0.3
+    """
+    return Fraction(str(num))
 
-def floorf(num, ndigits):
-    return floor(num * 10 ** ndigits) / 10 ** ndigits
+
+def to_mutez(tez):
+    """
+    :param tez: amount in tez, as number or string e.g. "12.345678". Digits beyond mutez are dropped.
+    :return: amount in mutez
+    """
+    return int(Decimal(str(tez).strip()) * MUTEZ)
+
+
+def format_tez(mutez):
+    """
+    :return: amount in tez with 6 decimal digits, e.g. 12345678 -> "12.345678"
+    """
+    sign = "-" if mutez < 0 else ""
+    return "{}{}.{:06d}".format(sign, abs(mutez) // MUTEZ, abs(mutez) % MUTEZ)
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from exception.http import CircuitOpenException
+from log_config import main_logger
+
+logger = main_logger
+
+# circuit breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class TokenBucket:
+    """
+    Allows rate requests per second on average and bursts of up to burst requests.
+    """
+
+    def __init__(self, rate, burst) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available.
+        :return: time waited in seconds
+        """
+        waited = 0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+            waited += wait
+
+
+class CircuitBreaker:
+    """
+    Stops requests to an endpoint after failure_threshold consecutive failures. After reset_timeout
+    a single trial request is let through; its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout) -> None:
+        super().__init__()
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def before_request(self):
+        with self.lock:
+            if self.state == CLOSED:
+                return
+
+            if self.state == OPEN and time.monotonic() - self.opened >= self.reset_timeout:
+                self.state = HALF_OPEN
+                return
+
+            raise CircuitOpenException("Circuit of {} is {}, retry in {:.0f} seconds".format(
+                self.name, self.state, max(0, self.reset_timeout - (time.monotonic() - self.opened))))
+
+    def record_success(self):
+        with self.lock:
+            if self.state != CLOSED:
+                logger.info("Circuit of {} is closed".format(self.name))
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                logger.warning("Circuit of {} is open after {} failures".format(self.name, self.failures))
+                self.state = OPEN
+                self.opened = time.monotonic()
@@ -0,0 +1,144 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from log_config import main_logger
+
+logger = main_logger
+
+MB = 1024 * 1024
+DEFAULT_MAX_SIZE = 512 * MB
+
+CREATE_TABLE = "CREATE TABLE IF NOT EXISTS responses (scope TEXT NOT NULL, key TEXT NOT NULL, body BLOB NOT NULL, " \
+               "size INTEGER NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL, etag TEXT, PRIMARY KEY (scope, key))"
+CREATE_INDEX = "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+
+
+class ResponseCache:
+    """
+    Persistent cache for responses that never change, e.g. rpc responses at a given block hash.
+    Entries are grouped by scope (e.g. block hash) and identified by key (e.g. rpc path).
+    Bodies are stored as compressed json. When total size exceeds max_size, least recently used
+    entries are evicted. Responses of services supporting conditional requests keep their ETag.
+    """
+
+    def __init__(self, db_path, max_size=DEFAULT_MAX_SIZE) -> None:
+        super().__init__()
+        self.db_path = db_path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        # connection is shared by threads, access is serialized by self.lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(CREATE_TABLE)
+        self.conn.execute(CREATE_INDEX)
+        # caches created before etag column was introduced
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(responses)")]
+        if 'etag' not in columns:
+            self.conn.execute("ALTER TABLE responses ADD COLUMN etag TEXT")
+        self.conn.commit()
+
+        self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, scope, key):
+        entry = self.get_entry(scope, key)
+        return entry[0] if entry else None
+
+    def get_entry(self, scope, key):
+        """
+        :return: (value, etag) or None if there is no entry
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT body, etag FROM responses WHERE scope=? AND key=?", (scope, key)).fetchone()
+            if row is None:
+                return None
+
+            self.conn.execute("UPDATE responses SET last_access=? WHERE scope=? AND key=?", (time.time(), scope, key))
+            self.conn.commit()
+
+        return json.loads(zlib.decompress(row[0]).decode('utf-8')), row[1]
+
+    def put(self, scope, key, value, etag=None):
+        body = zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE scope=? AND key=?", (scope, key)).fetchone()
+            if old:
+                self.total_size -= old[0]
+
+            self.conn.execute("INSERT OR REPLACE INTO responses (scope, key, body, size, created, last_access, etag) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?)", (scope, key, body, len(body), now, now, etag))
+            self.total_size += len(body)
+
+            if self.total_size > self.max_size:
+                self.__evict(self.max_size)
+
+            self.conn.commit()
+
+    def prune(self, max_size=None, older_than=None, scope=None):
+        """
+        :param max_size: evict least recently used entries until total size is not more than max_size
+        :param older_than: remove entries not accessed since this timestamp
+        :param scope: remove all entries of a scope
+        :return: number of removed entries
+        """
+        with self.lock:
+            removed = 0
+            if scope is not None:
+                removed += self.conn.execute("DELETE FROM responses WHERE scope=?", (scope,)).rowcount
+            if older_than is not None:
+                removed += self.conn.execute("DELETE FROM responses WHERE last_access<?", (older_than,)).rowcount
+
+            self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+            if max_size is not None:
+                removed += self.__evict(max_size)
+
+            self.conn.commit()
+            self.conn.execute("VACUUM")
+
+        return removed
+
+    def stats(self):
+        with self.lock:
+            nb_entries, nb_scopes = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT scope) FROM responses").fetchone()
+        return {"entries": nb_entries, "scopes": nb_scopes, "size": self.total_size, "max_size": self.max_size}
+
+    def list_scopes(self):
+        with self.lock:
+            return self.conn.execute("SELECT scope, COUNT(*), SUM(size), MAX(last_access) FROM responses "
+                                     "GROUP BY scope ORDER BY MAX(last_access) DESC").fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # caller must hold the lock
+    def __evict(self, max_size):
+        removed = 0
+        rows = self.conn.execute("SELECT scope, key, size FROM responses ORDER BY last_access")
+        victims = []
+        size = self.total_size
+        for scope, key, entry_size in rows:
+            if size <= max_size:
+                break
+            victims.append((scope, key))
+            size -= entry_size
+
+        if victims:
+            self.conn.executemany("DELETE FROM responses WHERE scope=? AND key=?", victims)
+            removed = len(victims)
+            self.total_size = size
+            logger.debug("Evicted {} entries from response cache {}".format(removed, self.db_path))
+
+        return removed
@@ -1,14 +1,12 @@
-from util.num_utils import floorf
-
 class RoundingCommand:
     def __init__(self, scale):
         self.scale = scale
 
-    def roundDown(self, decimal_num):
-        if self.scale:
-            return floorf(decimal_num, self.scale)
-        else:
-            return decimal_num
+        # amounts are rounded to a multiple of this many mutez, scale is number of digits after tez
+        self.unit = 10 ** (6 - scale) if scale and scale < 6 else 1
+
+    def roundDown(self, mutez):
+        return mutez - mutez % self.unit
 
     def round(self, decimal_num):
         if self.scale:
@@ -1,14 +1,20 @@
+import codecs
 import json
+import re
 
+from log_config import main_logger
 from util.client_utils import clear_terminal_chars
 
+logger = main_logger
 
-def parse_json_response(client_response, verbose=None):
-    client_response = clear_terminal_chars(client_response)
+JSON_DECODER = json.JSONDecoder()
+SEPARATORS = re.compile(r'[\s,]*')
 
-    if verbose:
-        print("will parse json response_str is '{}'".format(client_response))
+# keep decoded items in buffer up to this many characters before dropping them
+BUFFER_COMPACT_SIZE = 64 * 1024
 
+
+def find_json_start(client_response):
     # because of disclaimer header; find beginning of response
     idx = client_response.find("{")
     if idx < 0:
@@ -17,9 +23,128 @@ def parse_json_response(client_response, verbose=None):
         idx = client_response.find("\"")
     if idx < 0:
         raise Exception("Unknown client response format")
+    return idx
+
+
+def parse_json_response(client_response, verbose=None):
+    if isinstance(client_response, bytes):
+        client_response = client_response.decode('utf-8')
+
+    # terminal sequences are rare, do not copy whole response if there is none
+    if "\x1b" in client_response:
+        client_response = clear_terminal_chars(client_response)
 
-    response_str = client_response[idx:].strip()
     if verbose:
-        print("parsed json response_str is '{}'".format(response_str))
+        logger.debug("will parse json response_str is '{}'".format(client_response))
+
+    idx = find_json_start(client_response)
+
+    # decode in place, without slicing a copy of the response
+    response, _ = JSON_DECODER.raw_decode(client_response, idx)
+
+    return response
+
+
+class JsonArrayStream:
+    """
+    Iterates over items of a json array while the document is still being received, so that
+    large arrays (e.g. delegated contracts, balance updates) are never held as a whole string.
+
+    chunks  : iterable of utf-8 encoded bytes
+    key     : name of the member holding the array. First member with this name is used.
+              If None, document itself is expected to be an array.
+
+    After iteration, rest holds the rest of the document with the array emptied.
+    If the array is not found, no item is yielded and rest holds the whole document.
+    """
+
+    def __init__(self, chunks, key=None) -> None:
+        super().__init__()
+        self.chunks = iter(chunks)
+        self.key = key
+        self.rest = None
+
+        if key is None:
+            self.pattern = re.compile(r'\s*\[')
+        else:
+            self.pattern = re.compile(r'"{}"\s*:\s*\['.format(re.escape(key)))
+
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ""
+        self.eof = False
+
+    def __read(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            self.buffer += self.decoder.decode(b'', final=True)
+        else:
+            self.buffer += self.decoder.decode(chunk)
+
+    def __find_array(self):
+        search_from = 0
+        while True:
+            if self.key is None:
+                # array must be at the beginning of document
+                if self.buffer.strip():
+                    return self.pattern.match(self.buffer)
+            else:
+                match = self.pattern.search(self.buffer, search_from)
+                if match:
+                    return match
+                # key may be split between chunks
+                search_from = max(0, len(self.buffer) - len(self.key) - 16)
+
+            if self.eof:
+                return None
+
+            self.__read()
+
+    def __iter__(self):
+        match = self.__find_array()
+        if match is None:
+            while not self.eof:
+                self.__read()
+            self.rest = json.loads(self.buffer) if self.buffer.strip() else None
+            return
+
+        head = self.buffer[:match.end()]
+        self.buffer = self.buffer[match.end():]
+        pos = 0
+
+        while True:
+            pos = SEPARATORS.match(self.buffer, pos).end()
+            if pos == len(self.buffer):
+                if self.eof:
+                    raise ValueError("Json document ended before array is closed")
+                self.__read()
+                continue
+
+            if self.buffer[pos] == ']':
+                break
+
+            try:
+                item, end = JSON_DECODER.raw_decode(self.buffer, pos)
+                # a number at the end of buffer may continue in next chunk
+                complete = end < len(self.buffer) or self.eof
+            except ValueError:
+                if self.eof:
+                    raise
+                complete = False
+
+            if not complete:
+                self.__read()
+                continue
+
+            yield item
+
+            pos = end
+            if pos > BUFFER_COMPACT_SIZE:
+                self.buffer = self.buffer[pos:]
+                pos = 0
+
+        while not self.eof:
+            self.__read()
 
-    return json.loads(response_str)
+        self.rest = json.loads(head + self.buffer[pos:])
+        self.buffer = ""
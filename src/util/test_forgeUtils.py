@@ -0,0 +1,36 @@
+from unittest import TestCase
+
+from util.forge_utils import forge_zarith, forge_address, forge_branch, forge_operation, zarith_size
+
+
+class TestForgeUtils(TestCase):
+    def test_forge_zarith(self):
+        self.assertEqual("00", forge_zarith(0).hex())
+        self.assertEqual("7f", forge_zarith(127).hex())
+        self.assertEqual("8001", forge_zarith(128).hex())
+        self.assertEqual("ac02", forge_zarith(300).hex())
+        self.assertEqual("c0843d", forge_zarith(1000000).hex())
+
+        for value in [0, 127, 128, 16383, 16384, 1000000, 2 ** 35]:
+            self.assertEqual(len(forge_zarith(value)), zarith_size(value))
+
+    def test_forge_address(self):
+        self.assertEqual("0000" + "02298c03ed7d454a101eb7022bc95f7e5f41ac78",
+                         forge_address("tz1KqTpEZ7Yob7QbPE4Hy4Wo8fHG8LhKxZSx").hex())
+        self.assertEqual("01" + "e5e4f6df971325377e7ca764931324e22e1ed015" + "00",
+                         forge_address("KT1VYLbR7Cp4xxywWR4c12BPbkmrqSf5UXad").hex())
+
+    def test_forge_operation(self):
+        branch = "BLockGenesisGenesisGenesisGenesisGenesisf79b5d1CoW2"
+        content = {"kind": "transaction", "source": "KT1VYLbR7Cp4xxywWR4c12BPbkmrqSf5UXad",
+                   "destination": "tz1KqTpEZ7Yob7QbPE4Hy4Wo8fHG8LhKxZSx", "fee": "1300", "counter": 300,
+                   "gas_limit": "10100", "storage_limit": "0", "amount": 1000000}
+
+        expected = (forge_branch(branch).hex() + "08"
+                    + "01e5e4f6df971325377e7ca764931324e22e1ed01500"  # source
+                    + "940a" + "ac02" + "f44e" + "00" + "c0843d"  # fee, counter, gas, storage, amount
+                    + "000002298c03ed7d454a101eb7022bc95f7e5f41ac78"  # destination
+                    + "00")  # no parameters
+
+        self.assertEqual(expected, forge_operation(branch, [content]))
+        self.assertEqual(expected + expected[64:], forge_operation(branch, [content, content]))
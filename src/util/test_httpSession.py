@@ -0,0 +1,53 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+import requests
+
+from exception.http import CircuitOpenException
+from util.http_session import SessionManager, DEFAULT_TIMEOUT, DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE, \
+    DEFAULT_RATE, DEFAULT_BURST, DEFAULT_FAILURE_THRESHOLD
+
+
+class TestSessionManager(TestCase):
+
+    def setUp(self):
+        self.session_manager = SessionManager()
+        self.addCleanup(self.session_manager.close)
+        self.session_manager.session.get = Mock(return_value=Mock(status_code=200))
+
+    def test_defaults(self):
+        session = self.session_manager.session
+        self.assertEqual("gzip, deflate", session.headers["Accept-Encoding"])
+        self.assertEqual("keep-alive", session.headers["Connection"])
+
+        # same pooled adapter for both schemes
+        adapter = session.get_adapter("http://api1.tzscan.io")
+        self.assertIs(adapter, session.get_adapter("https://mainnet.tezrpc.me"))
+        self.assertEqual(DEFAULT_POOL_CONNECTIONS, adapter._pool_connections)
+        self.assertEqual(DEFAULT_POOL_MAXSIZE, adapter._pool_maxsize)
+
+        self.assertEqual(DEFAULT_RATE, self.session_manager.bucket.rate)
+        self.assertEqual(DEFAULT_BURST, self.session_manager.bucket.burst)
+        self.assertIsNone(SessionManager(rate=0).bucket)
+
+    def test_get(self):
+        self.session_manager.get("http://api1.tzscan.io/v1/nb_delegators/tz1baker", headers={"If-None-Match": '"a"'})
+        self.session_manager.get("http://api1.tzscan.io/v1/nb_delegators/tz1baker", timeout=1)
+
+        self.assertEqual([{"timeout": DEFAULT_TIMEOUT, "headers": {"If-None-Match": '"a"'}}, {"timeout": 1}],
+                         [kwargs for _, kwargs in self.session_manager.session.get.call_args_list])
+        self.assertEqual(2, self.session_manager.metrics()["requests"])
+
+    def test_circuit_per_endpoint(self):
+        self.session_manager.session.get.side_effect = requests.exceptions.ConnectionError()
+
+        for _ in range(DEFAULT_FAILURE_THRESHOLD):
+            self.assertRaises(requests.exceptions.ConnectionError, self.session_manager.get,
+                              "http://api1.tzscan.io/v1/rewards_split/tz1baker?p=0")
+
+        # other paths of the same endpoint are rejected, other endpoints are not
+        self.assertRaises(CircuitOpenException, self.session_manager.get,
+                          "http://api1.tzscan.io/v1/rewards_split/tz1baker?p=1")
+        self.assertRaises(requests.exceptions.ConnectionError, self.session_manager.get,
+                          "http://api2.tzscan.io/v1/rewards_split/tz1baker?p=1")
+        self.assertEqual(1, self.session_manager.metrics()["rejected"])
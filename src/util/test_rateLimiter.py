@@ -0,0 +1,35 @@
+import time
+from unittest import TestCase
+
+from exception.http import CircuitOpenException
+from util.rate_limiter import TokenBucket, CircuitBreaker, OPEN, CLOSED
+
+
+class TestRateLimiter(TestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=100, burst=5)
+
+        # burst is served without waiting
+        self.assertEqual(0, sum(bucket.acquire() for _ in range(5)))
+
+        # then requests are spaced by 1/rate
+        self.assertGreater(sum(bucket.acquire() for _ in range(5)), 0.03)
+
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker("endpoint", failure_threshold=2, reset_timeout=0.05)
+
+        breaker.record_failure()
+        breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(OPEN, breaker.state)
+        self.assertRaises(CircuitOpenException, breaker.before_request)
+
+        # a single trial request is let through after reset timeout
+        time.sleep(0.06)
+        breaker.before_request()
+        self.assertRaises(CircuitOpenException, breaker.before_request)
+
+        breaker.record_success()
+        self.assertEqual(CLOSED, breaker.state)
+        breaker.before_request()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from util.response_cache import ResponseCache
+
+
+class TestResponseCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "cache.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_get_put(self):
+        cache = ResponseCache(self.db_path)
+        self.assertIsNone(cache.get("BLockHash", "/path"))
+
+        cache.put("BLockHash", "/path", {"balance": "100"})
+        self.assertEqual({"balance": "100"}, cache.get("BLockHash", "/path"))
+        cache.close()
+
+        # survives reopening
+        cache = ResponseCache(self.db_path)
+        self.assertEqual({"balance": "100"}, cache.get("BLockHash", "/path"))
+        self.assertEqual(1, cache.stats()["entries"])
+        cache.close()
+
+    def test_etag(self):
+        cache = ResponseCache(self.db_path)
+        self.assertIsNone(cache.get_entry("tzscan", "page/0"))
+
+        cache.put("tzscan", "page/0", [1, 2], etag='"abc"')
+        self.assertEqual(([1, 2], '"abc"'), cache.get_entry("tzscan", "page/0"))
+
+        cache.put("tzscan", "page/0", [1, 2, 3])
+        self.assertEqual(([1, 2, 3], None), cache.get_entry("tzscan", "page/0"))
+        cache.close()
+
+    def test_eviction(self):
+        cache = ResponseCache(self.db_path, max_size=10 ** 9)
+        for i in range(20):
+            cache.put("BLockHash", "/path/{}".format(i), [i] * 100)
+
+        entry_size = cache.stats()["size"] / 20
+
+        # touch first entry so that it is not the least recently used anymore
+        cache.get("BLockHash", "/path/0")
+
+        cache.max_size = entry_size * 5
+        cache.put("BLockHash", "/path/20", [20] * 100)
+
+        self.assertLessEqual(cache.stats()["size"], cache.max_size)
+        self.assertIsNotNone(cache.get("BLockHash", "/path/0"))
+        self.assertIsNotNone(cache.get("BLockHash", "/path/20"))
+        self.assertIsNone(cache.get("BLockHash", "/path/1"))
+        cache.close()
+
+    def test_prune_scope(self):
+        cache = ResponseCache(self.db_path)
+        cache.put("BLock1", "/path", 1)
+        cache.put("BLock2", "/path", 2)
+
+        self.assertEqual(1, cache.prune(scope="BLock1"))
+        self.assertIsNone(cache.get("BLock1", "/path"))
+        self.assertEqual(2, cache.get("BLock2", "/path"))
+        cache.close()
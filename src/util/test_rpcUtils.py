@@ -0,0 +1,46 @@
+import json
+from unittest import TestCase
+
+from util.rpc_utils import JsonArrayStream, parse_json_response
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestRpcUtils(TestCase):
+    def test_parse_json_response(self):
+        response = """Warning:
+  
+                 This is NOT the Tezos Mainnet.
+
+"BMeLBs4C2RbZos4anjmGvP3GMa6hA7froTpxZN7HsNtRZyvK72r"
+"""
+        self.assertEqual("BMeLBs4C2RbZos4anjmGvP3GMa6hA7froTpxZN7HsNtRZyvK72r", parse_json_response(response))
+        self.assertEqual({"level": 5}, parse_json_response(b'\x1b[0m{"level": 5}\n'))
+
+    def test_stream_member_array(self):
+        document = {"staking_balance": "100", "delegated_contracts": ["KT1{}".format(i) for i in range(1000)],
+                    "deactivated": False, "grace_period": 12}
+        data = json.dumps(document).encode('utf-8')
+
+        # chunk boundaries must not matter, including the ones splitting the key or a number
+        for chunk_size in [1, 7, 1024, len(data)]:
+            stream = JsonArrayStream(chunked(data, chunk_size), "delegated_contracts")
+            self.assertEqual(document["delegated_contracts"], list(stream))
+            self.assertEqual({"staking_balance": "100", "delegated_contracts": [], "deactivated": False,
+                              "grace_period": 12}, stream.rest)
+
+    def test_stream_root_array(self):
+        document = [["tz1é", {"balance": "1234567"}], 123456789, "x"]
+        data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+
+        for chunk_size in [1, 3, len(data)]:
+            stream = JsonArrayStream(chunked(data, chunk_size))
+            self.assertEqual(document, list(stream))
+            self.assertEqual([], stream.rest)
+
+    def test_stream_array_not_found(self):
+        stream = JsonArrayStream([b'{"tz1": {"balance": "5"}}'])
+        self.assertEqual([], list(stream))
+        self.assertEqual({"tz1": {"balance": "5"}}, stream.rest)